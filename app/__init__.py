@@ -27,22 +27,84 @@
 from flask import Flask
 from flask.ext.login import LoginManager
 from flask.ext.principal import Principal, Permission, RoleNeed
-from flask.ext.sqlalchemy import SQLAlchemy
 from flask.ext.babel import Babel
 
-app = Flask(__name__, instance_relative_config=True)
-app.config.from_object('app.default_settings')
-app.config.from_pyfile('application.cfg', silent=True)
+from .assets import Assets
+from .database import SQLAlchemy
+from .extensions import ExtensionProxy
+from .instrumentation import RequestTiming, NPlusOneDetector, SlowQueryLog
+from .jobs import Jobs
+from .locales import LocaleNegotiator
+from .metrics import Metrics
+from .pagecache import PageCache
+from .passwords import PasswordHasher
+from .profiling import Profiler
+from .sessions import ServerSideSessions
+from .templating import TemplateCache
+from .throttle import LoginThrottle
 
-Principal(app)
+# The extensions are created unbound and initialized by create_app, the
+# proxies create a new instance for every app
+principal = Principal()
 admin_permission = Permission(RoleNeed('admin'))
 
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'auth.login'
 
-db = SQLAlchemy(app)
-babel = Babel(app)
+db = SQLAlchemy()
+babel = Babel()
+locale_negotiator = LocaleNegotiator(babel)
+password_hasher = ExtensionProxy('password_hasher', PasswordHasher)
+login_throttle = ExtensionProxy('login_throttle', LoginThrottle)
+assets = ExtensionProxy('assets', Assets)
+page_cache = ExtensionProxy('page_cache', PageCache)
+request_timing = ExtensionProxy('request_timing', RequestTiming)
+nplusone = NPlusOneDetector()
+slow_query_log = ExtensionProxy('slow_query_log', SlowQueryLog)
+metrics = ExtensionProxy('metrics', Metrics)
+profiler = ExtensionProxy('profiler', Profiler, admin_permission)
+jobs = ExtensionProxy('jobs', Jobs)
+sessions = ServerSideSessions()
+template_cache = ExtensionProxy('template_cache', TemplateCache)
 
-import views
-import models
+
+def create_app(config=None):
+    ''' Create and configure a new application. The models and views get
+        imported by the first call, importing the package stays cheap.
+
+    :config: A dict or an object with configuration values which override
+             the default settings and the instance configuration
+    :return: The new Flask application
+    '''
+    app = Flask(__name__, instance_relative_config=True)
+    app.config.from_object('app.default_settings')
+    app.config.from_pyfile('application.cfg', silent=True)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    principal.init_app(app)
+    login_manager.init_app(app)
+    slow_query_log.init_app(app)
+    db.init_app(app)
+    babel.init_app(app)
+    locale_negotiator.reload()
+    password_hasher.init_app(app)
+    login_throttle.init_app(app)
+    assets.init_app(app)
+    page_cache.init_app(app)
+    request_timing.init_app(app)
+    nplusone.init_app(app)
+    metrics.init_app(app)
+    profiler.init_app(app)
+    jobs.init_app(app)
+    sessions.init_app(app)
+    template_cache.init_app(app)
+
+    from . import models
+    from .views import init_app as init_views
+    init_views(app)
+    if app.config.get('TEMPLATE_PRECOMPILE'):
+        app.extensions['template_cache'].compile(app)
+    return app
@@ -0,0 +1,209 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' A small static asset pipeline. The build copies the static files to
+    content hashed names (with precompressed variants) and writes a manifest,
+    the templates get the hashed urls with asset_url(). The hashed files never
+    change and are served with far future cache headers.
+'''
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from cStringIO import StringIO
+
+from flask import request, send_from_directory, url_for, abort
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.eot', '.ttf', '.otf', '.html',
+                '.json', '.txt')
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")?#]+)([^'")]*)\1\s*\)''')
+
+
+def _hashed_name(name, content):
+    ''' Insert the hash of the content in front of the extension. '''
+    root, ext = posixpath.splitext(name)
+    return '{0}.{1}{2}'.format(root, hashlib.md5(content).hexdigest()[:12],
+                               ext)
+
+
+def _rewrite_css(name, content, manifest):
+    ''' Replace the relative urls in a css file with the hashed names. '''
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        quote, target, suffix = match.groups()
+        if ':' in target or target.startswith('/'):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(directory, target))
+        if resolved not in manifest:
+            return match.group(0)
+        hashed = posixpath.relpath(manifest[resolved], directory)
+        return 'url({0}{1}{2}{0})'.format(quote, hashed, suffix)
+    return CSS_URL.sub(replace, content)
+
+
+def _compress(path, content):
+    ''' Write the precompressed variants of a file. '''
+    buf = StringIO()
+    # a fixed mtime keeps the build reproducible
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9,
+                       mtime=0) as gz:
+        gz.write(content)
+    with open(path + '.gz', 'wb') as f:
+        f.write(buf.getvalue())
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content))
+
+
+def build_assets(static_folder, dist='dist'):
+    ''' Build the hashed and compressed assets of the static folder.
+
+    :static_folder: The static folder of the application
+    :dist: The sub folder to write the assets and the manifest to
+    :return: The manifest (original name -> hashed name)
+    '''
+    output = os.path.join(static_folder, dist)
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+
+    names = []
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder and dist in dirs:
+            dirs.remove(dist)
+        for filename in files:
+            path = os.path.relpath(os.path.join(root, filename),
+                                   static_folder)
+            names.append(path.replace(os.sep, '/'))
+
+    # the css files reference the other files and get hashed last
+    names.sort(key=lambda name: (name.endswith('.css'), name))
+    manifest = {}
+    for name in names:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            content = f.read()
+        if name.endswith('.css'):
+            content = _rewrite_css(name, content, manifest)
+        hashed = _hashed_name(name, content)
+        manifest[name] = hashed
+
+        path = os.path.join(output, hashed)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(content)
+        if name.endswith(COMPRESSIBLE):
+            _compress(path, content)
+
+    with open(os.path.join(output, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets(object):
+
+    ''' Serve the built assets and provide asset_url() to the templates. The
+        following configuration values are used:
+
+        ASSETS_DIST: The sub folder of the static folder with the build
+        ASSETS_MAX_AGE: The cache time of the hashed assets in seconds
+    '''
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.dist = 'dist'
+        self.max_age = 365 * 24 * 3600
+        self.folder = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Load the manifest and register the asset route. '''
+        self.dist = app.config.get('ASSETS_DIST', self.dist)
+        self.max_age = app.config.get('ASSETS_MAX_AGE', self.max_age)
+        self.folder = os.path.join(app.static_folder, self.dist)
+        self.load_manifest()
+        app.add_url_rule(
+            '{0}/{1}/<path:filename>'.format(app.static_url_path, self.dist),
+            'assets', self.send_asset)
+        app.jinja_env.globals['asset_url'] = self.url
+
+    def load_manifest(self):
+        ''' (Re)load the manifest written by the build. '''
+        try:
+            with open(os.path.join(self.folder, 'manifest.json')) as f:
+                self.manifest = json.load(f)
+        except IOError:
+            self.manifest = {}
+
+    def url(self, filename):
+        ''' Get the url of a static file, the hashed file if it was built.
+
+        :filename: The name of the file relative to the static folder
+        '''
+        hashed = self.manifest.get(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=hashed)
+
+    def send_asset(self, filename):
+        ''' Send a hashed asset, precompressed if the client accepts it. '''
+        path = os.path.join(self.folder, filename)
+        if not os.path.isfile(path):
+            abort(404)
+
+        encoding = None
+        accepted = request.accept_encodings
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[candidate] and os.path.isfile(path + suffix):
+                encoding = candidate
+                break
+
+        if encoding is None:
+            response = send_from_directory(self.folder, filename,
+                                           cache_timeout=self.max_age)
+        else:
+            response = send_from_directory(
+                self.folder, filename + suffix, cache_timeout=self.max_age,
+                mimetype=mimetypes.guess_type(filename)[0] or
+                'application/octet-stream')
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.cache_control.public = True
+        response.headers['Cache-Control'] += ', immutable'
+        return response
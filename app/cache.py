@@ -0,0 +1,228 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Simple caches used to keep hot data out of the database. All caches
+    provide the same interface (get, set, delete, clear) so the backend can be
+    chosen in the configuration.
+'''
+
+import os
+import sqlite3
+import threading
+import time
+import cPickle as pickle
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+
+class LRUCache(object):
+
+    ''' A thread safe in-process cache with a bounded size and an optional
+        time to live for the entries. The least recently used entry gets
+        dropped if the cache is full.
+    '''
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        ''' Get the value for the given key.
+
+        :key: The key to look up
+        :default: The value returned if the key is missing or expired
+        '''
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            if entry is _MISSING or (entry[1] is not None and
+                                     entry[1] < time.time()):
+                self.misses += 1
+                return default
+            # reinsert to mark the entry as recently used
+            self._data[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        ''' Store a value, drops the least recently used entry if full.
+
+        :key: The key to store the value for
+        :value: The value to store
+        '''
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        ''' Remove the given key if present. '''
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        ''' Remove all entries. '''
+        with self._lock:
+            self._data.clear()
+
+    def purge(self):
+        ''' Remove all expired entries. '''
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (value, expires) in self._data.items()
+                        if expires is not None and expires < now]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache(object):
+
+    ''' A cache stored in a local SQLite file. It can be shared by all worker
+        processes on the same host. The values get pickled and therefore the
+        file must not be writable by untrusted users. Several caches can share
+        the same file by using different tables. Every purge_interval writes
+        of a process the expired entries get removed and the oldest entries
+        above maxsize get dropped.
+    '''
+
+    purge_interval = 100
+
+    def __init__(self, filename, ttl=None, table='cache', maxsize=None):
+        self.filename = filename
+        self.ttl = ttl
+        self.table = table
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._execute(
+            'CREATE TABLE IF NOT EXISTS {table} '
+            '(key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+
+    def _connection(self):
+        ''' Get the connection of the current thread (and process). '''
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.filename, timeout=5,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _execute(self, statement, parameters=()):
+        return self._connection().execute(
+            statement.format(table=self.table), parameters)
+
+    def get(self, key, default=None):
+        ''' Get the value for the given key.
+
+        :key: The key to look up (a string)
+        :default: The value returned if the key is missing or expired
+        '''
+        row = self._execute(
+            'SELECT value, expires FROM {table} WHERE key = ?',
+            (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(str(row[0]))
+
+    def set(self, key, value):
+        ''' Store a value for the given key.
+
+        :key: The key to store the value for (a string)
+        :value: The value to store, must be picklable
+        '''
+        expires = time.time() + self.ttl if self.ttl else None
+        self._execute(
+            'INSERT OR REPLACE INTO {table} (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, sqlite3.Binary(pickle.dumps(value, 2)), expires))
+        self._writes += 1
+        if self._writes % self.purge_interval == 0:
+            self.purge()
+
+    def delete(self, key):
+        ''' Remove the given key if present. '''
+        self._execute('DELETE FROM {table} WHERE key = ?', (key,))
+
+    def clear(self):
+        ''' Remove all entries. '''
+        self._execute('DELETE FROM {table}')
+
+    def purge(self):
+        ''' Remove all expired entries and the oldest entries above maxsize.
+        '''
+        self._execute('DELETE FROM {table} WHERE expires < ?', (time.time(),))
+        if self.maxsize is not None:
+            # a replaced entry gets a new rowid, the lowest are the oldest
+            self._execute(
+                'DELETE FROM {table} WHERE rowid <= (SELECT rowid FROM '
+                '{table} ORDER BY rowid DESC LIMIT 1 OFFSET ?)',
+                (self.maxsize,))
+
+    def close(self):
+        ''' Close the connection of the current thread. '''
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def make_cache(config, prefix):
+    ''' Create the cache configured with the given prefix. The following
+        configuration values are used:
+
+        <prefix>_BACKEND: 'memory' or 'sqlite'
+        <prefix>_SIZE: The maximal number of entries (the sqlite cache can
+                       exceed it between two purges)
+        <prefix>_TTL: The time to live in seconds (None for no expiration)
+        <prefix>_PATH: The file of the cache (sqlite only), the prefix is
+                       used as table name
+
+    :config: The application configuration
+    :prefix: The prefix of the configuration values
+    '''
+    backend = config.get(prefix + '_BACKEND', 'memory')
+    ttl = config.get(prefix + '_TTL')
+    if backend == 'memory':
+        return LRUCache(config.get(prefix + '_SIZE', 1024), ttl)
+    elif backend == 'sqlite':
+        return SQLiteCache(config[prefix + '_PATH'], ttl, prefix.lower(),
+                           config.get(prefix + '_SIZE'))
+    raise ValueError('Unknown cache backend: {0}'.format(backend))
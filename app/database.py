@@ -0,0 +1,132 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' The database extension with support for pool tuning and SQLite pragmas.
+'''
+
+import sqlite3
+
+from flask.ext.sqlalchemy import SQLAlchemy as BaseSQLAlchemy
+from sqlalchemy import event, exc, select
+from sqlalchemy.pool import QueuePool
+
+
+class SQLAlchemy(BaseSQLAlchemy):
+
+    ''' Flask-SQLAlchemy with additional engine configuration:
+
+        SQLALCHEMY_POOL_SIZE, SQLALCHEMY_MAX_OVERFLOW, SQLALCHEMY_POOL_TIMEOUT,
+        SQLALCHEMY_POOL_RECYCLE: The pool settings, a pool size also enables
+            a connection pool for SQLite files (instead of a connection per
+            checkout)
+        SQLALCHEMY_POOL_PRE_PING: Test connections on checkout and replace
+            connections which got closed by the server
+        SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT (ms),
+        SQLITE_MMAP_SIZE (bytes), SQLITE_CACHE_SIZE (pages or -KiB): Pragmas
+            set on every new SQLite connection, None to keep the default
+    '''
+
+    SQLITE_PRAGMAS = (
+        ('journal_mode', 'SQLITE_JOURNAL_MODE'),
+        ('synchronous', 'SQLITE_SYNCHRONOUS'),
+        ('busy_timeout', 'SQLITE_BUSY_TIMEOUT'),
+        ('mmap_size', 'SQLITE_MMAP_SIZE'),
+        ('cache_size', 'SQLITE_CACHE_SIZE'),
+    )
+
+    def apply_driver_hacks(self, app, info, options):
+        in_memory = info.database in (None, '', ':memory:')
+        BaseSQLAlchemy.apply_driver_hacks(self, app, info, options)
+        if info.drivername != 'sqlite':
+            return
+        if not in_memory and options.get('pool_size'):
+            # pysqlite uses a new connection per checkout for files, the
+            # pool hands a connection to one thread at a time.
+            options['poolclass'] = QueuePool
+            options.setdefault('connect_args', {})['check_same_thread'] = \
+                False
+        else:
+            # the settings of a queue pool are not supported by the pools
+            # used for SQLite without a pool size or in memory
+            options.pop('max_overflow', None)
+            options.pop('pool_timeout', None)
+            if not in_memory:
+                options.pop('pool_size', None)
+
+    def get_engine(self, app, bind=None):
+        engine = BaseSQLAlchemy.get_engine(self, app, bind)
+        # the base creates a new engine if the configuration changed
+        if not getattr(engine, '_app_configured', False):
+            self.configure_engine(app, engine)
+            engine._app_configured = True
+        return engine
+
+    def configure_engine(self, app, engine):
+        ''' Register the connection hooks of a new engine.
+
+        :app: The application with the configuration
+        :engine: The new engine
+        '''
+        if engine.dialect.name == 'sqlite':
+            pragmas = ['PRAGMA {0}={1}'.format(pragma, app.config[key])
+                       for pragma, key in self.SQLITE_PRAGMAS
+                       if app.config.get(key) is not None]
+
+            @event.listens_for(engine, 'connect')
+            def set_pragmas(dbapi_connection, connection_record):
+                if isinstance(dbapi_connection, sqlite3.Connection):
+                    cursor = dbapi_connection.cursor()
+                    for pragma in pragmas:
+                        cursor.execute(pragma)
+                    cursor.close()
+
+        if app.config.get('SQLALCHEMY_POOL_PRE_PING'):
+            event.listen(engine, 'engine_connect', _ping_connection)
+
+        slow_query_log = app.extensions.get('slow_query_log')
+        if slow_query_log is not None and \
+                slow_query_log.threshold is not None:
+            slow_query_log.attach(engine)
+
+
+def _ping_connection(connection, branch):
+    ''' Test the connection before it is used, an invalidated connection gets
+        replaced by a new one.
+    '''
+    if branch:
+        return
+    should_close = connection.should_close_with_result
+    connection.should_close_with_result = False
+    try:
+        connection.scalar(select([1]))
+    except exc.DBAPIError as err:
+        # the pool reconnects on the next use of an invalidated connection
+        if err.connection_invalidated:
+            connection.scalar(select([1]))
+        else:
+            raise
+    finally:
+        connection.should_close_with_result = should_close
@@ -32,3 +32,143 @@ DEBUG = True
 SECRET_KEY = 'nonsense'
 SQLALCHEMY_DATABASE_URI = 'sqlite:///{0}'.format(
     (path(__file__).basename() / '..').abspath() / 'development.db')
+
+# The connection pool, for SQLite files a pool size enables a pool instead of
+# a new connection per checkout.
+SQLALCHEMY_POOL_SIZE = 5
+SQLALCHEMY_MAX_OVERFLOW = 10
+SQLALCHEMY_POOL_TIMEOUT = 30
+SQLALCHEMY_POOL_RECYCLE = 3600
+SQLALCHEMY_POOL_PRE_PING = False
+
+# Pragmas for new SQLite connections (None keeps the SQLite default). WAL lets
+# readers continue while a worker writes.
+SQLITE_JOURNAL_MODE = 'WAL'
+SQLITE_SYNCHRONOUS = 'NORMAL'
+SQLITE_BUSY_TIMEOUT = 5000
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_CACHE_SIZE = -16000
+
+# The cache for the resolved user roles, 'memory' for an in process cache or
+# 'sqlite' for a cache shared by all workers on the same host.
+ROLE_CACHE_BACKEND = 'memory'
+ROLE_CACHE_SIZE = 10000
+ROLE_CACHE_TTL = 300
+ROLE_CACHE_PATH = (path(__file__).basename() / '..').abspath() / 'cache.db'
+
+# Cache read-only snapshots of the logged in users instead of loading them
+# from the db on every request.
+USER_CACHE_ENABLED = False
+USER_CACHE_BACKEND = 'memory'
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 300
+USER_CACHE_PATH = (path(__file__).basename() / '..').abspath() / 'cache.db'
+
+# Password hashing, hashes with other parameters get replaced on login. The
+# hashes are computed in a pool of PASSWORD_HASH_PROCESSES processes (None for
+# the number of cores, 0 to hash in the request thread).
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256'
+PASSWORD_HASH_ITERATIONS = 10000
+PASSWORD_HASH_PROCESSES = None
+PASSWORD_HASH_MAX_PENDING = None
+PASSWORD_HASH_TIMEOUT = 10
+
+# Token buckets for the login attempts per email and per client ip (rate in
+# attempts per second). Use the 'sqlite' backend to share the buckets between
+# the workers.
+LOGIN_THROTTLE_ENABLED = True
+LOGIN_THROTTLE_BACKEND = 'memory'
+LOGIN_THROTTLE_PATH = (path(__file__).basename() / '..').abspath() / \
+    'throttle.db'
+LOGIN_THROTTLE_EMAIL_RATE = 0.1
+LOGIN_THROTTLE_EMAIL_BURST = 10
+LOGIN_THROTTLE_IP_RATE = 1
+LOGIN_THROTTLE_IP_BURST = 50
+
+# The static assets built with 'python run.py build_assets', the hashed files
+# are cached by the browsers for ASSETS_MAX_AGE seconds.
+ASSETS_DIST = 'dist'
+ASSETS_MAX_AGE = 365 * 24 * 3600
+
+# Record the wall, SQL and template time of every request, aggregated per
+# endpoint and reported in a Server-Timing header.
+REQUEST_TIMING_ENABLED = False
+REQUEST_TIMING_HEADER = True
+
+# Report statements of the same shape repeated NPLUSONE_THRESHOLD times within
+# one request (N+1 queries), as warning or as NPlusOneError.
+NPLUSONE_ENABLED = False
+NPLUSONE_THRESHOLD = 5
+NPLUSONE_RAISE = False
+
+# Record the request metrics exposed in /metrics (admins only). With preforked
+# workers set METRICS_DIR to a directory shared by the workers (emptied on
+# server start), the values of all workers get summed up.
+METRICS_ENABLED = False
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 1
+
+# Run single requests under cProfile, requested by an admin with the _profile
+# query argument or with a signed X-Profile header (run.py profile_token). The
+# newest PROFILE_RETENTION pstats files are kept in PROFILE_DIR.
+PROFILING_ENABLED = False
+PROFILE_DIR = (path(__file__).basename() / '..').abspath() / 'profiles'
+PROFILE_RETENTION = 50
+PROFILE_TOKEN_MAX_AGE = 3600
+
+# Log the statements slower than SLOW_QUERY_THRESHOLD seconds (None to
+# disable) with their parameter types, view and query plan to a rotating log.
+SLOW_QUERY_THRESHOLD = None
+SLOW_QUERY_LOG = (path(__file__).basename() / '..').abspath() / \
+    'slow_queries.log'
+SLOW_QUERY_LOG_SIZE = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+SLOW_QUERY_EXPLAIN = True
+
+# The number of events per page of /events.
+EVENTS_PAGE_SIZE = 50
+
+# The durable job queue of the background workers (run.py worker). Failed
+# jobs are retried JOB_MAX_ATTEMPTS times, after JOB_BACKOFF seconds doubled
+# for every retry up to JOB_MAX_BACKOFF. A job without progress for JOB_LEASE
+# seconds is taken over by another worker.
+JOB_QUEUE_PATH = (path(__file__).basename() / '..').abspath() / 'jobs.db'
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF = 5
+JOB_MAX_BACKOFF = 600
+JOB_LEASE = 300
+JOB_POLL_INTERVAL = 1
+
+# The attendees invited per transaction of the invitation job.
+INVITATION_BATCH_SIZE = 1000
+
+# Keep the sessions on the server, the cookie only holds a random id. None
+# keeps the signed cookie sessions, 'memory' or 'sqlite' to share the
+# sessions between the worker processes. The expired sessions are purged
+# every SESSION_SWEEP_INTERVAL seconds.
+SESSION_BACKEND = None
+SESSION_SIZE = 100000
+SESSION_TTL = 31 * 24 * 3600
+SESSION_PATH = (path(__file__).basename() / '..').abspath() / 'sessions.db'
+SESSION_SWEEP_INTERVAL = 600
+
+# Serve the pages of PAGE_CACHE_ENDPOINTS and the error pages with a status in
+# PAGE_CACHE_ERRORS to anonymous clients from a cache, without loading the
+# user or rendering templates. 'memory' or 'sqlite' (shared by the worker
+# processes through PAGE_CACHE_PATH).
+PAGE_CACHE_ENABLED = False
+PAGE_CACHE_ENDPOINTS = ('main.index', 'auth.login')
+PAGE_CACHE_ERRORS = (403, 404)
+PAGE_CACHE_BACKEND = 'memory'
+PAGE_CACHE_SIZE = 1024
+PAGE_CACHE_TTL = 60
+PAGE_CACHE_PATH = (path(__file__).basename() / '..').abspath() / 'pages.db'
+
+# Keep the compiled templates in TEMPLATE_CACHE_DIR (relative to the instance
+# folder, shared by the worker processes, filled ahead with run.py
+# compile_templates) and load all the templates when the app is created with
+# TEMPLATE_PRECOMPILE. The templates are only checked for changes with
+# TEMPLATES_AUTO_RELOAD (None follows DEBUG).
+TEMPLATE_CACHE_DIR = 'template_cache'
+TEMPLATE_PRECOMPILE = False
+TEMPLATES_AUTO_RELOAD = None
@@ -0,0 +1,60 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Per application extension state. The extensions are module-level proxies
+    so they can be imported everywhere, the instance holding the
+    configuration of an application is stored in its extensions dict.
+'''
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+
+class ExtensionProxy(LocalProxy):
+
+    ''' A proxy to the extension instance of the current application.
+        init_app creates a new instance for every application.
+
+    :name: The key in app.extensions
+    :cls: The extension class
+    :args: Additional arguments for the constructor of the extension
+    '''
+
+    def __init__(self, name, cls, *args):
+        LocalProxy.__init__(self, lambda: current_app.extensions[name])
+        object.__setattr__(self, '_extension', (name, cls, args))
+
+    def init_app(self, app):
+        ''' Create the extension for the given app.
+
+        :app: The Flask application
+        :return: The new extension instance
+        '''
+        name, cls, args = self._extension
+        extension = cls(*args)
+        app.extensions[name] = extension
+        extension.init_app(app)
+        return extension
@@ -24,6 +24,7 @@
 # THE POSSIBILITY OF SUCH DAMAGE.
 #
 
+from flask import request
 from flask.ext.wtf import Form
 from wtforms import (
     TextField,
@@ -31,7 +32,10 @@ from wtforms import (
     BooleanField,
     validators)
 
+from .. import db, password_hasher, login_throttle
 from ..models.user import User
+from ..pagecache import register_csrf_token
+from ..passwords import PasswordHasherBusy
 
 
 class LoginForm(Form):
@@ -42,6 +46,13 @@ class LoginForm(Form):
     def __init__(self, *args, **kwargs):
         Form.__init__(self, *args, **kwargs)
         self.user = None
+        self.throttled = False
+
+    def generate_csrf_token(self, csrf_context=None):
+        ''' Register the token of the rendered form with the page cache. '''
+        token = Form.generate_csrf_token(self, csrf_context)
+        register_csrf_token(token)
+        return token
 
     def validate(self):
         """ validate the email / password
@@ -53,13 +64,28 @@ class LoginForm(Form):
         if not rv:
             return False
 
+        # reject throttled attempts before any query or hashing
+        if not login_throttle.allow(self.email.data, request.remote_addr):
+            self.throttled = True
+            self.email.errors.append('Too many login attempts')
+            return False
+
         user = User.query.filter_by(email=self.email.data).first()
         if user is None:
             self.email.errors.append('Unknown email')
             return False
 
-        if not user.check_password(self.password.data):
-            self.password.errors.append('Invalid password')
+        try:
+            if not user.check_password(self.password.data):
+                self.password.errors.append('Invalid password')
+                return False
+
+            # replace hashes created with outdated parameters
+            if password_hasher.needs_rehash(user.password):
+                user.set_password(self.password.data)
+                db.session.commit()
+        except PasswordHasherBusy:
+            self.password.errors.append('Server busy, please try again')
             return False
 
         self.user = user
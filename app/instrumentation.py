@@ -0,0 +1,429 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Optional per request instrumentation. For every request the wall time,
+    the time spent in SQL statements, the number of statements and the time
+    spent rendering templates get recorded, reported in a Server-Timing
+    header and aggregated per endpoint. Repeated statements of the same shape
+    (N+1 queries) can be detected within a request or a block of code and
+    slow statements get logged with their query plan.
+'''
+
+from contextlib import contextmanager
+import itertools
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+import re
+import threading
+import time
+import traceback
+import warnings
+
+from flask import g, request, has_request_context
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestStats(object):
+
+    ''' The measurements of a single request. '''
+
+    __slots__ = ('start', 'sql_time', 'queries', 'template_time')
+
+    def __init__(self):
+        self.start = time.time()
+        self.sql_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+
+
+def current_stats():
+    ''' Get the stats of the current request or None. '''
+    if has_request_context():
+        return getattr(g, '_request_stats', None)
+    return None
+
+
+class TimedTemplate(Template):
+
+    ''' A template that adds its render time to the request stats. '''
+
+    def render(self, *args, **kwargs):
+        stats = current_stats()
+        if stats is None:
+            return Template.render(self, *args, **kwargs)
+        start = time.time()
+        try:
+            return Template.render(self, *args, **kwargs)
+        finally:
+            stats.template_time += time.time() - start
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('query_start', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start = conn.info['query_start'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.sql_time += time.time() - start
+        stats.queries += 1
+    for tracker in getattr(_trackers, 'active', ()):
+        tracker.record(statement)
+
+
+_engine_hooks = []
+
+
+def register_engine_hooks():
+    ''' Listen to the statements of all engines (only registered once). '''
+    if not _engine_hooks:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _engine_hooks.append(True)
+
+
+class NPlusOneError(Exception):
+
+    ''' A statement of the same shape was repeated too many times. '''
+
+
+class NPlusOneWarning(UserWarning):
+
+    ''' A statement of the same shape was repeated too many times. '''
+
+
+_trackers = threading.local()
+_whitespace = re.compile(r'\s+')
+_library_paths = tuple(
+    os.path.dirname(module.__file__) + os.sep
+    for module in (__import__('sqlalchemy'), __import__('flask'),
+                   __import__('werkzeug'), __import__('jinja2')))
+
+
+def _origin():
+    ''' Get the stack of the application code which issued a statement. '''
+    frames = [frame for frame in traceback.extract_stack()[:-3]
+              if not frame[0].startswith(_library_paths) and
+              frame[0] != __file__.rstrip('c')]
+    return ''.join(traceback.format_list(frames[-8:]))
+
+
+class QueryTracker(object):
+
+    ''' Count the statements executed while the tracker is active. Once a
+        statement shape (the SQL without the parameters) is executed
+        threshold times it is reported as N+1 query.
+
+    :param threshold: The number of repetitions to report (None to only count)
+    :param raise_error: Raise a NPlusOneError instead of a warning
+    '''
+
+    def __init__(self, threshold=None, raise_error=False):
+        self.threshold = threshold
+        self.raise_error = raise_error
+        self.count = 0
+        self.shapes = {}
+
+    def record(self, statement):
+        ''' Count a statement and report it if it is repeated too often. '''
+        self.count += 1
+        shape = _whitespace.sub(' ', statement).strip()
+        repeated = self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        if repeated == self.threshold:
+            message = 'Statement repeated {0} times (N+1 query): {1}\n' \
+                '{2}'.format(repeated, shape, _origin())
+            if self.raise_error:
+                raise NPlusOneError(message)
+            warnings.warn(message, NPlusOneWarning, stacklevel=2)
+
+    def activate(self):
+        ''' Start tracking the statements of the current thread. '''
+        register_engine_hooks()
+        if not hasattr(_trackers, 'active'):
+            _trackers.active = []
+        _trackers.active.append(self)
+
+    def deactivate(self):
+        ''' Stop tracking the statements. '''
+        if self in getattr(_trackers, 'active', ()):
+            _trackers.active.remove(self)
+
+
+@contextmanager
+def track_queries(threshold=None, raise_error=False):
+    ''' Track the statements executed within the with block.
+
+    :param threshold: The number of repetitions to report as N+1 query
+    :param raise_error: Raise a NPlusOneError instead of a warning
+    '''
+    tracker = QueryTracker(threshold, raise_error)
+    tracker.activate()
+    try:
+        yield tracker
+    finally:
+        tracker.deactivate()
+
+
+class NPlusOneDetector(object):
+
+    ''' Report repeated statements of the same shape within a request. Meant
+        for development and test runs. The following configuration values are
+        used:
+
+        NPLUSONE_ENABLED: Enable the detection
+        NPLUSONE_THRESHOLD: The number of repetitions to report
+        NPLUSONE_RAISE: Raise a NPlusOneError instead of a warning
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Register the hooks if the detection is enabled. '''
+        if not app.config.get('NPLUSONE_ENABLED'):
+            return
+        threshold = app.config.get('NPLUSONE_THRESHOLD', 5)
+        raise_error = app.config.get('NPLUSONE_RAISE', False)
+
+        def start():
+            g._query_tracker = QueryTracker(threshold, raise_error)
+            g._query_tracker.activate()
+
+        def stop(exception):
+            tracker = getattr(g, '_query_tracker', None)
+            if tracker is not None:
+                tracker.deactivate()
+
+        app.before_request_funcs.setdefault(None, []).insert(0, start)
+        app.teardown_request(stop)
+
+
+class EndpointStats(object):
+
+    ''' The aggregated measurements of an endpoint (times in seconds). '''
+
+    __slots__ = ('count', 'time', 'max_time', 'sql_time', 'queries',
+                 'template_time')
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.max_time = 0.0
+        self.sql_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+
+    def as_dict(self):
+        return dict((key, getattr(self, key)) for key in self.__slots__)
+
+
+class RequestTiming(object):
+
+    ''' Record the timings of all requests. The following configuration
+        values are used:
+
+        REQUEST_TIMING_ENABLED: Enable the instrumentation
+        REQUEST_TIMING_HEADER: Add the Server-Timing header to the responses
+    '''
+
+    def __init__(self, app=None):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Register the hooks if the instrumentation is enabled. '''
+        if not app.config.get('REQUEST_TIMING_ENABLED'):
+            return
+        self.header = app.config.get('REQUEST_TIMING_HEADER', True)
+        app.jinja_env.template_class = TimedTemplate
+        # run before the hooks of the other extensions (e.g. the identity
+        # loading) to account for their queries as well
+        app.before_request_funcs.setdefault(None, []).insert(
+            0, self._before_request)
+        app.after_request(self._after_request)
+        register_engine_hooks()
+
+    def _before_request(self):
+        g._request_stats = RequestStats()
+
+    def _after_request(self, response):
+        stats = getattr(g, '_request_stats', None)
+        if stats is None:
+            return response
+        duration = time.time() - stats.start
+        self.record(request.endpoint, duration, stats)
+        if self.header:
+            response.headers['Server-Timing'] = \
+                'app;dur={0:.2f}, db;dur={1:.2f};desc="{2} queries", ' \
+                'tpl;dur={3:.2f}'.format(duration * 1000,
+                                         stats.sql_time * 1000, stats.queries,
+                                         stats.template_time * 1000)
+        return response
+
+    def record(self, endpoint, duration, stats):
+        ''' Add the measurements of a request to the endpoint. '''
+        with self._lock:
+            entry = self.endpoints.get(endpoint)
+            if entry is None:
+                entry = self.endpoints[endpoint] = EndpointStats()
+            entry.count += 1
+            entry.time += duration
+            entry.max_time = max(entry.max_time, duration)
+            entry.sql_time += stats.sql_time
+            entry.queries += stats.queries
+            entry.template_time += stats.template_time
+
+    def snapshot(self):
+        ''' Get a copy of the aggregated measurements per endpoint. '''
+        with self._lock:
+            return dict((endpoint, entry.as_dict())
+                        for endpoint, entry in self.endpoints.items())
+
+    def reset(self):
+        ''' Drop the aggregated measurements. '''
+        with self._lock:
+            self.endpoints.clear()
+
+
+def _parameters_shape(parameters, executemany):
+    ''' Describe the parameters by their types, without the values. '''
+    if executemany:
+        parameters = list(parameters)
+        return '{0} x {1}'.format(
+            len(parameters),
+            _parameters_shape(parameters[0], False) if parameters else '()')
+    if isinstance(parameters, dict):
+        return '{' + ', '.join('{0}: {1}'.format(key, type(value).__name__)
+                               for key, value in sorted(parameters.items())) \
+            + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+
+
+class SlowQueryLog(object):
+
+    ''' Log the statements which take longer than a threshold together with
+        the shape of their parameters, the calling view and the query plan.
+        The following configuration values are used:
+
+        SLOW_QUERY_THRESHOLD: The threshold in seconds, None to disable
+        SLOW_QUERY_LOG: The log file, rotated at SLOW_QUERY_LOG_SIZE bytes
+                        keeping SLOW_QUERY_LOG_BACKUPS files (None to only
+                        use the app.slow_queries logger)
+        SLOW_QUERY_EXPLAIN: Capture the query plan of the slow statements
+    '''
+
+    explain_prefixes = {'sqlite': 'EXPLAIN QUERY PLAN '}
+    _instances = itertools.count()
+
+    def __init__(self, app=None):
+        self.threshold = None
+        # every instance logs to its own file through a child of the
+        # app.slow_queries logger
+        self.logger = logging.getLogger('app.slow_queries.{0}'.format(
+            next(self._instances)))
+        self._handler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Configure the log, the engines get attached by the database
+            extension when they are created.
+        '''
+        self.threshold = app.config.get('SLOW_QUERY_THRESHOLD')
+        if self.threshold is None:
+            return
+        self.explain = app.config.get('SLOW_QUERY_EXPLAIN', True)
+
+        filename = app.config.get('SLOW_QUERY_LOG')
+        if self._handler is not None:
+            self.logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+        if filename:
+            self._handler = RotatingFileHandler(
+                filename, maxBytes=app.config.get('SLOW_QUERY_LOG_SIZE', 0),
+                backupCount=app.config.get('SLOW_QUERY_LOG_BACKUPS', 0))
+            self._handler.setFormatter(logging.Formatter(
+                '%(asctime)s %(message)s'))
+            self.logger.addHandler(self._handler)
+        self.logger.setLevel(logging.INFO)
+
+    def attach(self, engine):
+        ''' Time the statements of an engine. '''
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.time())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        duration = time.time() - conn.info['slow_query_start'].pop()
+        if self.threshold is None or duration < self.threshold:
+            return
+        if has_request_context():
+            view = '{0} ({1} {2})'.format(request.endpoint, request.method,
+                                          request.path)
+        else:
+            view = 'no request'
+        message = 'slow query {0:.1f} ms in {1}: {2}\n  parameters: {3}' \
+            .format(duration * 1000, view,
+                    _whitespace.sub(' ', statement).strip(),
+                    _parameters_shape(parameters, executemany))
+        if self.explain and not executemany:
+            plan = self._explain(conn, statement, parameters)
+            if plan:
+                message += '\n  plan:\n    ' + '\n    '.join(plan)
+        self.logger.info(message)
+
+    def _explain(self, conn, statement, parameters):
+        ''' Get the query plan of a statement on a new cursor. '''
+        if statement.lstrip()[:6].upper() not in ('SELECT', 'UPDATE',
+                                                  'DELETE', 'INSERT'):
+            return None
+        prefix = self.explain_prefixes.get(conn.dialect.name, 'EXPLAIN ')
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as error:
+            return ['explain failed: {0}'.format(error)]
+        finally:
+            cursor.close()
+        if conn.dialect.name == 'sqlite':
+            # the last column is the description of the step
+            return [row[-1] for row in rows]
+        return [' '.join(str(column) for column in row) for row in rows]
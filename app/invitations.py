@@ -0,0 +1,92 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Send the invitations of an event in a background job. The attendees move
+    from NEW to INVITED in batches, every batch is one transaction with the
+    bulk update of the attendees and of the counters of the event. A retried
+    job continues with the remaining NEW attendees.
+'''
+
+from flask import current_app
+from flask.signals import Namespace
+
+from . import db, jobs
+from .jobs import job
+from .models.event import Event, EventAttendee
+
+_signals = Namespace()
+
+#: Sent with the event_id and the user_ids of every batch before the status
+#: gets updated; connect the delivery (e.g. mails) to it. A batch is sent
+#: again if its transaction fails.
+invitations_sent = _signals.signal('invitations-sent')
+
+
+def send_invitations(event_id):
+    ''' Queue the invitations of the NEW attendees of an event.
+
+    :event_id: The id of the event
+    :return: The id of the job
+    '''
+    return jobs.enqueue('invite_attendees', event_id=event_id)
+
+
+@job('invite_attendees')
+def invite_attendees(payload, progress):
+    ''' Invite the NEW attendees of an event in batches. '''
+    event_id = payload['event_id']
+    batch_size = current_app.config.get('INVITATION_BATCH_SIZE', 1000)
+    attendees = EventAttendee.__table__
+    events = Event.__table__
+    pending = db.and_(attendees.c.event_id == event_id,
+                      attendees.c.status == EventAttendee.NEW)
+
+    total = db.session.execute(
+        db.select([db.func.count()]).where(pending)).scalar()
+    invited = 0
+    progress(invited=invited, total=total)
+    while True:
+        user_ids = [row[0] for row in db.session.execute(
+            db.select([attendees.c.user_id]).where(pending)
+            .limit(batch_size))]
+        if not user_ids:
+            break
+        invitations_sent.send(current_app._get_current_object(),
+                              event_id=event_id, user_ids=user_ids)
+        count = 0
+        # bounded IN lists (SQLite allows at most 999 parameters)
+        for i in range(0, len(user_ids), 500):
+            count += db.session.execute(
+                attendees.update().where(pending).where(
+                    attendees.c.user_id.in_(user_ids[i:i + 500]))
+                .values(status=EventAttendee.INVITED)).rowcount
+        db.session.execute(
+            events.update().where(events.c.id == event_id).values(
+                new_count=events.c.new_count - count,
+                invited_count=events.c.invited_count + count))
+        db.session.commit()
+        invited += count
+        progress(invited=invited, total=total)
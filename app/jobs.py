@@ -0,0 +1,306 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' A durable job queue stored in a SQLite file and the worker running the
+    jobs outside of the web workers. Failed jobs are retried with an
+    exponential backoff, the jobs of a crashed worker are taken over once
+    their lease expired.
+'''
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+JOBS = {}
+
+
+def job(name):
+    ''' Register a function as handler of the jobs with the given name. The
+        function gets the payload (a dict) and a progress callback which
+        stores a dict with the progress of the job.
+    '''
+    def register(func):
+        JOBS[name] = func
+        return func
+    return register
+
+
+class JobQueue(object):
+
+    ''' The jobs in a SQLite file shared by the web and the worker processes.
+        The payload and the progress are stored as JSON.
+    '''
+
+    def __init__(self, filename, table='jobs'):
+        self.filename = filename
+        self.table = table
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS {0} ('
+            'id INTEGER PRIMARY KEY, name TEXT, payload TEXT, status TEXT, '
+            'attempts INTEGER, run_at REAL, locked_until REAL, '
+            'progress TEXT, error TEXT, created REAL, updated REAL)'
+            .format(table))
+        self._connection().execute(
+            'CREATE INDEX IF NOT EXISTS ix_{0}_status_run_at ON {0} '
+            '(status, run_at)'.format(table))
+
+    def _connection(self):
+        ''' Get the connection of the current thread (and process). '''
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.filename, timeout=5,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _update(self, job_id, **values):
+        values['updated'] = time.time()
+        self._connection().execute(
+            'UPDATE {0} SET {1} WHERE id = ?'.format(
+                self.table, ', '.join('{0} = ?'.format(key)
+                                      for key in sorted(values))),
+            [values[key] for key in sorted(values)] + [job_id])
+
+    def enqueue(self, name, payload, delay=0):
+        ''' Add a job.
+
+        :name: The name of the registered handler
+        :payload: A dict with the arguments of the job (JSON serializable)
+        :delay: Seconds before the job gets run
+        :return: The id of the job
+        '''
+        now = time.time()
+        return self._connection().execute(
+            'INSERT INTO {0} (name, payload, status, attempts, run_at, '
+            'created, updated) VALUES (?, ?, ?, 0, ?, ?, ?)'.format(
+                self.table),
+            (name, json.dumps(payload), QUEUED, now + delay, now, now)) \
+            .lastrowid
+
+    def claim(self, lease):
+        ''' Take the next due job, or a running job whose lease expired.
+
+        :lease: Seconds the job is locked for the caller
+        :return: A dict with id, name, payload and attempts or None
+        '''
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT id, name, payload, attempts FROM {0} WHERE '
+                '(status = ? AND run_at <= ?) OR '
+                '(status = ? AND locked_until < ?) '
+                'ORDER BY run_at, id LIMIT 1'.format(self.table),
+                (QUEUED, now, RUNNING, now)).fetchone()
+            if row is not None:
+                conn.execute(
+                    'UPDATE {0} SET status = ?, attempts = attempts + 1, '
+                    'locked_until = ?, updated = ? WHERE id = ?'.format(
+                        self.table), (RUNNING, now + lease, now, row[0]))
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        if row is None:
+            return None
+        return dict(id=row[0], name=row[1], payload=json.loads(row[2]),
+                    attempts=row[3] + 1)
+
+    def progress(self, job_id, progress, lease=None):
+        ''' Store the progress of a running job and extend its lease. '''
+        values = dict(progress=json.dumps(progress))
+        if lease is not None:
+            values['locked_until'] = time.time() + lease
+        self._update(job_id, **values)
+
+    def complete(self, job_id):
+        ''' Mark a job as done. '''
+        self._update(job_id, status=DONE, locked_until=None)
+
+    def retry(self, job_id, delay, error):
+        ''' Queue a failed job again after the given delay. '''
+        self._update(job_id, status=QUEUED, locked_until=None,
+                     run_at=time.time() + delay, error=error)
+
+    def fail(self, job_id, error):
+        ''' Mark a job as failed for good. '''
+        self._update(job_id, status=FAILED, locked_until=None, error=error)
+
+    def get(self, job_id):
+        ''' Get the state of a job as dict or None. '''
+        row = self._connection().execute(
+            'SELECT id, name, payload, status, attempts, progress, error, '
+            'created, updated FROM {0} WHERE id = ?'.format(self.table),
+            (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ('id', 'name', 'payload', 'status', 'attempts', 'progress',
+                'error', 'created', 'updated')
+        result = dict(zip(keys, row))
+        result['payload'] = json.loads(result['payload'])
+        result['progress'] = json.loads(result['progress'] or 'null')
+        return result
+
+    def purge(self, age):
+        ''' Remove the done and failed jobs older than age seconds. '''
+        self._connection().execute(
+            'DELETE FROM {0} WHERE status IN (?, ?) AND updated < ?'.format(
+                self.table), (DONE, FAILED, time.time() - age))
+
+    def close(self):
+        ''' Close the connection of the current thread. '''
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class Worker(object):
+
+    ''' Run the jobs of a queue.
+
+    :queue: The JobQueue
+    :max_attempts: The number of runs before a job fails for good
+    :backoff: The delay of the first retry, doubled for every further retry
+    :max_backoff: The longest delay between retries
+    :lease: Seconds a job stays locked without progress
+    :log: A function called with the messages of the worker
+    '''
+
+    def __init__(self, queue, max_attempts=5, backoff=5, max_backoff=600,
+                 lease=300, log=None):
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.log = log or (lambda message: None)
+
+    def run_once(self):
+        ''' Run the next due job.
+
+        :return: False if no job was due
+        '''
+        from . import db
+        claimed = self.queue.claim(self.lease)
+        if claimed is None:
+            return False
+        job_id, name = claimed['id'], claimed['name']
+
+        def progress(**values):
+            self.queue.progress(job_id, values, self.lease)
+            self.log('job {0} {1}: {2}'.format(job_id, name, ', '.join(
+                '{0}={1}'.format(key, value)
+                for key, value in sorted(values.items()))))
+
+        try:
+            handler = JOBS.get(name)
+            if handler is None:
+                raise KeyError('Unknown job: {0}'.format(name))
+            handler(claimed['payload'], progress)
+        except Exception:
+            db.session.rollback()
+            error = traceback.format_exc()
+            if claimed['attempts'] >= self.max_attempts:
+                self.queue.fail(job_id, error)
+                self.log('job {0} {1} failed'.format(job_id, name))
+            else:
+                delay = min(self.max_backoff,
+                            self.backoff * 2 ** (claimed['attempts'] - 1))
+                self.queue.retry(job_id, delay, error)
+                self.log('job {0} {1} retry in {2}s'.format(
+                    job_id, name, delay))
+        else:
+            self.queue.complete(job_id)
+            self.log('job {0} {1} done'.format(job_id, name))
+        finally:
+            db.session.remove()
+        return True
+
+    def run(self, poll_interval=1, burst=False):
+        ''' Run the jobs until interrupted.
+
+        :poll_interval: Seconds to wait if no job is due
+        :burst: Stop once no job is due
+        '''
+        while True:
+            if not self.run_once():
+                if burst:
+                    return
+                time.sleep(poll_interval)
+
+
+class Jobs(object):
+
+    ''' The job queue of the application, created on first use. The
+        following configuration values are used:
+
+        JOB_QUEUE_PATH: The SQLite file of the queue
+        JOB_MAX_ATTEMPTS, JOB_BACKOFF, JOB_MAX_BACKOFF, JOB_LEASE: The retry
+            and lease settings of the workers (see Worker)
+    '''
+
+    def __init__(self, app=None):
+        self.config = {}
+        self._queue = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Take the configuration of the given app. '''
+        self.config = app.config
+        if self._queue is not None:
+            self._queue.close()
+            self._queue = None
+
+    @property
+    def queue(self):
+        ''' The JobQueue. '''
+        if self._queue is None:
+            self._queue = JobQueue(self.config['JOB_QUEUE_PATH'])
+        return self._queue
+
+    def enqueue(self, name, **payload):
+        ''' Add a job with the given payload, returns the id of the job. '''
+        return self.queue.enqueue(name, payload)
+
+    def worker(self, log=None):
+        ''' Create a worker for the queue. '''
+        config = self.config
+        return Worker(self.queue,
+                      max_attempts=config.get('JOB_MAX_ATTEMPTS', 5),
+                      backoff=config.get('JOB_BACKOFF', 5),
+                      max_backoff=config.get('JOB_MAX_BACKOFF', 600),
+                      lease=config.get('JOB_LEASE', 300), log=log)
@@ -0,0 +1,72 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Locale selection with the available translations computed once and the
+    negotiation result cached per Accept-Language header.
+'''
+
+from werkzeug.datastructures import LanguageAccept
+from werkzeug.http import parse_accept_header
+
+from .cache import LRUCache
+
+
+class LocaleNegotiator(object):
+
+    ''' Select the best available locale for an Accept-Language header. The
+        translations are listed once (or on reload) and the result for every
+        distinct header is kept in a bounded cache.
+    '''
+
+    def __init__(self, babel, maxsize=1024):
+        self.babel = babel
+        self.locales = []
+        self._cache = LRUCache(maxsize)
+
+    def reload(self):
+        ''' List the available translations again, e.g. after new
+            translations got compiled.
+        '''
+        locales = [str(tr) for tr in self.babel.list_translations()]
+        if 'en' not in locales:
+            locales.append('en')
+        self.locales = locales
+        self._cache.clear()
+
+    def best_match(self, header):
+        ''' Get the best matching locale for the given header.
+
+        :header: The value of the Accept-Language header
+        :return: The name of the locale or None if nothing matches
+        '''
+        if not self.locales:
+            self.reload()
+        locale = self._cache.get(header, False)
+        if locale is False:
+            locale = parse_accept_header(
+                header, LanguageAccept).best_match(self.locales)
+            self._cache.set(header, locale)
+        return locale
@@ -0,0 +1,352 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' In process counters and histograms exposed in the Prometheus text format.
+    With preforked workers every process writes its values to a file in a
+    shared directory and the exposition sums the files of all processes.
+'''
+
+from bisect import bisect_left
+from collections import OrderedDict
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+class Metric(object):
+
+    ''' The base of the metrics, the values are stored per label values and
+        reported as one sample each.
+
+    :param name: The name of the metric
+    :param documentation: The help text
+    :param labels: The names of the labels
+    '''
+
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self):
+        ''' Get the samples as (name, labels, value) tuples. '''
+        with self._lock:
+            items = self._values.items()
+        return [(self.name, zip(self.labels, key), value)
+                for key, value in sorted(items)]
+
+    def reset(self):
+        ''' Drop all the values. '''
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+
+    ''' A value which only increases. '''
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        ''' Increase the counter for the given label values. '''
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        ''' Get the value for the given label values. '''
+        return self._values.get(self._key(labels), 0)
+
+
+class CallbackCounter(Counter):
+
+    ''' A counter whose values are read from a callback on collection, e.g.
+        the hit counters of the caches.
+
+    :param callback: Returns a dict with the label values tuple and the value
+    '''
+
+    def __init__(self, name, documentation, labels, callback):
+        Counter.__init__(self, name, documentation, labels)
+        self.callback = callback
+
+    def samples(self):
+        return [(self.name, zip(self.labels, key), value)
+                for key, value in sorted(self.callback().items())]
+
+
+class Histogram(Metric):
+
+    ''' Count observations in buckets (upper bounds), plus sum and count.
+
+    :param buckets: The upper bounds of the buckets, +Inf is added
+    '''
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        Metric.__init__(self, name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        ''' Record an observation for the given label values. '''
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total)
+                     for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in sorted(items):
+            labels = zip(self.labels, key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((self.name + '_bucket',
+                                labels + [('le', _format_value(bound))],
+                                cumulative))
+            samples.append((self.name + '_sum', labels, total))
+            samples.append((self.name + '_count', labels, cumulative))
+        return samples
+
+
+class Registry(object):
+
+    ''' The collection of the metrics of the process. '''
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+
+    def register(self, metric):
+        ''' Add a metric and return it. '''
+        self.metrics[metric.name] = metric
+        return metric
+
+    def collect(self):
+        ''' Get the (name, type, documentation, samples) of all metrics. '''
+        return [(metric.name, metric.type, metric.documentation,
+                 metric.samples()) for metric in self.metrics.values()]
+
+    def reset(self):
+        ''' Drop the values of all metrics. '''
+        for metric in self.metrics.values():
+            metric.reset()
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n') \
+        .replace('"', '\\"')
+
+
+def render(collected):
+    ''' Format collected metrics in the Prometheus text format (0.0.4). '''
+    lines = []
+    for name, metric_type, documentation, samples in collected:
+        lines.append('# HELP {0} {1}'.format(name, documentation))
+        lines.append('# TYPE {0} {1}'.format(name, metric_type))
+        for sample, labels, value in samples:
+            if labels:
+                sample += '{' + ','.join(
+                    '{0}="{1}"'.format(label, _escape(label_value))
+                    for label, label_value in labels) + '}'
+            lines.append('{0} {1}'.format(sample, _format_value(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def merge(collections):
+    ''' Sum the collected metrics of several processes. '''
+    merged = OrderedDict()
+    for collected in collections:
+        for name, metric_type, documentation, samples in collected:
+            entry = merged.get(name)
+            if entry is None:
+                entry = merged[name] = (metric_type, documentation,
+                                        OrderedDict())
+            values = entry[2]
+            for sample, labels, value in samples:
+                key = (sample, tuple(tuple(label) for label in labels))
+                values[key] = values.get(key, 0) + value
+    return [(name, metric_type, documentation,
+             [(sample, list(labels), value)
+              for (sample, labels), value in values.items()])
+            for name, (metric_type, documentation, values) in merged.items()]
+
+
+registry = Registry()
+
+request_latency = registry.register(Histogram(
+    'http_request_duration_seconds', 'The request latency per endpoint.',
+    ['endpoint']))
+responses = registry.register(Counter(
+    'http_responses_total', 'The responses per status code.', ['status']))
+login_attempts = registry.register(Counter(
+    'login_attempts_total', 'The login attempts per result.', ['result']))
+pool_checkouts = registry.register(Counter(
+    'db_pool_checkouts_total', 'The connections checked out of the pool.'))
+
+
+def _caches():
+    if not has_app_context():
+        return []
+    from . import locale_negotiator
+    from .models.roles import get_role_cache
+    from .models.user import get_user_cache
+    from .views.navigations import _navbar_cache
+    caches = [('locales', locale_negotiator._cache),
+              ('navbar', _navbar_cache),
+              ('roles', get_role_cache()),
+              ('users', get_user_cache())]
+    return [(name, cache) for name, cache in caches if cache is not None]
+
+
+cache_hits = registry.register(CallbackCounter(
+    'cache_hits_total', 'The cache hits per cache.', ['cache'],
+    lambda: dict(((name,), cache.hits) for name, cache in _caches())))
+cache_misses = registry.register(CallbackCounter(
+    'cache_misses_total', 'The cache misses per cache.', ['cache'],
+    lambda: dict(((name,), cache.misses) for name, cache in _caches())))
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_checkouts.inc()
+
+
+class Metrics(object):
+
+    ''' Record the request metrics and expose all metrics of the registry.
+        The following configuration values are used:
+
+        METRICS_ENABLED: Record the request metrics
+        METRICS_DIR: The directory shared by the worker processes, if set
+                     the values of all processes get summed up
+        METRICS_FLUSH_INTERVAL: Seconds between the writes of the values of
+                                a process to the directory
+    '''
+
+    _pool_hooks = False
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.directory = None
+        self._pid = os.getpid()
+        self._flushed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Register the hooks if the metrics are enabled. '''
+        if not app.config.get('METRICS_ENABLED'):
+            return
+        self.enabled = True
+        self.directory = app.config.get('METRICS_DIR')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1)
+        if self.directory and not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        app.before_request_funcs.setdefault(None, []).insert(
+            0, self._before_request)
+        app.after_request(self._after_request)
+        if not Metrics._pool_hooks:
+            event.listen(Pool, 'checkout', _on_checkout)
+            Metrics._pool_hooks = True
+
+    def _before_request(self):
+        if self._pid != os.getpid():
+            # the values of the parent belong to the file of the parent
+            self._pid = os.getpid()
+            self._flushed = 0
+            registry.reset()
+        g._metrics_start = time.time()
+
+    def _after_request(self, response):
+        start = getattr(g, '_metrics_start', None)
+        if start is not None:
+            request_latency.observe(time.time() - start,
+                                    endpoint=request.endpoint or 'unknown')
+        responses.inc(status=response.status_code)
+        if self.directory and \
+                time.time() - self._flushed > self.flush_interval:
+            self.flush()
+        return response
+
+    def _filename(self, pid):
+        return os.path.join(self.directory, 'metrics-{0}.json'.format(pid))
+
+    def flush(self):
+        ''' Write the values of this process to the shared directory. '''
+        self._flushed = time.time()
+        fd, filename = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as output:
+            json.dump(registry.collect(), output)
+        os.rename(filename, self._filename(os.getpid()))
+
+    def collect(self):
+        ''' Get the metrics of this process or of all processes. '''
+        if not self.directory:
+            return registry.collect()
+        self.flush()
+        collections = []
+        for filename in sorted(glob.glob(self._filename('*'))):
+            try:
+                with open(filename) as input:
+                    collections.append(json.load(input))
+            except (IOError, ValueError):
+                continue
+        return merge(collections)
+
+    def render(self):
+        ''' Get the metrics in the Prometheus text format. '''
+        return render(self.collect())
@@ -26,6 +26,9 @@
 
 import datetime
 
+from sqlalchemy import event, and_, or_, func
+from sqlalchemy.orm import Session, attributes
+
 from .. import db
 from ..models.user import User
 
@@ -40,9 +43,18 @@ class Event(db.Model):
     name = db.Column(db.String(256))
     created_at = db.Column(db.DateTime)
     last_changed = db.Column(db.DateTime, default=db.func.now())
-    event_date = db.Column(db.DateTime)
+    event_date = db.Column(db.DateTime, index=True)
     attendees = db.relationship('EventAttendee', cascade="all, delete-orphan",
                                 backref="event")
+    # the number of attendees per status, maintained on flush
+    new_count = db.Column(db.Integer, default=0, server_default='0',
+                          nullable=False)
+    invited_count = db.Column(db.Integer, default=0, server_default='0',
+                              nullable=False)
+    attending_count = db.Column(db.Integer, default=0, server_default='0',
+                                nullable=False)
+    declined_count = db.Column(db.Integer, default=0, server_default='0',
+                               nullable=False)
 
     def __init__(self, name, date):
         self.name = name
@@ -59,15 +71,196 @@ class EventAttendee(db.Model):
         Invited, Declined, Attending.
     '''
     NEW, INVITED, ATTENDING, DECLINED = range(4)
+    # the counter columns of the events per status
+    COUNTERS = ('new_count', 'invited_count', 'attending_count',
+                'declined_count')
     __tablename__ = "event_attendees"
-    event_id = db.Column(db.Integer,
-                         db.ForeignKey('events.id'), primary_key=True)
+    __table_args__ = (
+        # the events of a user in date order, covering the keyset pagination
+        # (the primary key only serves the lookups by event)
+        db.Index('ix_event_attendees_user_date',
+                 'user_id', 'event_date', 'event_id'),
+        db.Index('ix_event_attendees_event_status', 'event_id', 'status'))
+    # the old values are required for the counters of the events
+    event_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('events.id'), primary_key=True),
+        active_history=True)
     user_id = db.Column(db.Integer,
                         db.ForeignKey('users.id'), primary_key=True)
-    status = db.Column(db.Integer, default=NEW)
+    status = db.column_property(db.Column(db.Integer, default=NEW),
+                                active_history=True)
+    # a copy of Event.event_date maintained on flush for the user_events index
+    event_date = db.Column(db.DateTime)
 
     def __init__(self, user):
         self.user = user
         self.status = EventAttendee.NEW
 
     user = db.relationship(User, lazy='joined')
+
+
+def user_events(user_id, start=None, end=None, after=None, limit=50,
+                past=False):
+    ''' Get a page of the events of a user within a date range. The pages
+        are seeked by the (event_date, id) of the last event of the previous
+        page, every page is read from the ix_event_attendees_user_date index
+        regardless of the number of events before it.
+
+    :user_id: The id of the user
+    :start: The earliest event date (inclusive) or None
+    :end: The latest event date (exclusive) or None
+    :after: The (event_date, id) of the last event of the previous page
+    :limit: The number of events per page
+    :past: Order the events from the newest to the oldest
+    :return: The events of the page and the (event_date, id) for the next page
+             or None if it is the last page
+    '''
+    attendee = EventAttendee
+    query = Event.query.join(attendee, attendee.event_id == Event.id) \
+        .filter(attendee.user_id == user_id)
+    if start is not None:
+        query = query.filter(attendee.event_date >= start)
+    if end is not None:
+        query = query.filter(attendee.event_date < end)
+    if after is not None:
+        date, event_id = after
+        # the redundant range keeps the seek on the index
+        if past:
+            query = query.filter(attendee.event_date <= date, or_(
+                attendee.event_date < date,
+                and_(attendee.event_date == date,
+                     attendee.event_id < event_id)))
+        else:
+            query = query.filter(attendee.event_date >= date, or_(
+                attendee.event_date > date,
+                and_(attendee.event_date == date,
+                     attendee.event_id > event_id)))
+    if past:
+        query = query.order_by(attendee.event_date.desc(),
+                               attendee.event_id.desc())
+    else:
+        query = query.order_by(attendee.event_date, attendee.event_id)
+
+    events = query.limit(limit + 1).all()
+    if len(events) > limit:
+        last = events[limit - 1]
+        return events[:limit], (last.event_date, last.id)
+    return events, None
+
+
+@event.listens_for(Session, 'before_flush')
+def _copy_event_date(session, flush_context, instances):
+    events = Event.__table__
+    for obj in session.new:
+        if isinstance(obj, EventAttendee):
+            if obj.event is not None:
+                obj.event_date = obj.event.event_date
+            elif obj.event_id is not None:
+                obj.event_date = db.select([events.c.event_date]).where(
+                    events.c.id == obj.event_id).as_scalar()
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_event_date(session, flush_context):
+    attendees = EventAttendee.__table__
+    for obj in session.dirty:
+        if isinstance(obj, Event) and \
+                attributes.get_history(obj, 'event_date').has_changes():
+            session.execute(attendees.update().where(
+                attendees.c.event_id == obj.id).values(
+                event_date=obj.event_date))
+
+
+def _committed(obj, key):
+    ''' Get the value of an attribute as loaded from the db. '''
+    history = attributes.get_history(obj, key)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+@event.listens_for(Session, 'before_flush')
+def _count_attendees(session, flush_context, instances):
+    # the changes of the attendees are summed up per event and counter and
+    # applied as one increment per counter.
+    deltas = {}
+
+    def add(event_key, status, delta):
+        if event_key is not None and status is not None:
+            key = (event_key, EventAttendee.COUNTERS[status])
+            deltas[key] = deltas.get(key, 0) + delta
+
+    for obj in session.new | session.dirty | session.deleted:
+        if not isinstance(obj, EventAttendee):
+            continue
+        if obj not in session.new:
+            add(_committed(obj, 'event_id'), _committed(obj, 'status'), -1)
+        if obj not in session.deleted:
+            # the event_id only follows a changed event relationship on flush
+            if attributes.get_history(
+                    obj, 'event',
+                    attributes.PASSIVE_NO_INITIALIZE).has_changes():
+                event_obj = obj.event
+                event_key = event_obj
+                if event_obj is not None and event_obj.id is not None:
+                    event_key = event_obj.id
+            else:
+                event_key = obj.event_id
+            status = obj.status
+            if status is None:
+                status = EventAttendee.NEW
+            add(event_key, status, 1)
+
+    for (event_key, counter), delta in deltas.items():
+        if not delta:
+            continue
+        event_obj = event_key
+        if not isinstance(event_obj, Event):
+            event_obj = Event.query.get(event_key)
+            if event_obj is None:
+                continue
+        if event_obj in session.deleted:
+            continue
+        if event_obj in session.new:
+            setattr(event_obj, counter,
+                    (getattr(event_obj, counter) or 0) + delta)
+        else:
+            setattr(event_obj, counter, getattr(Event, counter) + delta)
+
+
+def recount_events(batch_size=10000):
+    ''' Repair the attendee counters of all events from a single GROUP BY
+        over the attendees, e.g. after bulk inserts which bypass the ORM.
+
+    :batch_size: The number of events per update
+    :return: The number of events with attendees
+    '''
+    events = Event.__table__
+    attendees = EventAttendee.__table__
+    update = events.update().where(events.c.id == db.bindparam('event_id')) \
+        .values(dict((counter, db.bindparam(counter))
+                     for counter in EventAttendee.COUNTERS))
+    zero = dict((counter, 0) for counter in EventAttendee.COUNTERS)
+
+    db.session.execute(events.update().values(zero))
+    rows = db.session.execute(
+        db.select([attendees.c.event_id, attendees.c.status, func.count()])
+        .group_by(attendees.c.event_id, attendees.c.status)
+        .order_by(attendees.c.event_id))
+    batch, current, updated = [], None, 0
+    for event_id, status, count in rows:
+        if current is None or current['event_id'] != event_id:
+            current = dict(zero, event_id=event_id)
+            batch.append(current)
+            updated += 1
+        current[EventAttendee.COUNTERS[status]] = count
+        if len(batch) > batch_size:
+            # the last entry may still get counts of further statuses
+            db.session.execute(update, batch[:-1])
+            batch = batch[-1:]
+    if batch:
+        db.session.execute(update, batch)
+    db.session.commit()
+    return updated
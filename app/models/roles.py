@@ -0,0 +1,280 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+from werkzeug.local import LocalProxy
+
+from .. import db
+from ..cache import make_cache
+from ..models.user import (
+    User, Group, groups_table, group_to_group, invalidate_user)
+
+
+class GroupClosure(object):
+
+    ''' The transitive closure of the group hierarchy. For every group id it
+        holds the names of the group itself and of all its parents. The whole
+        hierarchy gets loaded with two queries and is kept until it is
+        invalidated by a change of the groups or the ttl (seconds) expired.
+        The ttl limits how long other worker processes use an outdated
+        hierarchy.
+    '''
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._closure = None
+        self._loaded_at = 0
+        self.generation = 0
+
+    def invalidate(self):
+        ''' Drop the loaded hierarchy, it gets reloaded on the next access. '''
+        with self._lock:
+            self._closure = None
+            self.generation += 1
+
+    def roles(self, group_ids):
+        ''' Get the role names for the given groups including all parents.
+
+        :group_ids: The ids of the groups to resolve
+        :return: A set with the names of all the groups and their parents
+        '''
+        closure = self._closure
+        if closure is None or (self.ttl and
+                               self._loaded_at + self.ttl < time.time()):
+            closure = self._load()
+
+        roles = set()
+        for group_id in group_ids:
+            roles.update(closure.get(group_id, ()))
+        return roles
+
+    def _load(self):
+        ''' Load all groups and edges and build the ancestor sets. Cycles in
+            the hierarchy are tolerated since every group is visited once.
+        '''
+        generation = self.generation
+        names = dict(db.session.query(Group.id, Group.name))
+
+        # the parent_id column holds the group and the child_id column the
+        # parent (see Group.parents)
+        parents = {}
+        for group_id, parent_id in db.session.query(
+                group_to_group.c.parent_id, group_to_group.c.child_id):
+            parents.setdefault(group_id, []).append(parent_id)
+
+        closure = {}
+        for group_id in names:
+            seen = set([group_id])
+            stack = [group_id]
+            while stack:
+                for parent_id in parents.get(stack.pop(), ()):
+                    if parent_id not in seen:
+                        seen.add(parent_id)
+                        stack.append(parent_id)
+            closure[group_id] = frozenset(
+                names[gid] for gid in seen if gid in names)
+
+        with self._lock:
+            # don't store a hierarchy which got invalidated while loading
+            if generation == self.generation:
+                self._closure = closure
+                self._loaded_at = time.time()
+        return closure
+
+
+def get_group_closure():
+    ''' Get the group hierarchy of the current app, it gets created on first
+        use with the ROLE_CACHE_TTL as ttl.
+    '''
+    extensions = current_app.extensions
+    if 'group_closure' not in extensions:
+        extensions['group_closure'] = GroupClosure(
+            current_app.config.get('ROLE_CACHE_TTL'))
+    return extensions['group_closure']
+
+
+group_closure = LocalProxy(get_group_closure)
+
+
+def user_roles(user_id):
+    ''' Get all the role names of a user (its groups and all their parents)
+        with a single query for the group memberships.
+
+    :user_id: The id of the user
+    :return: A set with the role names
+    '''
+    group_ids = [row[0] for row in db.session.query(
+        groups_table.c.group_id).filter(groups_table.c.user_id == user_id)]
+    return group_closure.roles(group_ids)
+
+
+def get_role_cache():
+    ''' Get the cache for the resolved roles of the current app, it gets
+        created on first use from the ROLE_CACHE_* configuration.
+    '''
+    extensions = current_app.extensions
+    if 'role_cache' not in extensions:
+        extensions['role_cache'] = make_cache(current_app.config,
+                                              'ROLE_CACHE')
+    return extensions['role_cache']
+
+
+def cached_user_roles(user):
+    ''' Get the role names of a user from the role cache. The cache key
+        contains the permission version of the user, a change of the groups
+        results in a new key and therefore no query is required to validate
+        a cached entry.
+
+    :user: The user (requires id and permission_version)
+    :return: A frozenset with the role names
+    '''
+    cache = get_role_cache()
+    key = 'roles:{0}:{1}'.format(user.id, user.permission_version)
+    roles = cache.get(key)
+    if roles is None:
+        roles = frozenset(user_roles(user.id))
+        cache.set(key, roles)
+    return roles
+
+
+def _groups_changed(session):
+    ''' Check if the flushed objects change the group hierarchy. '''
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Group):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, Group) and any(
+                attributes.get_history(obj, key).has_changes()
+                for key in ('name', 'parents', 'children')):
+            return True
+    return False
+
+
+def _hierarchy_members(session):
+    ''' Get the ids of the users in the groups whose place in the hierarchy
+        changes with this flush, including the members of all their
+        descendant groups (their roles contain the changed groups as well).
+    '''
+    group_ids = set()
+    for obj in session.deleted:
+        if isinstance(obj, Group):
+            group_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Group) and obj.id is not None and any(
+                attributes.get_history(obj, key).has_changes()
+                for key in ('name', 'parents')):
+            group_ids.add(obj.id)
+    if not group_ids:
+        return set()
+
+    # the parent_id column holds the group and the child_id column the
+    # parent (see Group.parents)
+    children = {}
+    for group_id, parent_id in session.execute(db.select(
+            [group_to_group.c.parent_id, group_to_group.c.child_id])):
+        children.setdefault(parent_id, []).append(group_id)
+    stack = list(group_ids)
+    while stack:
+        for child_id in children.get(stack.pop(), ()):
+            if child_id not in group_ids:
+                group_ids.add(child_id)
+                stack.append(child_id)
+    return set(row[0] for row in session.execute(
+        db.select([groups_table.c.user_id]).where(
+            groups_table.c.group_id.in_(group_ids)).distinct()))
+
+
+@event.listens_for(Session, 'before_flush')
+def _before_flush(session, flush_context, instances):
+    # a changed membership results in a new permission version of the user
+    users = set()
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            if attributes.get_history(obj, 'groups').has_changes():
+                users.add(obj)
+        elif isinstance(obj, Group):
+            history = attributes.get_history(obj, 'users')
+            users.update(history.added)
+            users.update(history.deleted)
+    # existing users added to a new group
+    for obj in session.new:
+        if isinstance(obj, Group):
+            users.update(attributes.get_history(obj, 'users').added)
+    for user in users:
+        if user not in session.new:
+            user.permission_version = User.permission_version + 1
+
+    # a change of the hierarchy changes the roles of the members of the
+    # changed groups and of their descendants, collected before the flush
+    # removes the memberships of deleted groups
+    members = _hierarchy_members(session)
+    if members:
+        session.info.setdefault('hierarchy_members', set()).update(members)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    if _groups_changed(session):
+        session.info['group_closure_changed'] = True
+        if has_app_context():
+            group_closure.invalidate()
+    members = sorted(session.info.pop('hierarchy_members', ()))
+    users = User.__table__
+    # bounded IN lists (SQLite allows at most 999 parameters)
+    for i in range(0, len(members), 500):
+        session.execute(users.update().where(
+            users.c.id.in_(members[i:i + 500])).values(
+                permission_version=users.c.permission_version + 1))
+
+
+def invalidate_roles():
+    ''' Drop the group hierarchy and all the cached roles. Required after
+        changes which bypass the ORM (e.g. bulk inserts).
+    '''
+    if not has_app_context():
+        return
+    extensions = current_app.extensions
+    if 'group_closure' in extensions:
+        extensions['group_closure'].invalidate()
+    if 'role_cache' in extensions:
+        extensions['role_cache'].clear()
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _after_transaction(session):
+    # invalidate again since other sessions could have loaded the old state
+    # between the flush and the end of the transaction.
+    if session.info.pop('group_closure_changed', False):
+        # all the cached entries are outdated by the new permission versions
+        invalidate_roles()
+        invalidate_user()
@@ -25,16 +25,24 @@
 #
 
 import datetime
+from collections import namedtuple
 
-from .. import db, login_manager
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import db, login_manager, password_hasher
+from ..cache import make_cache
 
 
 groups_table = db.Table('group_to_user',
                         db.Column('user_id', db.Integer,
                                   db.ForeignKey('users.id')),
                         db.Column('group_id', db.Integer,
-                                  db.ForeignKey('groups.id')))
+                                  db.ForeignKey('groups.id')),
+                        db.Index('ix_group_to_user_user_id',
+                                 'user_id', 'group_id'),
+                        db.Index('ix_group_to_user_group_id', 'group_id'))
 
 group_to_group = db.Table('group_to_group',
                           db.Column('parent_id', db.Integer,
@@ -42,7 +50,8 @@ group_to_group = db.Table('group_to_group',
                                     primary_key=True),
                           db.Column('child_id', db.Integer,
                                     db.ForeignKey('groups.id'),
-                                    primary_key=True))
+                                    primary_key=True),
+                          db.Index('ix_group_to_group_child_id', 'child_id'))
 
 
 class Group(db.Model):
@@ -76,9 +85,13 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64))
     email = db.Column(db.String(120), unique=True)
-    password = db.Column(db.String(40))
+    password = db.Column(db.String(128))
     created_at = db.Column(db.DateTime)
     last_login = db.Column(db.DateTime, default=db.func.now())
+    # bumped whenever the group memberships (or the hierarchy) change, used
+    # as key for the cached roles
+    permission_version = db.Column(db.Integer, default=0, nullable=False,
+                                   server_default='0')
     groups = db.relationship('Group', secondary=groups_table,
                              backref=db.backref('group_to_user',
                                                 lazy='dynamic',
@@ -96,7 +109,7 @@ class User(db.Model):
 
         :password: The new password to set
         '''
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
 
     def check_password(self, password):
         ''' Check if the provided password matches the set password.
@@ -104,7 +117,7 @@ class User(db.Model):
         :password: The password to check
         :return: True if the password is correct and False if not
         '''
-        return check_password_hash(self.password, password)
+        return password_hasher.check(self.password, password)
 
     def is_authenticated(self):
         ''' Return True if the user is authenticated. If a user object gets
@@ -136,13 +149,101 @@ class User(db.Model):
         return '<User {0}>'.format(self.name)
 
 
-@login_manager.user_loader
-def load_user(id):
-    ''' Get the user for a given user id.
+class UserSnapshot(namedtuple('UserSnapshot',
+                                'id name email permission_version')):
 
-    :id: The unicde representation of the id (numerical value)
+    ''' A detached read-only copy of a user as stored in the user cache. It
+        provides everything required by Flask-Login, Flask-Principal and the
+        views but no relationships.
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def from_user(cls, user):
+        ''' Create a snapshot of the given user object. '''
+        return cls(user.id, user.name, user.email, user.permission_version)
+
+    def is_authenticated(self):
+        return True
+
+    def is_active(self):
+        return True
+
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return unicode(self.id)
+
+    def __repr__(self):
+        return '<User {0}>'.format(self.name)
+
+
+def get_user_cache():
+    ''' Get the user cache of the current app if it is enabled
+        (USER_CACHE_ENABLED), it gets created on first use from the
+        USER_CACHE_* configuration.
     '''
-    return User.query.get(int(id))
+    if not current_app.config.get('USER_CACHE_ENABLED'):
+        return None
+    extensions = current_app.extensions
+    if 'user_cache' not in extensions:
+        extensions['user_cache'] = make_cache(current_app.config,
+                                              'USER_CACHE')
+    return extensions['user_cache']
 
 
+def invalidate_user(user_id=None):
+    ''' Remove a user from the user cache.
 
+    :user_id: The id of the user to remove or None to clear the whole cache
+    '''
+    if not has_app_context():
+        return
+    cache = current_app.extensions.get('user_cache')
+    if cache is not None:
+        if user_id is None:
+            cache.clear()
+        else:
+            cache.delete('user:{0}'.format(user_id))
+
+
+@login_manager.user_loader
+def load_user(id):
+    ''' Get the user for a given user id. If the user cache is enabled a
+        read-only snapshot of the user is returned.
+
+    :id: The unicde representation of the id (numerical value)
+    '''
+    cache = get_user_cache()
+    if cache is None:
+        return User.query.get(int(id))
+
+    key = 'user:{0}'.format(int(id))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        user = User.query.get(int(id))
+        if user is None:
+            return None
+        snapshot = UserSnapshot.from_user(user)
+        cache.set(key, snapshot)
+    return snapshot
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _after_transaction(session):
+    # invalidate again since other sessions could have cached the old state
+    # between the flush and the end of the transaction.
+    for user_id in session.info.pop('changed_users', ()):
+        invalidate_user(user_id)
@@ -0,0 +1,151 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' A cache of the complete pages served to anonymous clients. The cached
+    pages are served before the identity, the user or the templates are
+    loaded and carry a strong ETag, a client sending it in If-None-Match gets
+    a 304 without the body.
+'''
+
+import hashlib
+
+from flask import current_app, g, request, session
+from flask.ext.babel import get_locale
+from flask.ext.wtf.csrf import generate_csrf
+
+from .cache import make_cache
+
+
+# Replaces the CSRF token in the cached pages, a fresh token of the session
+# is filled in for every response.
+CSRF_PLACEHOLDER = b'\x00csrf_token\x00'
+
+
+def register_csrf_token(token):
+    ''' Register a CSRF token rendered into the current page, the page cache
+        replaces it in the cached page by the token of the client.
+
+    :token: The rendered token
+    '''
+    if token:
+        g.page_cache_tokens = getattr(g, 'page_cache_tokens', ()) + (token,)
+
+
+def _anonymous():
+    ''' True if the request is from a client without a user (no login and no
+        remember cookie) and without pending flash messages.
+    '''
+    cookie = current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')
+    return ('user_id' not in session and '_flashes' not in session and
+            cookie not in request.cookies)
+
+
+class PageCache(object):
+
+    ''' Serve the pages of PAGE_CACHE_ENDPOINTS and the error pages with a
+        status in PAGE_CACHE_ERRORS from a cache (see make_cache for the
+        PAGE_CACHE_* backend values) to anonymous GET requests. The pages are
+        cached per endpoint, view arguments, locale and query string.
+    '''
+
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Register the request hooks if PAGE_CACHE_ENABLED is set. '''
+        if not app.config.get('PAGE_CACHE_ENABLED'):
+            return
+        self.cache = make_cache(app.config, 'PAGE_CACHE')
+        self.endpoints = frozenset(app.config.get('PAGE_CACHE_ENDPOINTS', ()))
+        self.errors = frozenset(app.config.get('PAGE_CACHE_ERRORS', ()))
+        # serve the cached pages before the identity is loaded
+        app.before_request_funcs.setdefault(None, []).insert(0, self._serve)
+        app.after_request(self._store)
+
+    def clear(self):
+        ''' Drop all the cached pages (e.g. after a deployment). '''
+        if self.cache is not None:
+            self.cache.clear()
+
+    def _key(self):
+        view_args = sorted((request.view_args or {}).items())
+        return 'page:{0}:{1!r}:{2}:{3}'.format(
+            request.endpoint, view_args, get_locale(), request.query_string)
+
+    def _serve(self):
+        # g outlives the request if the app context was pushed before
+        g.page_cache_key = g.page_cache_hit = None
+        g.page_cache_tokens = ()
+        if request.method not in ('GET', 'HEAD') or not _anonymous():
+            return None
+        g.page_cache_key = self._key()
+        entry = self.cache.get(g.page_cache_key)
+        if entry is None:
+            return None
+        g.page_cache_hit = True
+        status, mimetype, body, etag, csrf = entry
+        if etag is not None and request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            if csrf:
+                body = body.replace(CSRF_PLACEHOLDER, generate_csrf())
+            response = current_app.response_class(body, status,
+                                                  mimetype=mimetype)
+        return self._headers(response, etag)
+
+    def _store(self, response):
+        key = getattr(g, 'page_cache_key', None)
+        if key is None or g.page_cache_hit:
+            return response
+        if not (request.endpoint in self.endpoints and
+                response.status_code == 200 or
+                response.status_code in self.errors):
+            return response
+        if (response.direct_passthrough or not _anonymous() or
+                response.cache_control.private or
+                response.cache_control.no_store):
+            return response
+
+        body = response.get_data()
+        tokens = g.page_cache_tokens
+        etag = None
+        if tokens:
+            # the page differs for every client, it is cached without ETag
+            for token in tokens:
+                body = body.replace(token.encode('ascii'), CSRF_PLACEHOLDER)
+        elif response.status_code == 200:
+            etag = hashlib.sha1(body).hexdigest()
+        self.cache.set(key, (response.status_code, response.mimetype, body,
+                             etag, bool(tokens)))
+        return self._headers(response, etag)
+
+    def _headers(self, response, etag):
+        if etag is not None:
+            response.set_etag(etag)
+        response.vary.update(('Accept-Language', 'Cookie'))
+        return response
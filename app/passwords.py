@@ -0,0 +1,187 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Password hashing in a bounded pool of worker processes. The PBKDF2
+    hashes are expensive on purpose, running them in a pool keeps a burst of
+    logins from blocking all the request threads.
+'''
+
+import multiprocessing
+import os
+import threading
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# the pools are shared by the hashers of all the apps of a process, they are
+# keyed by the process id and the number of processes
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PasswordHasherBusy(Exception):
+
+    ''' Raised if the hashing pool is saturated or a hash timed out. '''
+
+
+class PasswordHasher(object):
+
+    ''' Hash and check passwords with the configured method. The following
+        configuration values are used:
+
+        PASSWORD_HASH_METHOD: The werkzeug hash method (e.g. pbkdf2:sha256)
+        PASSWORD_HASH_ITERATIONS: The PBKDF2 iterations
+        PASSWORD_HASH_PROCESSES: The size of the pool, None for the number of
+                                 cores and 0 to hash in the calling thread
+        PASSWORD_HASH_MAX_PENDING: The maximal number of queued hashes
+        PASSWORD_HASH_TIMEOUT: Seconds to wait for a hash
+    '''
+
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256'
+        self.iterations = 10000
+        self.processes = 0
+        self.max_pending = None
+        self.timeout = None
+        self._pending = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Read the configuration of the given app. '''
+        config = app.config
+        self.method = config.get('PASSWORD_HASH_METHOD', self.method)
+        self.iterations = config.get('PASSWORD_HASH_ITERATIONS',
+                                     self.iterations)
+        self.processes = config.get('PASSWORD_HASH_PROCESSES', self.processes)
+        if self.processes is None:
+            self.processes = multiprocessing.cpu_count()
+        self.max_pending = config.get('PASSWORD_HASH_MAX_PENDING') or \
+            self.processes * 4
+        self.timeout = config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._pending = threading.BoundedSemaphore(max(self.max_pending, 1))
+
+    @property
+    def full_method(self):
+        ''' The method as stored in front of the hash. '''
+        if self.method.startswith('pbkdf2:'):
+            return '{0}:{1}'.format(self.method, self.iterations)
+        return self.method
+
+    def hash(self, password):
+        ''' Create a salted hash of the given password.
+
+        :password: The password to hash
+        :return: The hash in the werkzeug format (method$salt$hash)
+        '''
+        return self._run(generate_password_hash, password, self.full_method)
+
+    def hash_many(self, passwords):
+        ''' Hash a batch of passwords with all the processes of the pool, e.g.
+            for imports. The batch is not limited by the pending hashes.
+
+        :passwords: A list of passwords
+        :return: The list of the hashes
+        '''
+        args = [(password, self.full_method) for password in passwords]
+        if not self.processes:
+            return [_generate(arg) for arg in args]
+        chunksize = max(1, len(args) // (self.processes * 4))
+        return self._get_pool().map(_generate, args, chunksize)
+
+    def check(self, pwhash, password):
+        ''' Check the password against the given hash.
+
+        :pwhash: The stored hash
+        :password: The password to check
+        :return: True if the password matches
+        '''
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        ''' Check if the given hash was created with outdated parameters.
+
+        :pwhash: The stored hash
+        :return: True if the hash should be replaced
+        '''
+        return pwhash.split('$', 1)[0] != self.full_method
+
+    def shutdown(self):
+        ''' Stop the worker processes. '''
+        with _pools_lock:
+            pool = _pools.pop((os.getpid(), self.processes), None)
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+                # the terminated tasks never free their slots
+                self._pending = threading.BoundedSemaphore(
+                    max(self.max_pending, 1))
+
+    def _get_pool(self):
+        ''' Get the pool, it gets created lazily in every process. '''
+        key = (os.getpid(), self.processes)
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = multiprocessing.Pool(self.processes)
+            return pool
+
+    def _run(self, func, *args):
+        if not self.processes:
+            return func(*args)
+
+        pending = self._pending
+        if not pending.acquire(False):
+            raise PasswordHasherBusy('Too many pending password hashes')
+        try:
+            # the slot is freed when the task finished, a timed out hash
+            # keeps its slot until the pool is done with it
+            result = self._get_pool().apply_async(
+                _call, (func, args), callback=lambda rv: pending.release())
+        except Exception:
+            pending.release()
+            raise
+        try:
+            error, value = result.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            raise PasswordHasherBusy('Password hash timed out')
+        if error:
+            raise value
+        return value
+
+
+def _call(func, args):
+    ''' Run a function in a pool process, the exceptions are returned to
+        always reach the callback of the task.
+    '''
+    try:
+        return False, func(*args)
+    except Exception as e:
+        return True, e
+
+
+def _generate(args):
+    ''' Hash a (password, method) tuple in a pool process. '''
+    return generate_password_hash(*args)
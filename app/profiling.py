@@ -0,0 +1,171 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Profile single requests in place. A request is run under cProfile if an
+    admin adds the _profile query argument or the request carries a signed
+    X-Profile header. The pstats files are kept in a directory with a bounded
+    number of files.
+'''
+
+import cProfile
+from datetime import datetime
+import os
+import pstats
+from StringIO import StringIO
+import time
+
+from flask import g, request
+from itsdangerous import TimestampSigner, BadSignature
+from werkzeug.utils import secure_filename
+
+# the sort keys of the reports
+SORT_KEYS = ('cumulative', 'time', 'calls', 'name')
+
+
+class Profiler(object):
+
+    ''' Run requests under cProfile on demand. The following configuration
+        values are used:
+
+        PROFILING_ENABLED: Allow the profiling of requests
+        PROFILE_DIR: The directory for the pstats files
+        PROFILE_RETENTION: The number of pstats files to keep
+        PROFILE_TOKEN_MAX_AGE: Seconds a signed X-Profile header is valid
+
+    :param permission: The permission required to profile with the _profile
+                       query argument
+    '''
+
+    header = 'X-Profile'
+
+    def __init__(self, permission, app=None):
+        self.permission = permission
+        self.directory = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Register the hooks if the profiling is enabled. '''
+        if not app.config.get('PROFILING_ENABLED'):
+            return
+        self.directory = app.config['PROFILE_DIR']
+        self.retention = app.config.get('PROFILE_RETENTION', 50)
+        self.max_age = app.config.get('PROFILE_TOKEN_MAX_AGE', 3600)
+        self.signer = TimestampSigner(app.config['SECRET_KEY'],
+                                      salt='profile')
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        # the identity has to be loaded to check the permission
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def make_token(self):
+        ''' Create the value for a signed X-Profile header. '''
+        return self.signer.sign('profile')
+
+    def _requested(self):
+        token = request.headers.get(self.header)
+        if token:
+            try:
+                self.signer.unsign(token, max_age=self.max_age)
+                return True
+            except BadSignature:
+                return False
+        return '_profile' in request.args and self.permission.can()
+
+    def _before_request(self):
+        if self._requested():
+            g._profile = cProfile.Profile()
+            g._profile_start = time.time()
+            g._profile.enable()
+
+    def _teardown_request(self, exception):
+        profile = getattr(g, '_profile', None)
+        if profile is None:
+            return
+        profile.disable()
+        duration = time.time() - g._profile_start
+        g._profile = None
+        name = '{0:%Y%m%d-%H%M%S-%f}_{1}_{2}.pstats'.format(
+            datetime.utcnow(), request.endpoint or 'unknown',
+            int(duration * 1000))
+        profile.dump_stats(os.path.join(self.directory, name))
+        self._prune()
+
+    def _prune(self):
+        ''' Remove the oldest files above the retention. '''
+        for profile in self.profiles()[self.retention:]:
+            try:
+                os.unlink(os.path.join(self.directory, profile['name']))
+            except OSError:
+                pass
+
+    def profiles(self):
+        ''' Get the captured profiles, the newest first.
+
+        :return: A list of dicts with name, created, endpoint, duration (ms)
+                 and size (bytes)
+        '''
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith('.pstats'):
+                continue
+            created, endpoint = name[:-len('.pstats')].split('_', 1)
+            endpoint, duration = endpoint.rsplit('_', 1)
+            result.append(dict(
+                name=name,
+                created=datetime.strptime(created, '%Y%m%d-%H%M%S-%f'),
+                endpoint=endpoint,
+                duration=int(duration),
+                size=os.path.getsize(os.path.join(self.directory, name))))
+        return result
+
+    def filename(self, name):
+        ''' Get the path of a captured profile or None if it does not exist.
+
+        :param name: The name of the profile as listed by profiles
+        '''
+        if not self.directory or name != secure_filename(name) or \
+                not name.endswith('.pstats'):
+            return None
+        filename = os.path.join(self.directory, name)
+        return filename if os.path.isfile(filename) else None
+
+    def report(self, name, limit=40, sort='cumulative'):
+        ''' Get the pstats report of a captured profile as text.
+
+        :param name: The name of the profile as listed by profiles
+        :param limit: The number of functions to list
+        :param sort: The sort key of the functions (see SORT_KEYS)
+        '''
+        if sort not in SORT_KEYS:
+            raise ValueError('Unknown sort key: {0}'.format(sort))
+        output = StringIO()
+        stats = pstats.Stats(self.filename(name), stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
@@ -0,0 +1,180 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' A server-side session store. The cookie only holds an opaque random id,
+    the session data is kept in a cache (in memory or in a SQLite file shared
+    by the worker processes) and only written back if it changed.
+'''
+
+import binascii
+import cPickle as pickle
+import logging
+import os
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from .cache import make_cache
+
+logger = logging.getLogger('app.sessions')
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+
+    ''' The session data of a request.
+
+    :sid: The id of the session, None for a new session
+    :data: The stored data
+    :serialized: The data as loaded, to detect the changes
+    :stale: Write the session back even if it did not change
+    '''
+
+    def __init__(self, sid=None, data=None, serialized=None, stale=False):
+        CallbackDict.__init__(self, data)
+        self.sid = sid
+        self.new = sid is None
+        self.serialized = serialized
+        self.stale = stale
+        self.initial_user = self.get('user_id')
+        # Flask-Principal marks the session modified on every request,
+        # the changes are detected by comparing the serialized data.
+        self.modified = False
+
+
+def _new_sid():
+    return binascii.hexlify(os.urandom(16))
+
+
+def _dumps(data):
+    return pickle.dumps(dict(data), pickle.HIGHEST_PROTOCOL)
+
+
+class ServerSideSessionInterface(SessionInterface):
+
+    ''' Keep the sessions in a cache created by make_cache from the SESSION_*
+        configuration. The expiry of unchanged sessions is refreshed after
+        half of SESSION_TTL and a background thread purges the expired
+        sessions every SESSION_SWEEP_INTERVAL seconds.
+
+    :config: The application configuration
+    '''
+
+    # Flask-Login keeps the identifier of the client in every session, a
+    # session with nothing else is not stored.
+    volatile_keys = frozenset(['_id'])
+
+    def __init__(self, config):
+        self.store = make_cache(config, 'SESSION')
+        self.ttl = config.get('SESSION_TTL')
+        self.sweep_interval = config.get('SESSION_SWEEP_INTERVAL')
+        self.writes = 0
+        self._sweeper_pid = None
+        self._lock = threading.Lock()
+
+    def open_session(self, app, request):
+        self._start_sweeper()
+        sid = request.cookies.get(app.session_cookie_name)
+        if sid:
+            entry = self.store.get('session:' + sid)
+            if entry is not None:
+                written, serialized = entry
+                stale = self.ttl and written + self.ttl / 2 < time.time()
+                return ServerSideSession(sid, pickle.loads(serialized),
+                                         serialized, stale)
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not set(session) - self.volatile_keys:
+            if not session.new:
+                self.store.delete('session:' + session.sid)
+                response.delete_cookie(app.session_cookie_name,
+                                       domain=domain, path=path)
+            return
+
+        serialized = _dumps(session)
+        if serialized == session.serialized and not session.stale:
+            return
+        sid = session.sid
+        if sid is None or session.initial_user != session.get('user_id'):
+            # a new id after the login or the logout (session fixation)
+            if sid is not None:
+                self.store.delete('session:' + sid)
+            sid = _new_sid()
+        self.store.set('session:' + sid, (time.time(), serialized))
+        self.writes += 1
+        response.set_cookie(app.session_cookie_name, sid,
+                            expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain, path=path,
+                            secure=self.get_cookie_secure(app))
+
+    def _start_sweeper(self):
+        ''' Start the purge of the expired sessions (once per process). '''
+        if not self.sweep_interval or self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            thread = threading.Thread(target=self._sweep,
+                                      name='session-sweeper')
+            thread.daemon = True
+            thread.start()
+
+    def purge(self):
+        ''' Remove the expired sessions, a failure is logged and the next
+            sweep tries again.
+        '''
+        try:
+            self.store.purge()
+        except Exception:
+            logger.exception('Purging the expired sessions failed')
+
+    def _sweep(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.purge()
+
+
+class ServerSideSessions(object):
+
+    ''' Replace the signed cookie sessions by server-side sessions if
+        SESSION_BACKEND is set ('memory' or 'sqlite', see make_cache for the
+        other SESSION_* values).
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Install the session interface if a backend is configured. '''
+        if app.config.get('SESSION_BACKEND'):
+            app.session_interface = ServerSideSessionInterface(app.config)
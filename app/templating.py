@@ -0,0 +1,107 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Compiled templates shared by the worker processes. The bytecode of the
+    compiled templates is kept in a directory, a cold worker loads it instead
+    of parsing and compiling the templates, and the templates can be
+    compiled ahead at deploy time (run.py compile_templates).
+'''
+
+import errno
+import os
+import tempfile
+
+from jinja2 import FileSystemBytecodeCache
+
+
+class SharedBytecodeCache(FileSystemBytecodeCache):
+
+    ''' A bytecode cache directory used by several processes. The files are
+        written to a temporary file and renamed, a concurrent reader never
+        sees a partial file.
+    '''
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.rename(tmp, filename)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+
+class TemplateCache(object):
+
+    ''' Keep the compiled templates in TEMPLATE_CACHE_DIR (None to disable,
+        a relative path is within the instance folder) and check the
+        templates for changes only if TEMPLATES_AUTO_RELOAD is set (None
+        follows DEBUG).
+    '''
+
+    def __init__(self, app=None):
+        self.bytecode_cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Configure the template environment of the app. '''
+        auto_reload = app.config.get('TEMPLATES_AUTO_RELOAD')
+        if auto_reload is None:
+            auto_reload = app.debug
+        app.jinja_env.auto_reload = auto_reload
+
+        directory = app.config.get('TEMPLATE_CACHE_DIR')
+        if directory:
+            directory = os.path.join(app.instance_path, directory)
+            try:
+                os.makedirs(directory)
+            except OSError as e:
+                # created by a worker started at the same time
+                if e.errno != errno.EEXIST:
+                    raise
+            self.bytecode_cache = SharedBytecodeCache(directory)
+            app.jinja_env.bytecode_cache = self.bytecode_cache
+
+    def compile(self, app):
+        ''' Load all the templates of the app (including the templates of
+            the blueprints), the bytecode gets written to the cache.
+
+        :app: The application with the views registered
+        :return: The names of the compiled templates
+        '''
+        names = app.jinja_env.list_templates(
+            filter_func=lambda name: name.endswith('.html'))
+        for name in names:
+            app.jinja_env.get_template(name)
+        return names
+
+    def clear(self):
+        ''' Remove the cached bytecode, e.g. after a jinja upgrade. '''
+        if self.bytecode_cache is not None:
+            self.bytecode_cache.clear()
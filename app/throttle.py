@@ -0,0 +1,207 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Token bucket rate limiting for the login. The limiter rejects attempts
+    before the expensive password hash gets computed.
+'''
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter(object):
+
+    ''' An in-process token bucket per key. Every bucket holds up to burst
+        tokens and gets refilled with rate tokens per second. The number of
+        buckets is bounded, the least recently used buckets get dropped
+        (which is the same as a full bucket).
+    '''
+
+    def __init__(self, rate, burst, maxsize=100000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key):
+        ''' Take a token from the bucket of the given key.
+
+        :key: The key of the bucket (e.g. an email or an ip address)
+        :return: True if a token was available and False if throttled
+        '''
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed
+
+
+class SQLiteTokenBucketLimiter(object):
+
+    ''' A token bucket per key stored in a SQLite file, the buckets are shared
+        by all the worker processes on the same host. Every purge_interval
+        calls of consume in a process the full buckets get removed.
+    '''
+
+    purge_interval = 1000
+
+    def __init__(self, filename, rate, burst, table='buckets'):
+        self.filename = filename
+        self.rate = rate
+        self.burst = burst
+        self.table = table
+        self._consumed = 0
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS {0} '
+            '(key TEXT PRIMARY KEY, tokens REAL, updated REAL)'.format(table))
+
+    def _connection(self):
+        ''' Get the connection of the current thread (and process). '''
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.filename, timeout=5,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def consume(self, key):
+        ''' Take a token from the bucket of the given key.
+
+        :key: The key of the bucket (e.g. an email or an ip address)
+        :return: True if a token was available and False if throttled
+        '''
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, updated FROM {0} WHERE key = ?'.format(
+                    self.table), (key,)).fetchone()
+            tokens, updated = row if row is not None else (self.burst, now)
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                'INSERT OR REPLACE INTO {0} (key, tokens, updated) '
+                'VALUES (?, ?, ?)'.format(self.table), (key, tokens, now))
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        self._consumed += 1
+        if self._consumed % self.purge_interval == 0:
+            self.purge()
+        return allowed
+
+    def purge(self):
+        ''' Remove the buckets which are full again. '''
+        self._connection().execute(
+            'DELETE FROM {0} WHERE updated + (? - tokens) / ? < ?'.format(
+                self.table), (self.burst, self.rate, time.time()))
+
+    def close(self):
+        ''' Close the connection of the current thread. '''
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class LoginThrottle(object):
+
+    ''' Limit the login attempts per email and per client ip address. The
+        following configuration values are used:
+
+        LOGIN_THROTTLE_ENABLED: Enable the throttling
+        LOGIN_THROTTLE_BACKEND: 'memory' or 'sqlite' to share the buckets
+        LOGIN_THROTTLE_PATH: The SQLite file (sqlite only)
+        LOGIN_THROTTLE_EMAIL_RATE, LOGIN_THROTTLE_EMAIL_BURST: The refill rate
+            (attempts per second) and the burst per email
+        LOGIN_THROTTLE_IP_RATE, LOGIN_THROTTLE_IP_BURST: The same per ip
+    '''
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.email_limiter = None
+        self.ip_limiter = None
+        self.allowed = 0
+        self.throttled_email = 0
+        self.throttled_ip = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Create the limiters from the configuration of the given app. '''
+        config = app.config
+        self.enabled = config.get('LOGIN_THROTTLE_ENABLED', True)
+        backend = config.get('LOGIN_THROTTLE_BACKEND', 'memory')
+        email = (config.get('LOGIN_THROTTLE_EMAIL_RATE', 0.1),
+                 config.get('LOGIN_THROTTLE_EMAIL_BURST', 10))
+        ip = (config.get('LOGIN_THROTTLE_IP_RATE', 1),
+              config.get('LOGIN_THROTTLE_IP_BURST', 50))
+        if backend == 'memory':
+            self.email_limiter = TokenBucketLimiter(*email)
+            self.ip_limiter = TokenBucketLimiter(*ip)
+        elif backend == 'sqlite':
+            filename = config['LOGIN_THROTTLE_PATH']
+            self.email_limiter = SQLiteTokenBucketLimiter(
+                filename, *email, table='email_buckets')
+            self.ip_limiter = SQLiteTokenBucketLimiter(
+                filename, *ip, table='ip_buckets')
+        else:
+            raise ValueError('Unknown throttle backend: {0}'.format(backend))
+
+    def allow(self, email, ip):
+        ''' Check if another login attempt is allowed.
+
+        :email: The email used for the login
+        :ip: The ip address of the client
+        :return: True if the attempt is allowed
+        '''
+        if not self.enabled:
+            return True
+        if not self.ip_limiter.consume(ip or ''):
+            self.throttled_ip += 1
+            return False
+        if not self.email_limiter.consume((email or '').lower()):
+            self.throttled_email += 1
+            return False
+        self.allowed += 1
+        return True
@@ -24,4 +24,16 @@
 # THE POSSIBILITY OF SUCH DAMAGE.
 #
 
-import main
+from .. import babel
+
+
+def init_app(app):
+    ''' Register all the blueprints on the given app. The view modules get
+        imported on the first call.
+    '''
+    from . import main, auth, admin
+
+    app.register_blueprint(main.blueprint)
+    app.register_blueprint(auth.blueprint)
+    app.register_blueprint(admin.blueprint)
+    babel.localeselector(main.get_local)
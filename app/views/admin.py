@@ -0,0 +1,114 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    jsonify,
+    render_template,
+    request,
+    send_file,
+    url_for,
+    g)
+from flask.ext.babel import gettext
+
+from .. import admin_permission, metrics, profiler, jobs
+from ..invitations import send_invitations
+from ..models.event import Event
+from ..profiling import SORT_KEYS
+from .navigations import navbar
+
+blueprint = Blueprint('admin', __name__)
+
+
+@blueprint.route('/admin')
+@admin_permission.require(403)
+def admin():
+    ''' The admin start page '''
+    return render_template(
+        'admin.html',
+        text=gettext("Admin welcome to the Matrix %(name)s", name=g.user.name),
+        title="App [Admin]",
+        navbar=navbar('user'))
+
+
+@blueprint.route('/metrics')
+@admin_permission.require(403)
+def show_metrics():
+    ''' The metrics in the Prometheus text format '''
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@blueprint.route('/admin/profiles')
+@admin_permission.require(403)
+def profiles():
+    ''' The list of the captured request profiles '''
+    return render_template(
+        'admin_profiles.html',
+        profiles=profiler.profiles(),
+        title="App [Profiles]",
+        navbar=navbar('user'))
+
+
+@blueprint.route('/admin/profiles/<name>')
+@admin_permission.require(403)
+def profile(name):
+    ''' The report of a captured profile or the pstats file (?download) '''
+    filename = profiler.filename(name)
+    if filename is None:
+        abort(404)
+    if 'download' in request.args:
+        return send_file(filename, as_attachment=True,
+                         mimetype='application/octet-stream')
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in SORT_KEYS:
+        abort(400)
+    return Response(profiler.report(name, sort=sort), mimetype='text/plain')
+
+
+@blueprint.route('/admin/events/<int:event_id>/invitations', methods=['POST'])
+@admin_permission.require(403)
+def invite(event_id):
+    ''' Queue the invitations of the new attendees of an event '''
+    if Event.query.get(event_id) is None:
+        abort(404)
+    job_id = send_invitations(event_id)
+    return jsonify(job=job_id,
+                   url=url_for('admin.job_status', job_id=job_id)), 202
+
+
+@blueprint.route('/admin/jobs/<int:job_id>')
+@admin_permission.require(403)
+def job_status(job_id):
+    ''' The state and the progress of a background job '''
+    state = jobs.queue.get(job_id)
+    if state is None:
+        abort(404)
+    return jsonify(**state)
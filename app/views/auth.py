@@ -0,0 +1,82 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+from flask import (
+    Blueprint,
+    render_template,
+    redirect,
+    url_for,
+    request,
+    session,
+    current_app)
+from flask.ext.login import (
+    login_user,
+    logout_user,
+    login_required)
+from flask.ext.principal import (
+    identity_changed,
+    AnonymousIdentity,
+    Identity)
+from flask.ext.babel import gettext
+
+from ..forms.login_form import LoginForm
+from ..metrics import login_attempts
+from .navigations import navbar
+
+blueprint = Blueprint('auth', __name__)
+
+
+@blueprint.route('/login', methods=['GET', 'POST'])
+def login():
+    ''' The Login handler for all users. '''
+    form = LoginForm()
+    if form.validate_on_submit():
+        login_attempts.inc(result='success')
+        login_user(form.user, remember=form.remember_me)
+        identity_changed.send(current_app._get_current_object(),
+                              identity=Identity(form.user.id))
+        return redirect(request.args.get('next') or url_for('main.index'))
+    if request.method == 'POST':
+        login_attempts.inc(result='throttled' if form.throttled else 'failure')
+    if form.throttled:
+        return gettext('Too many login attempts, try again later.'), 429
+    return render_template(
+        'login.html', form=form, navbar=navbar('login'))
+
+
+@blueprint.route('/logout')
+@login_required
+def logout():
+    ''' Logout the current user. '''
+    logout_user()
+    for key in ('identity.name', 'identity.auth_type'):
+        session.pop(key, None)
+
+    # Tell Flask-Prinicpal the user is anonymous
+    identity_changed.send(current_app._get_current_object(),
+                          identity=AnonymousIdentity())
+
+    return redirect(url_for('main.index'))
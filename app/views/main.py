@@ -24,41 +24,39 @@
 # THE POSSIBILITY OF SUCH DAMAGE.
 #
 
+import datetime
+
 from flask import (
+    Blueprint,
+    abort,
+    current_app,
     render_template,
-    redirect,
-    url_for,
     request,
-    session,
-    current_app,
+    url_for,
     g)
-from flask.ext.login import (
-    login_user,
-    logout_user,
-    current_user,
-    login_required)
+from flask.ext.login import current_user, login_required
 from flask.ext.principal import (
-    identity_changed,
     identity_loaded,
-    AnonymousIdentity,
-    Identity,
     RoleNeed,
     UserNeed)
 from flask.ext.babel import gettext
 
-from .. import app, admin_permission, babel
-from ..forms.login_form import LoginForm
-from .navigations import Navigation, Dropdown, Divider
+from .. import locale_negotiator
+from ..models.event import user_events
+from ..models.roles import cached_user_roles
+from .navigations import navbar
 
+blueprint = Blueprint('main', __name__)
 
-@app.before_request
+
+@blueprint.before_app_request
 def before_request():
     """ Set the current flask-login user to g.user
     """
     g.user = current_user
 
 
-@identity_loaded.connect_via(app)
+@identity_loaded.connect
 def on_identity_loaded(sender, identity):
     ''' Set the correct roles for the current user
     :sender: Not used
@@ -67,103 +65,88 @@ def on_identity_loaded(sender, identity):
     # set the identity user object
     identity.user = current_user
 
-    # Add the UserNeed to the identity
+    # Add the UserNeed and the roles (groups and their parents)
     if hasattr(current_user, 'id'):
         identity.provides.add(UserNeed(current_user.id))
+        for role in cached_user_roles(current_user):
+            identity.provides.add(RoleNeed(role))
 
-    if hasattr(current_user, 'groups'):
-        for group in current_user.groups:
-            identity.provides.add(RoleNeed(group.name))
-            add_parents(identity, group)
-
-
-def add_parents(identity, group):
-    ''' Add the parent groups to the Roles
-    :identity: The identity to add the roles to
-    :group: The group object to get the parents from
-    '''
-    for parent in group.parents:
-        identity.provides.add(RoleNeed(parent.name))
-        add_parents(identity, parent)
 
-
-@app.route('/')
-@app.route('/index')
+@blueprint.route('/')
+@blueprint.route('/index')
 def index():
     ''' The start page '''
     if g.user.is_authenticated():
         return render_template(
             "index.html", title=gettext("App"), data=gettext("DATA"),
-            navigations=[
-                Navigation(gettext('Test'), '#test'),
-                Navigation(gettext('About'), '#about'),
-                Dropdown('[{0}]'.format(g.user.name), [
-                    Navigation(gettext('Settings'), '/index'), Divider(),
-                    Navigation(gettext('Logout'), '/logout')])])
+            navbar=navbar('user'))
     else:
         return render_template(
-            "index.html", title="App", data="DATA", navigations=[
-                Navigation(gettext('Test'), '#test'),
-                Navigation(gettext('About'), '#about'),
-                Navigation(gettext('Login'), '/login')])
+            "index.html", title="App", data="DATA",
+            navbar=navbar('anonymous'))
 
 
-@app.route('/admin')
-@admin_permission.require(403)
-def admin():
-    ''' The admin start page '''
-    return render_template(
-        'admin.html',
-        text=gettext("Admin welcome to the Matrix %(name)s", name=g.user.name),
-        title="App [Admin]",
-        navigations=[Navigation(gettext('Test'), '#test'),
-                     Navigation(gettext('About'), '#about'),
-                     Dropdown('[{0}]'.format(g.user.name), [
-                         Navigation(gettext('Settings'), '/index'), Divider(),
-                         Navigation(gettext('Logout'), '/logout')])])
-
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    ''' The Login handler for all users. '''
-    form = LoginForm()
-    if form.validate_on_submit():
-        login_user(form.user, remember=form.remember_me)
-        identity_changed.send(current_app._get_current_object(),
-                              identity=Identity(form.user.id))
-        return redirect(request.args.get('next') or url_for('index'))
+@blueprint.route('/events')
+@login_required
+def events():
+    ''' The upcoming events of the user, or with ?past the past events. The
+        range is limited with ?start and ?end (YYYY-MM-DD) and the pages are
+        continued with the ?after cursor.
+    '''
+    past = 'past' in request.args
+    try:
+        start = _parse_date(request.args.get('start'))
+        end = _parse_date(request.args.get('end'))
+        after = _parse_cursor(request.args.get('after'))
+    except ValueError:
+        abort(400)
+    now = datetime.datetime.now()
+    if past:
+        end = min(end or now, now)
+    else:
+        start = max(start or now, now)
+
+    page, next_page = user_events(
+        g.user.id, start, end, after,
+        limit=current_app.config.get('EVENTS_PAGE_SIZE', 50), past=past)
+    next_url = None
+    if next_page is not None:
+        args = request.args.to_dict()
+        args['after'] = _format_cursor(next_page)
+        next_url = url_for('main.events', **args)
     return render_template(
-        'login.html', form=form, navigations=[
-            Navigation(gettext('Test'), '#test'),
-            Navigation(gettext('About'), '#about')])
+        'events.html', title=gettext("Events"), events=page, past=past,
+        next_url=next_url, navbar=navbar('user'))
 
 
-@app.route('/logout')
-@login_required
-def logout():
-    ''' Logout the current user. '''
-    logout_user()
-    for key in ('identity.name', 'identity.auth_type'):
-        session.pop(key, None)
+def _parse_date(value):
+    if not value:
+        return None
+    return datetime.datetime.strptime(value, '%Y-%m-%d')
+
+
+def _format_cursor(cursor):
+    return '{0:%Y-%m-%dT%H:%M:%S.%f}_{1}'.format(*cursor)
 
-    # Tell Flask-Prinicpal the user is anonymous
-    identity_changed.send(current_app._get_current_object(),
-                          identity=AnonymousIdentity())
 
-    return redirect(url_for('index'))
+def _parse_cursor(value):
+    if not value:
+        return None
+    date, event_id = value.rsplit('_', 1)
+    return (datetime.datetime.strptime(date, '%Y-%m-%dT%H:%M:%S.%f'),
+            int(event_id))
 
 
-@app.errorhandler(404)
+@blueprint.app_errorhandler(404)
 def page_not_found(e):
     return render_template('404.html'), 404
 
 
-@app.errorhandler(403)
+@blueprint.app_errorhandler(403)
 def access_denied(e):
     return render_template('403.html'), 403
 
 
-@babel.localeselector
 def get_local():
-    translations = [str(tr) for tr in babel.list_translations()] + ['en']
-    return request.accept_languages.best_match(translations)
+    return locale_negotiator.best_match(
+        request.headers.get('Accept-Language', ''))
@@ -24,28 +24,118 @@
 # THE POSSIBILITY OF SUCH DAMAGE.
 #
 
+''' The navigation bars of the views. The bars are declared once in the
+    NAVIGATIONS registry and the rendered html fragments are cached per
+    locale, role set and user name.
+'''
 
-class Navigation:
-    ''' A Simple class to represent the navigation tabs in all views '''
-    def __init__(self, name, path):
-        self.name = name
-        self.path = path
-        self.islist = False
-        self.divider = False
-        self.elements = []
+from collections import namedtuple
 
+from flask import render_template, g
+from flask.ext.babel import get_locale, lazy_gettext
+from jinja2 import Markup
 
-class Dropdown:
-    ''' A Simple class to represent the navigation tabs (drop down) '''
-    def __init__(self, name, elements):
-        self.name = name
-        self.islist = True
-        self.divider = False
-        self.elements = elements
+from ..cache import LRUCache
 
 
-class Divider:
+class Navigation(namedtuple('Navigation', 'name path roles')):
+    ''' A Simple class to represent the navigation tabs in all views. If
+        roles are given the tab is only shown to users with one of the roles.
+    '''
+    __slots__ = ()
+    islist = False
+    divider = False
+    elements = ()
+
+    def __new__(cls, name, path, roles=()):
+        return super(Navigation, cls).__new__(cls, name, path,
+                                              frozenset(roles))
+
+
+class Dropdown(namedtuple('Dropdown', 'name elements roles')):
+    ''' A Simple class to represent the navigation tabs (drop down). The name
+        may contain a {user} placeholder for the name of the current user.
+    '''
+    __slots__ = ()
+    islist = True
+    divider = False
+
+    def __new__(cls, name, elements, roles=()):
+        return super(Dropdown, cls).__new__(cls, name, tuple(elements),
+                                            frozenset(roles))
+
+
+class Divider(namedtuple('Divider', '')):
     ''' A simple navigation element that is represented as a divider in a
         drop down.
     '''
+    __slots__ = ()
+    islist = False
     divider = True
+    roles = frozenset()
+
+
+NAVIGATIONS = {
+    'anonymous': (
+        Navigation(lazy_gettext('Test'), '#test'),
+        Navigation(lazy_gettext('About'), '#about'),
+        Navigation(lazy_gettext('Login'), '/login')),
+    'login': (
+        Navigation(lazy_gettext('Test'), '#test'),
+        Navigation(lazy_gettext('About'), '#about')),
+    'user': (
+        Navigation(lazy_gettext('Test'), '#test'),
+        Navigation(lazy_gettext('Events'), '/events'),
+        Navigation(lazy_gettext('About'), '#about'),
+        Dropdown('[{user}]', [
+            Navigation(lazy_gettext('Settings'), '/index'),
+            Divider(),
+            Navigation(lazy_gettext('Logout'), '/logout')])),
+}
+
+_navbar_cache = LRUCache(maxsize=4096)
+
+
+def _visible(elements, roles, user_name):
+    ''' Get the elements visible with the given roles, the user name is
+        filled into the drop down names.
+    '''
+    visible = []
+    for element in elements:
+        if element.roles and not element.roles & roles:
+            continue
+        if element.islist:
+            element = Dropdown(
+                element.name.format(user=user_name),
+                _visible(element.elements, roles, user_name))
+        visible.append(element)
+    return visible
+
+
+def render_navbar(name, user_name=None, roles=()):
+    ''' Get the rendered html of a navigation bar from the registry.
+
+    :name: The name of the navigation bar in NAVIGATIONS
+    :user_name: The name of the current user (shown in the drop down)
+    :roles: The roles of the current user
+    :return: The html fragment (Markup)
+    '''
+    roles = frozenset(roles)
+    key = (name, str(get_locale()), roles, user_name)
+    html = _navbar_cache.get(key)
+    if html is None:
+        html = Markup(render_template(
+            'navbar.html',
+            navigations=_visible(NAVIGATIONS[name], roles, user_name)))
+        _navbar_cache.set(key, html)
+    return html
+
+
+def navbar(name):
+    ''' Get the rendered navigation bar for the current user.
+
+    :name: The name of the navigation bar in the registry
+    '''
+    roles = [need.value for need in g.identity.provides
+             if need.method == 'role']
+    return render_navbar(name, getattr(g.user, 'name', None), roles)
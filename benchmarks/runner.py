@@ -0,0 +1,273 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Benchmarks of the request hot paths. Every benchmark runs against a
+    synthetic dataset in a temporary SQLite database and reports the
+    operations per second and the p50 / p99 latencies. The startup (import
+    and create_app) gets measured in fresh interpreters. The results can be
+    stored as baseline and later runs fail if they are slower than the
+    baseline by more than a tolerance.
+'''
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+from flask.ext.login import login_user
+from flask.ext.principal import Identity
+
+import app
+from app.models.user import User, load_user
+from app.models.event import Event
+from migrations.generate_data import generate
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# prints the seconds to import the package and to create an application
+STARTUP_SCRIPT = '''
+from timeit import default_timer
+start = default_timer()
+import app
+app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+print(default_timer() - start)
+'''
+
+BENCHMARKS = []
+
+
+def benchmark(func):
+    ''' Register a benchmark. The function gets the application and the
+        test client and returns the callable to measure and optionally a
+        setup callable which runs (untimed) before every call.
+    '''
+    BENCHMARKS.append((func.__name__, func))
+    return func
+
+
+def login(client, email):
+    return client.post('/login', data=dict(email=email, password='default'))
+
+
+@benchmark
+def index_anonymous(application, client):
+    return lambda: client.get('/')
+
+
+@benchmark
+def index_user(application, client):
+    login(client, 'user1@example.org')
+    return lambda: client.get('/')
+
+
+@benchmark
+def login_get(application, client):
+    return lambda: client.get('/login')
+
+
+@benchmark
+def login_post(application, client):
+    return lambda: login(client, 'user1@example.org'), \
+        lambda: client.get('/logout')
+
+
+@benchmark
+def admin(application, client):
+    login(client, 'user0@example.org')
+    return lambda: client.get('/admin')
+
+
+@benchmark
+def logout(application, client):
+    return lambda: client.get('/logout'), \
+        lambda: login(client, 'user1@example.org')
+
+
+@benchmark
+def load_user_query(application, client):
+    user_id = unicode(User.query.filter_by(
+        email='user1@example.org').one().id)
+    return lambda: load_user(user_id)
+
+
+@benchmark
+def identity_loaded(application, client):
+    from app.views.main import on_identity_loaded
+    user = User.query.filter_by(email='user1@example.org').one()
+    ctx = application.test_request_context('/')
+    ctx.push()
+    login_user(user)
+    ctx.pop()
+
+    def run():
+        with application.test_request_context('/'):
+            login_user(user)
+            on_identity_loaded(application, Identity(user.id))
+    return run
+
+
+@benchmark
+def user_events(application, client):
+    user = User.query.filter_by(email='user1@example.org').one()
+
+    def run():
+        events = Event.query.join('attendees', 'user').filter(
+            User.id == user.id)
+        return [(event.name, len(event.attendees)) for event in events]
+    return run
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    return {
+        'ops': len(timings) / sum(timings),
+        'p50': timings[len(timings) // 2] * 1000,
+        'p99': timings[min(len(timings) - 1,
+                           int(len(timings) * 0.99))] * 1000,
+    }
+
+
+def _measure(func, setup, iterations):
+    timings = []
+    for i in range(iterations):
+        if setup is not None:
+            setup()
+        start = default_timer()
+        func()
+        timings.append(default_timer() - start)
+    return _summary(timings)
+
+
+def startup(iterations=10):
+    ''' Measure the import of the package and create_app, every run starts a
+        new interpreter to include the import of all the modules.
+
+    :iterations: The number of started interpreters
+    :return: A dict with the ops/sec, p50 and p99 (ms)
+    '''
+    timings = []
+    for i in range(iterations):
+        output = subprocess.check_output(
+            [sys.executable, '-c', STARTUP_SCRIPT], cwd=ROOT)
+        timings.append(float(output))
+    return _summary(timings)
+
+
+def run(names=None, iterations=200, users=100, depth=5, events=50,
+        attendees=10, config=None):
+    ''' Run the benchmarks against a new dataset.
+
+    :names: The names of the benchmarks to run, None for all
+    :iterations: The number of measured calls per benchmark
+    :users, depth, events, attendees: The size of the dataset (see
+                                      migrations.generate_data)
+    :config: Additional configuration of the application
+    :return: A dict with the ops/sec, p50 and p99 (ms) per benchmark, the
+             startup runs min(iterations, 10) interpreters
+    '''
+    db_fd, filename = tempfile.mkstemp()
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{0}'.format(filename),
+        'WTF_CSRF_ENABLED': False,
+        'LOGIN_THROTTLE_ENABLED': False,
+    }
+    settings.update(config or {})
+    application = app.create_app(settings)
+    ctx = application.app_context()
+    ctx.push()
+    try:
+        app.db.create_all()
+        generate(app.db, users=users, groups=depth * 2, depth=depth,
+                 events=events, attendees=attendees)
+
+        results = {}
+        for name, func in BENCHMARKS:
+            if names and name not in names:
+                continue
+            client = application.test_client()
+            funcs = func(application, client)
+            if not isinstance(funcs, tuple):
+                funcs = (funcs, None)
+            # warm up the caches
+            _measure(funcs[0], funcs[1], min(iterations, 10))
+            results[name] = _measure(funcs[0], funcs[1], iterations)
+            app.db.session.remove()
+        if not names or 'startup' in names:
+            results['startup'] = startup(min(iterations, 10))
+        return results
+    finally:
+        ctx.pop()
+        app.db.get_engine(application).dispose()
+        os.close(db_fd)
+        os.unlink(filename)
+
+
+def load_baseline(filename=BASELINE):
+    ''' Load the stored baseline, an empty dict if there is none. '''
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_baseline(results, filename=BASELINE):
+    ''' Store the results as new baseline. '''
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        f.write('\n')
+
+
+def regressions(results, baseline, tolerance=0.25):
+    ''' Compare the results with the baseline.
+
+    :results: The results of run()
+    :baseline: The stored results
+    :tolerance: The allowed slow down (0.25 for 25% less ops/sec)
+    :return: A list of (name, baseline ops/sec, ops/sec) for the regressions
+    '''
+    slower = []
+    for name, result in sorted(results.items()):
+        if name in baseline and \
+                result['ops'] < baseline[name]['ops'] * (1 - tolerance):
+            slower.append((name, baseline[name]['ops'], result['ops']))
+    return slower
+
+
+def report(results, baseline=None):
+    ''' Format the results as table. '''
+    lines = ['{0:<20} {1:>10} {2:>10} {3:>10} {4:>10}'.format(
+        'benchmark', 'ops/sec', 'p50 ms', 'p99 ms', 'baseline')]
+    for name, result in sorted(results.items()):
+        base = (baseline or {}).get(name)
+        lines.append('{0:<20} {1:>10.1f} {2:>10.3f} {3:>10.3f} {4:>10}'.format(
+            name, result['ops'], result['p50'], result['p99'],
+            '{0:.1f}'.format(base['ops']) if base else '-'))
+    return '\n'.join(lines)
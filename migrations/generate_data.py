@@ -0,0 +1,184 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Generate large deterministic datasets for scale tests. The rows are
+    written with bulk Core inserts in batches, every batch is committed in its
+    own transaction.
+'''
+
+import datetime
+import random
+
+from app.models.user import User, Group, groups_table, group_to_group
+from app.models.event import Event, EventAttendee
+from app.models.roles import invalidate_roles
+from app.models.user import invalidate_user
+
+# the distribution of the attendee status (NEW, INVITED, ATTENDING, DECLINED)
+STATUS_WEIGHTS = ((EventAttendee.NEW, 0.1), (EventAttendee.INVITED, 0.4),
+                  (EventAttendee.ATTENDING, 0.35),
+                  (EventAttendee.DECLINED, 0.15))
+
+
+class _BatchWriter(object):
+
+    ''' Collect rows per table and insert them with executemany. '''
+
+    def __init__(self, db, batch_size):
+        self.db = db
+        self.batch_size = batch_size
+        self.rows = {}
+        self.counts = {}
+
+    def add(self, table, row):
+        rows = self.rows.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        tables = [table] if table is not None else list(self.rows)
+        for table in tables:
+            rows = self.rows.pop(table, None)
+            if rows:
+                self.db.session.execute(table.insert(), rows)
+                self.db.session.commit()
+                self.counts[table.name] = \
+                    self.counts.get(table.name, 0) + len(rows)
+
+
+def _next_id(db, table):
+    return (db.session.query(db.func.max(table.c.id)).scalar() or 0) + 1
+
+
+def _status(rnd):
+    value = rnd.random()
+    for status, weight in STATUS_WEIGHTS:
+        value -= weight
+        if value < 0:
+            return status
+    return STATUS_WEIGHTS[-1][0]
+
+
+def generate(db, users=1000, groups=50, depth=10, events=100, attendees=20,
+             seed=42, batch_size=10000, password='default', now=None):
+    ''' Generate a dataset. There is an admin group with the first user and a
+        users group, below the users group the groups form a hierarchy of the
+        given depth. Every user is member of one or two groups. The number of
+        attendees per event follows a log-normal distribution with the given
+        median.
+
+    :db: The database extension (with the tables created)
+    :users: The number of users (emails user<n>@example.org, n starts at
+            the next user id - 1 so that a second run adds new users)
+    :groups: The number of groups in the hierarchy
+    :depth: The depth of the hierarchy
+    :events: The number of events
+    :attendees: The median number of attendees per event
+    :seed: The seed of the random generator
+    :batch_size: The number of rows per insert and transaction
+    :password: The password of all the users (hashed once)
+    :now: The reference date of the events (default 2014-06-01, a fixed
+          date keeps the data deterministic)
+    :return: A dict with the number of inserted rows per table
+    '''
+    rnd = random.Random(seed)
+    now = now or datetime.datetime(2014, 6, 1)
+    writer = _BatchWriter(db, batch_size)
+    groups_tbl = Group.__table__
+    users_tbl = User.__table__
+    events_tbl = Event.__table__
+    attendees_tbl = EventAttendee.__table__
+
+    # the group hierarchy, group_to_group holds the group in parent_id and
+    # its parent in child_id (see Group.parents)
+    group_id = _next_id(db, groups_tbl)
+    admin_id, users_id = group_id, group_id + 1
+    writer.add(groups_tbl, {'id': admin_id, 'name': 'admin'})
+    writer.add(groups_tbl, {'id': users_id, 'name': 'users'})
+    group_ids = [users_id]
+    levels = [[users_id]]
+    group_id += 2
+    depth = max(1, min(depth, groups))
+    for i in range(groups):
+        level = 1 + i % depth if i < depth else rnd.randint(1, depth)
+        parent = rnd.choice(levels[level - 1])
+        writer.add(groups_tbl, {'id': group_id,
+                                'name': 'group_{0}'.format(i)})
+        writer.add(group_to_group, {'parent_id': group_id,
+                                    'child_id': parent})
+        if len(levels) <= level:
+            levels.append([])
+        levels[level].append(group_id)
+        group_ids.append(group_id)
+        group_id += 1
+    writer.flush()
+
+    # the users with their memberships
+    user = User('', '')
+    user.set_password(password)
+    pwhash = user.password
+    first_user = _next_id(db, users_tbl)
+    for i in range(users):
+        user_id = first_user + i
+        writer.add(users_tbl, {
+            'id': user_id, 'name': 'user {0}'.format(user_id - 1),
+            'email': 'user{0}@example.org'.format(user_id - 1),
+            'password': pwhash,
+            'created_at': now, 'last_login': now, 'permission_version': 0})
+        memberships = [admin_id] if i == 0 else \
+            rnd.sample(group_ids, min(len(group_ids), rnd.randint(1, 2)))
+        for membership in memberships:
+            writer.add(groups_table, {'user_id': user_id,
+                                      'group_id': membership})
+    writer.flush()
+
+    # the events with a log-normal fan out of attendees
+    event_id = _next_id(db, events_tbl)
+    for i in range(events):
+        event_date = now + datetime.timedelta(
+            minutes=rnd.randint(-365 * 24 * 60, 365 * 24 * 60))
+        count = min(users, int(rnd.lognormvariate(0, 1) * attendees))
+        rows = [{'event_id': event_id, 'user_id': first_user + index,
+                 'status': _status(rnd), 'event_date': event_date}
+                for index in rnd.sample(xrange(users), count)]
+        row = {'id': event_id, 'name': 'event {0}'.format(i),
+               'created_at': now, 'last_changed': now,
+               'event_date': event_date}
+        for counter in EventAttendee.COUNTERS:
+            row[counter] = 0
+        for attendee in rows:
+            row[EventAttendee.COUNTERS[attendee['status']]] += 1
+        writer.add(events_tbl, row)
+        for attendee in rows:
+            writer.add(attendees_tbl, attendee)
+        event_id += 1
+    writer.flush()
+
+    # the Core inserts bypass the cache invalidation of the ORM
+    invalidate_roles()
+    invalidate_user()
+    return writer.counts
@@ -0,0 +1,358 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Stream CSV or JSON lines files into the db. Every file is read row by row
+    through a generator pipeline (read, validate, batch), the passwords of a
+    batch are hashed in the process pool of the password hasher and every
+    batch is written with one Core insert in its own transaction. The memory
+    use only depends on the batch size, not on the size of the files.
+
+    The rows carry the ids, references to rows which do not exist in the db
+    and rows with keys which exist already (in the db or earlier in the
+    batch) are rejected. The kinds are imported in the order of KINDS.
+'''
+
+import csv
+import datetime
+import json
+
+from app import password_hasher
+from app.models.user import User, Group, groups_table, group_to_group
+from app.models.event import Event, EventAttendee, recount_events
+from app.models.roles import invalidate_roles
+from app.models.user import invalidate_user
+
+STATUS_NAMES = {'new': EventAttendee.NEW, 'invited': EventAttendee.INVITED,
+                'attending': EventAttendee.ATTENDING,
+                'declined': EventAttendee.DECLINED}
+
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M',
+                '%Y-%m-%dT%H:%M', '%Y-%m-%d')
+
+# the number of rejected rows reported with their reason
+MAX_ERRORS = 100
+
+
+def _integer(value):
+    return int(value)
+
+
+def _text(value):
+    if isinstance(value, str):
+        value = value.decode('utf-8')
+    elif not isinstance(value, unicode):
+        value = unicode(value)
+    value = value.strip()
+    if not value:
+        raise ValueError('empty value')
+    return value
+
+
+def _email(value):
+    value = _text(value).lower()
+    if '@' not in value:
+        raise ValueError('invalid email: {0}'.format(value))
+    return value
+
+
+def _date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.strip(), date_format)
+        except ValueError:
+            pass
+    raise ValueError('invalid date: {0}'.format(value))
+
+
+def _status(value):
+    if isinstance(value, int):
+        status = value
+    elif str(value).strip().isdigit():
+        status = int(value)
+    else:
+        status = STATUS_NAMES.get(str(value).strip().lower())
+    if status not in STATUS_NAMES.values():
+        raise ValueError('invalid status: {0}'.format(value))
+    return status
+
+
+class Kind(object):
+
+    ''' The fields of a kind of rows and the table they are written to.
+
+    :name: The name of the kind
+    :table: The table of the rows
+    :fields: (field, converter, required) tuples, optional fields missing in
+             a row are left to the defaults of the table
+    :references: (field, table) tuples of the referenced ids
+    :keys: Tuples of the fields which are unique for the rows
+    :columns: The columns of the fields named differently in the table
+    '''
+
+    def __init__(self, name, table, fields, references=(), keys=(),
+                 columns=None):
+        self.name = name
+        self.table = table
+        self.fields = fields
+        self.references = references
+        self.keys = keys
+        self.columns = columns or {}
+
+    def column(self, field):
+        ''' Get the table column of a field. '''
+        return self.table.c[self.columns.get(field, field)]
+
+
+KINDS = (
+    Kind('users', User.__table__, (
+        ('id', _integer, True), ('name', _text, True),
+        ('email', _email, True), ('password', _text, True)),
+        keys=(('id',), ('email',))),
+    Kind('groups', Group.__table__, (
+        ('id', _integer, True), ('name', _text, True)),
+        keys=(('id',),)),
+    Kind('memberships', groups_table, (
+        ('user_id', _integer, True), ('group_id', _integer, True)),
+        (('user_id', User.__table__), ('group_id', Group.__table__)),
+        keys=(('user_id', 'group_id'),)),
+    # group_to_group holds the group in parent_id and its parent in child_id
+    # (see Group.parents), the files name them group_id and parent_id
+    Kind('group_edges', group_to_group, (
+        ('group_id', _integer, True), ('parent_id', _integer, True)),
+        (('group_id', Group.__table__), ('parent_id', Group.__table__)),
+        keys=(('group_id', 'parent_id'),),
+        columns={'group_id': 'parent_id', 'parent_id': 'child_id'}),
+    Kind('events', Event.__table__, (
+        ('id', _integer, True), ('name', _text, True),
+        ('event_date', _date, True)),
+        keys=(('id',),)),
+    Kind('attendees', EventAttendee.__table__, (
+        ('event_id', _integer, True), ('user_id', _integer, True),
+        ('status', _status, False)),
+        (('event_id', Event.__table__), ('user_id', User.__table__)),
+        keys=(('event_id', 'user_id'),)),
+)
+
+
+def read_rows(filename, report):
+    ''' Read the rows of a CSV (with a header line) or a JSON lines file.
+
+    :filename: The file to read
+    :report: Called with the line number and the reason of a malformed line
+    :return: A generator of (line number, dict) tuples
+    '''
+    with open(filename, 'rb') as input:
+        if filename.endswith('.csv'):
+            reader = csv.DictReader(input)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(input, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    report(number, 'invalid json: {0}'.format(error))
+                    continue
+                yield number, row
+
+
+def validate_rows(kind, rows, report):
+    ''' Convert the fields of the rows, invalid rows are reported and
+        skipped.
+
+    :kind: The Kind of the rows
+    :rows: The (line number, dict) tuples
+    :report: Called with the line number and the reason of a rejected row
+    :return: A generator of (line number, converted dict) tuples
+    '''
+    for number, row in rows:
+        values = {}
+        try:
+            for field, convert, required in kind.fields:
+                value = row.get(field)
+                if value is None or value == '':
+                    if required:
+                        raise ValueError('missing {0}'.format(field))
+                    continue
+                values[field] = convert(value)
+        except (ValueError, TypeError, AttributeError) as error:
+            report(number, str(error))
+            continue
+        yield number, values
+
+
+def batches(rows, size):
+    ''' Group the rows in lists of the given size. '''
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# the values of an IN list per statement (SQLite allows at most 999
+# parameters)
+IN_LIST_SIZE = 500
+
+
+def _existing(db, table, ids, columns=()):
+    ''' Get the rows of the given ids as dict of id and row. '''
+    found = {}
+    for chunk in batches(ids, IN_LIST_SIZE):
+        query = db.select([table.c.id] + [table.c[c] for c in columns]) \
+            .where(table.c.id.in_(chunk))
+        found.update((row[0], row) for row in db.session.execute(query))
+    return found
+
+
+def _existing_keys(db, kind, key, batch):
+    ''' Get the values of a unique key of the batch which exist in the db,
+        the rows are selected by the first field of the key.
+    '''
+    columns = [kind.column(field) for field in key]
+    seen = set()
+    for chunk in batches(set(values[key[0]] for number, values in batch),
+                         IN_LIST_SIZE):
+        query = db.select(columns).where(columns[0].in_(chunk))
+        seen.update(tuple(row) for row in db.session.execute(query))
+    return seen
+
+
+def _prepare(db, kind, batch, report, now):
+    ''' Check the references and the unique keys of a batch and complete the
+        rows.
+    '''
+    found = {}
+    for field, table in kind.references:
+        ids = set(values[field] for number, values in batch)
+        columns = ('event_date',) if table is Event.__table__ else ()
+        found[field] = _existing(db, table, ids, columns)
+
+    rows = []
+    for number, values in batch:
+        missing = [field for field, table in kind.references
+                   if values[field] not in found[field]]
+        if missing:
+            report(number, 'unknown {0}'.format(', '.join(
+                '{0} {1}'.format(field, values[field]) for field in missing)))
+            continue
+        rows.append((number, values))
+
+    # the earlier batches are committed, the db holds their keys as well
+    for key in kind.keys:
+        if not rows:
+            break
+        seen = _existing_keys(db, kind, key, rows)
+        unique = []
+        for number, values in rows:
+            value = tuple(values[field] for field in key)
+            if value in seen:
+                report(number, 'duplicate {0}'.format(', '.join(
+                    '{0} {1}'.format(field, values[field]) for field in key)))
+                continue
+            seen.add(value)
+            unique.append((number, values))
+        rows = unique
+    rows = [dict((kind.columns.get(field, field), value)
+                 for field, value in values.iteritems())
+            for number, values in rows]
+
+    if kind.name == 'users':
+        hashes = password_hasher.hash_many([row['password'] for row in rows])
+        for row, pwhash in zip(rows, hashes):
+            row.update(password=pwhash, created_at=now, last_login=now,
+                       permission_version=0)
+    elif kind.name == 'events':
+        for row in rows:
+            row.update(created_at=now, last_changed=now)
+    elif kind.name == 'attendees':
+        for row in rows:
+            row.setdefault('status', EventAttendee.NEW)
+            row['event_date'] = found['event_id'][row['event_id']][1]
+    return rows
+
+
+def _reset_sequence(db, table):
+    ''' Move the id sequence of a table (PostgreSQL) behind the imported ids,
+        the explicit ids of the inserts do not advance it.
+    '''
+    if db.engine.dialect.name != 'postgresql':
+        return
+    db.session.execute(
+        "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+        "(SELECT max(id) FROM {0}))".format(table.name))
+    db.session.commit()
+
+
+def import_files(db, files, batch_size=1000, log=None):
+    ''' Import the given files.
+
+    :db: The db extension
+    :files: A dict with the kind names (see KINDS) and the filenames
+    :batch_size: The number of rows per insert and transaction
+    :log: Called with the progress and the rejected rows
+    :return: A dict with the (imported, rejected) rows per kind
+    '''
+    log = log or (lambda message: None)
+    unknown = set(files) - set(kind.name for kind in KINDS)
+    if unknown:
+        raise ValueError('Unknown kinds: {0}'.format(', '.join(unknown)))
+    now = datetime.datetime.now()
+    result = {}
+    for kind in KINDS:
+        filename = files.get(kind.name)
+        if filename is None:
+            continue
+        counts = [0, 0]
+
+        def report(number, reason):
+            counts[1] += 1
+            if counts[1] <= MAX_ERRORS:
+                log('{0}:{1}: {2}'.format(filename, number, reason))
+
+        rows = validate_rows(kind, read_rows(filename, report), report)
+        for batch in batches(rows, batch_size):
+            batch = _prepare(db, kind, batch, report, now)
+            if batch:
+                db.session.execute(kind.table.insert(), batch)
+            db.session.commit()
+            counts[0] += len(batch)
+            log('{0}: {1} rows'.format(kind.name, counts[0]))
+        result[kind.name] = tuple(counts)
+        if counts[0] and 'id' in kind.table.c:
+            _reset_sequence(db, kind.table)
+
+    # the Core inserts bypass the counters and the caches of the ORM
+    if 'attendees' in files:
+        recount_events(batch_size)
+    invalidate_roles()
+    invalidate_user()
+    return result
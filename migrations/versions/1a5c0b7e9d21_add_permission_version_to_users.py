@@ -0,0 +1,34 @@
+"""Add the permission version of the users
+
+Revision ID: 1a5c0b7e9d21
+Revises: None
+Create Date: 2026-10-18 17:10:00.000000
+
+The version is part of the key of the cached roles. Like the following
+revisions the column is only added if it is missing (e.g. after create_all
+it exists already).
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1a5c0b7e9d21'
+down_revision = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def _columns():
+    return set(column['name'] for column in
+               sa.inspect(op.get_bind()).get_columns('users'))
+
+
+def upgrade():
+    if 'permission_version' not in _columns():
+        op.add_column('users', sa.Column('permission_version', sa.Integer(),
+                                         nullable=False, server_default='0'))
+
+
+def downgrade():
+    if 'permission_version' in _columns():
+        op.drop_column('users', 'permission_version')
@@ -0,0 +1,55 @@
+"""Add the event date to the event attendees for the user events index
+
+Revision ID: 2f40738d932e
+Revises: 39f297e06d0d
+Create Date: 2026-10-18 18:40:00.000000
+
+The index (user_id, event_date, event_id) supersedes (user_id, event_id).
+Like the previous revision only the missing parts are created.
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2f40738d932e'
+down_revision = '39f297e06d0d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _existing_indexes():
+    return set(index['name'] for index in
+               _inspector().get_indexes('event_attendees'))
+
+
+def upgrade():
+    columns = set(column['name'] for column in
+                  _inspector().get_columns('event_attendees'))
+    if 'event_date' not in columns:
+        op.add_column('event_attendees',
+                      sa.Column('event_date', sa.DateTime(), nullable=True))
+        op.execute('UPDATE event_attendees SET event_date = (SELECT '
+                   'events.event_date FROM events WHERE '
+                   'events.id = event_attendees.event_id)')
+    indexes = _existing_indexes()
+    if 'ix_event_attendees_user_date' not in indexes:
+        op.create_index('ix_event_attendees_user_date', 'event_attendees',
+                        ['user_id', 'event_date', 'event_id'])
+    if 'ix_event_attendees_user_id' in indexes:
+        op.drop_index('ix_event_attendees_user_id',
+                      table_name='event_attendees')
+
+
+def downgrade():
+    indexes = _existing_indexes()
+    if 'ix_event_attendees_user_id' not in indexes:
+        op.create_index('ix_event_attendees_user_id', 'event_attendees',
+                        ['user_id', 'event_id'])
+    if 'ix_event_attendees_user_date' in indexes:
+        op.drop_index('ix_event_attendees_user_date',
+                      table_name='event_attendees')
+    op.drop_column('event_attendees', 'event_date')
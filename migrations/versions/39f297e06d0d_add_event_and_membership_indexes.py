@@ -0,0 +1,46 @@
+"""Add the indexes of the event and membership tables
+
+Revision ID: 39f297e06d0d
+Revises: 5d8e2f4a6c13
+Create Date: 2026-10-18 18:10:00.000000
+
+The indexes are declared in the models as well, the upgrade only creates
+the indexes missing in the db (e.g. after create_all they exist already).
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '39f297e06d0d'
+down_revision = '5d8e2f4a6c13'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+INDEXES = (
+    ('ix_events_event_date', 'events', ['event_date']),
+    ('ix_event_attendees_user_id', 'event_attendees',
+     ['user_id', 'event_id']),
+    ('ix_event_attendees_event_status', 'event_attendees',
+     ['event_id', 'status']),
+    ('ix_group_to_user_user_id', 'group_to_user', ['user_id', 'group_id']),
+    ('ix_group_to_user_group_id', 'group_to_user', ['group_id']),
+    ('ix_group_to_group_child_id', 'group_to_group', ['child_id']),
+)
+
+
+def _existing(table):
+    inspector = sa.inspect(op.get_bind())
+    return set(index['name'] for index in inspector.get_indexes(table))
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in _existing(table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        if name in _existing(table):
+            op.drop_index(name, table_name=table)
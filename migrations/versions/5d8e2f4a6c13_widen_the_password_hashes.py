@@ -0,0 +1,30 @@
+"""Widen the password column for the PBKDF2 hashes
+
+Revision ID: 5d8e2f4a6c13
+Revises: 1a5c0b7e9d21
+Create Date: 2026-10-18 17:20:00.000000
+
+The hashes with method, iterations and salt do not fit into the 40
+characters of the sha1 hashes. SQLite does not enforce the length (and
+cannot alter columns), the column is only changed on the other databases.
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5d8e2f4a6c13'
+down_revision = '1a5c0b7e9d21'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column('users', 'password', type_=sa.String(128),
+                        existing_type=sa.String(40))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column('users', 'password', type_=sa.String(40),
+                        existing_type=sa.String(128))
@@ -0,0 +1,40 @@
+"""Add the attendee counters per status to the events
+
+Revision ID: 84e6998f2851
+Revises: 2f40738d932e
+Create Date: 2026-10-18 19:10:00.000000
+
+The counters are filled from the attendees, later on `python run.py
+recount_events` repairs them. Only the missing columns are created.
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '84e6998f2851'
+down_revision = '2f40738d932e'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+COUNTERS = ('new_count', 'invited_count', 'attending_count', 'declined_count')
+
+
+def upgrade():
+    columns = set(column['name'] for column in
+                  sa.inspect(op.get_bind()).get_columns('events'))
+    for status, counter in enumerate(COUNTERS):
+        if counter in columns:
+            continue
+        op.add_column('events', sa.Column(counter, sa.Integer(),
+                                          server_default='0',
+                                          nullable=False))
+        op.execute('UPDATE events SET {0} = (SELECT count(*) FROM '
+                   'event_attendees WHERE event_attendees.event_id = '
+                   'events.id AND event_attendees.status = {1})'.format(
+                       counter, status))
+
+
+def downgrade():
+    for counter in reversed(COUNTERS):
+        op.drop_column('events', counter)
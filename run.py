@@ -23,15 +23,149 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
 # THE POSSIBILITY OF SUCH DAMAGE.
 #
+import sys
+
+from flask import current_app
 from flask.ext.script import Manager
 from flask.ext.migrate import Migrate, MigrateCommand
 
-from app import app, db
+from app import create_app, db, assets, profiler, jobs, template_cache
+from app.assets import build_assets as build
+from app.models.event import recount_events as recount
+from benchmarks import runner
+from migrations import generate_data, import_data
+
+migrate = Migrate()
+
+
+def make_app():
+    ''' Create the application for the manager commands. '''
+    app = create_app()
+    migrate.init_app(app, db)
+    return app
+
+
+def print_line(message):
+    ''' Print a progress message without buffering. '''
+    print(message)
+    sys.stdout.flush()
 
-migrate = Migrate(app, db)
 
-manager = Manager(app)
+manager = Manager(make_app)
 manager.add_command('db', MigrateCommand)
 
+
+@manager.command
+def build_assets():
+    ''' Build the hashed and compressed static assets. '''
+    manifest = build(current_app.static_folder, assets.dist)
+    print('Built {0} assets'.format(len(manifest)))
+
+
+@manager.command
+def compile_templates():
+    ''' Compile all the templates into the template cache. '''
+    if template_cache.bytecode_cache is None:
+        print('The template cache is disabled (TEMPLATE_CACHE_DIR)')
+        sys.exit(1)
+    template_cache.clear()
+    names = template_cache.compile(current_app)
+    print('Compiled {0} templates'.format(len(names)))
+
+
+@manager.command
+def profile_token():
+    ''' Print a signed X-Profile header value to profile a request. '''
+    if profiler.directory is None:
+        print('The profiling is disabled (PROFILING_ENABLED)')
+        sys.exit(1)
+    print('X-Profile: {0}'.format(profiler.make_token()))
+
+
+@manager.option('-u', '--users', type=int, default=1000)
+@manager.option('-g', '--groups', type=int, default=50)
+@manager.option('-d', '--depth', type=int, default=10,
+                help='depth of the group hierarchy')
+@manager.option('-e', '--events', type=int, default=100)
+@manager.option('-a', '--attendees', type=int, default=20,
+                help='median attendees per event')
+@manager.option('-s', '--seed', type=int, default=42)
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=10000, help='rows per insert and transaction')
+def generate(users, groups, depth, events, attendees, seed, batch_size):
+    ''' Generate a large deterministic dataset in the configured db. '''
+    db.create_all()
+    counts = generate_data.generate(
+        db, users=users, groups=groups, depth=depth, events=events,
+        attendees=attendees, seed=seed, batch_size=batch_size)
+    for table, count in sorted(counts.items()):
+        print('{0:<20} {1:>10}'.format(table, count))
+
+
+@manager.option('--users', help='id, name, email, password')
+@manager.option('--groups', help='id, name')
+@manager.option('--memberships', help='user_id, group_id')
+@manager.option('--group-edges', dest='group_edges',
+                help='group_id, parent_id')
+@manager.option('--events', help='id, name, event_date')
+@manager.option('--attendees', help='event_id, user_id, status')
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=1000, help='rows per insert and transaction')
+def import_files(batch_size, **files):
+    ''' Import CSV or JSON lines (.jsonl) files into the configured db. '''
+    files = dict((kind, filename) for kind, filename in files.items()
+                 if filename)
+    db.create_all()
+    counts = import_data.import_files(db, files, batch_size, log=print_line)
+    for kind, (imported, rejected) in sorted(counts.items()):
+        print('{0:<20} {1:>10} imported {2:>10} rejected'.format(
+            kind, imported, rejected))
+
+
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=10000, help='events per update')
+def recount_events(batch_size):
+    ''' Repair the attendee counters of the events. '''
+    print('Counted the attendees of {0} events'.format(recount(batch_size)))
+
+
+@manager.option('-b', '--burst', action='store_true',
+                help='stop once the queue is empty')
+def worker(burst):
+    ''' Run the background jobs (e.g. the event invitations). '''
+    jobs.worker(print_line).run(
+        current_app.config.get('JOB_POLL_INTERVAL', 1), burst)
+
+
+@manager.option('-n', '--iterations', type=int, default=200,
+                help='measured calls per benchmark')
+@manager.option('-u', '--users', type=int, default=100)
+@manager.option('-e', '--events', type=int, default=50)
+@manager.option('-a', '--attendees', type=int, default=10,
+                help='attendees per event')
+@manager.option('-d', '--depth', type=int, default=5,
+                help='depth of the group hierarchy')
+@manager.option('-t', '--tolerance', type=float, default=0.25,
+                help='allowed slow down compared to the baseline')
+@manager.option('--save', '--save-baseline', dest='save', action='store_true',
+                help='store the results as new baseline')
+@manager.option('names', nargs='*', help='the benchmarks to run')
+def benchmark(names, iterations, users, events, attendees, depth, tolerance,
+              save):
+    ''' Run the benchmarks and compare them with the baseline. '''
+    results = runner.run(names, iterations, users, depth, events, attendees)
+    baseline = runner.load_baseline()
+    print(runner.report(results, baseline))
+    if save:
+        runner.save_baseline(results)
+        return
+    slower = runner.regressions(results, baseline, tolerance)
+    for name, expected, actual in slower:
+        print('Regression {0}: {1:.1f} ops/sec (baseline {2:.1f})'.format(
+            name, actual, expected))
+    if slower:
+        sys.exit(1)
+
+
 if __name__ == '__main__':
     manager.run()
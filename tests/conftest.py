@@ -0,0 +1,110 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import os
+import tempfile
+
+import app
+from app.instrumentation import track_queries
+
+
+@pytest.fixture
+def app_config():
+    ''' The configuration of the flask_app fixture, a test module overrides
+        it to enable the extensions it tests.
+    '''
+    return {}
+
+
+@pytest.fixture
+def fill_db():
+    ''' A function filling the database of the flask_app fixture, a test
+        module overrides it with its own dataset.
+    '''
+    return None
+
+
+@pytest.fixture
+def flask_app(request, app_config, fill_db):
+    ''' Get a flask app to call the flask app as an example client. The app
+        uses a database in a temporary file and its context stays pushed
+        during the test.
+    '''
+    db_fd, filename = tempfile.mkstemp()
+    config = {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{0}'.format(filename),
+        'TESTING': True}
+    config.update(app_config)
+    application = app.create_app(config)
+    ctx = application.app_context()
+    ctx.push()
+    wapp = application.test_client()
+    app.db.create_all()
+
+    if fill_db is not None:
+        fill_db(app.db)
+
+    def fin():
+        ctx.pop()
+        app.db.get_engine(application).dispose()
+        os.close(db_fd)
+        os.unlink(filename)
+    request.addfinalizer(fin)
+
+    return wapp
+
+
+@pytest.fixture
+def max_queries():
+    ''' Assert the maximum number of statements executed within a with block.
+        Repeated statements of the same shape fail as N+1 queries.
+
+        with max_queries(3):
+            client.get('/')
+    '''
+    def assert_max_queries(count, threshold=5):
+        return _MaxQueries(count, threshold)
+    return assert_max_queries
+
+
+class _MaxQueries(object):
+
+    def __init__(self, count, threshold):
+        self.count = count
+        self.threshold = threshold
+
+    def __enter__(self):
+        self.tracking = track_queries(self.threshold, raise_error=True)
+        self.tracker = self.tracking.__enter__()
+        return self.tracker
+
+    def __exit__(self, *exc_info):
+        self.tracking.__exit__(*exc_info)
+        if exc_info[0] is None:
+            assert self.tracker.count <= self.count, \
+                '{0} statements executed, expected at most {1}'.format(
+                    self.tracker.count, self.count)
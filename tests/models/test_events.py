@@ -26,12 +26,14 @@
 
 import pytest
 import os
+import re
 import tempfile
 import datetime
 
 import app
 from app.models.user import User, Group
-from app.models.event import Event, EventAttendee
+from app.models.event import (
+    Event, EventAttendee, user_events, recount_events)
 
 
 def test_events(flask_app):
@@ -66,26 +68,141 @@ def test_events(flask_app):
     flask_app.get('')
 
 
-@pytest.fixture
-def flask_app(request):
-    ''' Get a flask app to call the flask app as an example client '''
+def test_user_events(flask_app):
+    ''' Test the keyset pagination of the events of a user '''
+    douglas = User.query.filter_by(email='douglas@adams.org').one()
+    admin = User.query.filter_by(email='admin@admin.org').one()
+    for i in range(20):
+        # every date twice to page through equal dates
+        event = Event('Paged {0}'.format(i),
+                      datetime.datetime(2015, 1, 1 + i // 2, 12))
+        event.attendees.append(EventAttendee(douglas))
+        app.db.session.add(event)
+    app.db.session.commit()
+
+    expected = sorted(douglas.events, key=lambda e: (e.event_date, e.id))
+    assert len(expected) == 22
+
+    def pages(**kwargs):
+        result, after = [], None
+        while True:
+            page, after = user_events(douglas.id, after=after, limit=3,
+                                      **kwargs)
+            assert len(page) <= 3
+            result.extend(page)
+            if after is None:
+                return result
+
+    assert pages() == expected
+    assert pages(past=True) == expected[::-1]
+    start, end = datetime.datetime(2015, 1, 3), datetime.datetime(2015, 1, 6)
+    assert pages(start=start, end=end) == [
+        e for e in expected if start <= e.event_date < end]
+    assert user_events(admin.id) == (
+        [Event.query.filter_by(name='Two').one()], None)
+
+    # the copy of the event date follows the changes of the event
+    event = Event.query.filter_by(name='One').one()
+    event.event_date = datetime.datetime(2016, 1, 1)
+    app.db.session.commit()
+    assert pages()[-1] == event
+
+
+def counters(name):
+    ''' Get the (new, invited, attending, declined) counters of an event. '''
+    app.db.session.expire_all()
+    event = Event.query.filter_by(name=name).one()
+    return tuple(getattr(event, counter)
+                 for counter in EventAttendee.COUNTERS)
+
+
+def test_counters(flask_app):
+    ''' Test the attendee counters maintained on flush '''
+    assert counters('One') == (1, 0, 0, 0)
+    assert counters('Two') == (3, 0, 0, 0)
+
+    event = Event.query.filter_by(name='Two').one()
+    for attendee in event.attendees:
+        if attendee.user.name == 'douglas':
+            attendee.status = EventAttendee.ATTENDING
+        elif attendee.user.name == 'Admin':
+            attendee.status = EventAttendee.DECLINED
+    app.db.session.commit()
+    assert counters('Two') == (1, 0, 1, 1)
 
-    db_fd, filename = tempfile.mkstemp()
-    app.app.config['SQLALCHEMY_DATABASE_URI'] = \
-        'sqlite:///{0}'.format(filename)
-    app.app.config['TESTING'] = True
-    wapp = app.app.test_client()
-    app.db.create_all()
+    # removed from the collection and deleted as orphan
+    event = Event.query.filter_by(name='Two').one()
+    event.attendees.remove([a for a in event.attendees
+                            if a.status == EventAttendee.DECLINED][0])
+    # changed without loading the attendee before
+    attendee = EventAttendee.query.filter_by(
+        status=EventAttendee.NEW).join(Event).filter(Event.name == 'Two') \
+        .one()
+    app.db.session.expire(attendee)
+    attendee.status = EventAttendee.INVITED
+    app.db.session.commit()
+    assert counters('Two') == (0, 1, 1, 0)
 
-    add_users(app.db)
-    add_events(app.db)
+    # deleted directly
+    attendee = EventAttendee.query.filter_by(
+        status=EventAttendee.ATTENDING).one()
+    app.db.session.delete(attendee)
+    app.db.session.commit()
+    assert counters('Two') == (0, 1, 0, 0)
 
-    def fin():
-        os.close(db_fd)
-        os.unlink(filename)
-    request.addfinalizer(fin)
+    # moved to another event
+    event = Event.query.filter_by(name='One').one()
+    attendee = Event.query.filter_by(name='Two').one().attendees[0]
+    attendee.status = EventAttendee.ATTENDING
+    attendee.event = event
+    app.db.session.commit()
+    assert counters('One') == (1, 0, 1, 0)
+    assert counters('Two') == (0, 0, 0, 0)
 
-    return wapp
+    # repaired after a change which bypasses the ORM
+    app.db.session.execute(EventAttendee.__table__.update().values(
+        status=EventAttendee.DECLINED))
+    app.db.session.commit()
+    assert recount_events(batch_size=1) == 1
+    assert counters('One') == (0, 0, 0, 2)
+    assert counters('Two') == (0, 0, 0, 0)
+
+
+def test_events_view(flask_app):
+    ''' Test the pages of the events view '''
+    douglas = User.query.filter_by(email='douglas@adams.org').one()
+    event = Event('Future', datetime.datetime.now() +
+                  datetime.timedelta(days=1))
+    event.attendees.append(EventAttendee(douglas))
+    app.db.session.add(event)
+    app.db.session.commit()
+
+    flask_app.application.config['WTF_CSRF_ENABLED'] = False
+    flask_app.application.config['EVENTS_PAGE_SIZE'] = 1
+    flask_app.post('/login', data=dict(email='douglas@adams.org',
+                                       password='default'))
+    rv = flask_app.get('/events')
+    assert 'Future' in rv.data
+    assert 'More' not in rv.data
+
+    rv = flask_app.get('/events?past=1')
+    assert 'Two' in rv.data
+    assert 'One' not in rv.data
+    next_url = re.search('href="([^"]*after[^"]*)"', rv.data).group(1)
+    rv = flask_app.get(next_url.replace('&amp;', '&'))
+    assert 'One' in rv.data
+    assert 'More' not in rv.data
+
+    assert flask_app.get('/events?start=yesterday').status_code == 400
+
+
+@pytest.fixture
+def fill_db():
+    ''' Fill the database with the users and the events '''
+    def fill(db):
+        add_users(db)
+        add_events(db)
+    return fill
 
 
 def add_users(db):
@@ -0,0 +1,96 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import app
+from app.models.user import User, Group
+from app.models.event import Event, EventAttendee
+from app.models.roles import user_roles
+from migrations.generate_data import generate
+
+
+def test_generate(flask_app):
+    ''' Test the size and the structure of a generated dataset '''
+    counts = generate(app.db, users=50, groups=10, depth=5, events=20,
+                      attendees=5, batch_size=7)
+    assert counts['users'] == 50
+    assert counts['groups'] == 12
+    assert counts['group_to_group'] == 10
+    assert counts['events'] == 20
+    assert User.query.count() == 50
+    assert EventAttendee.query.count() == counts['event_attendees']
+
+    admin = User.query.filter_by(email='user0@example.org').one()
+    assert [group.name for group in admin.groups] == ['admin']
+    assert admin.check_password('default')
+
+    # the first groups form a chain of the full depth
+    group = Group.query.filter_by(name='group_4').one()
+    depth = 0
+    while group.parents:
+        group = group.parents[0]
+        depth += 1
+    assert depth == 5
+    assert group.name == 'users'
+
+    user = User.query.filter_by(email='user1@example.org').one()
+    assert 'users' in user_roles(user.id)
+    # require this call that the db remains valid
+    flask_app.get('')
+
+
+def test_generate_twice(flask_app):
+    ''' A second run adds new users to the existing data '''
+    generate(app.db, users=10, groups=2, depth=1, events=2, attendees=2)
+    counts = generate(app.db, users=10, groups=2, depth=1, events=2,
+                      attendees=2)
+    assert counts['users'] == 10
+    assert User.query.count() == 20
+    assert User.query.get(20).email == 'user19@example.org'
+    # require this call that the db remains valid
+    flask_app.get('')
+
+
+def test_generate_deterministic(flask_app):
+    ''' The same seed generates the same data '''
+    generate(app.db, users=20, groups=5, depth=3, events=5, attendees=4,
+             seed=7)
+    first = [(a.event_id, a.user_id, a.status)
+             for a in EventAttendee.query.order_by(
+                 EventAttendee.event_id, EventAttendee.user_id)]
+    dates = [e.event_date for e in Event.query.order_by(Event.id)]
+
+    for table in reversed(app.db.metadata.sorted_tables):
+        app.db.session.execute(table.delete())
+    app.db.session.commit()
+
+    generate(app.db, users=20, groups=5, depth=3, events=5, attendees=4,
+             seed=7)
+    assert [e.event_date for e in Event.query.order_by(Event.id)] == dates
+    assert [(a.event_id, a.user_id, a.status)
+            for a in EventAttendee.query.order_by(
+                EventAttendee.event_id, EventAttendee.user_id)] == first
+    # require this call that the db remains valid
+    flask_app.get('')
@@ -0,0 +1,177 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
+from sqlalchemy import event
+
+import app
+from app.models.user import User, Group
+from app.models.event import Event, EventAttendee
+from app.models.roles import user_roles
+from migrations.import_data import import_files
+
+
+def write(directory, name, lines):
+    ''' Write the lines of a file to import. '''
+    filename = os.path.join(directory, name)
+    with open(filename, 'w') as output:
+        output.write('\n'.join(lines) + '\n')
+    return filename
+
+
+def test_import(flask_app, directory):
+    ''' Test the import of all the kinds with rejected rows '''
+    files = {
+        'users': write(directory, 'users.csv', [
+            'id,name,email,password',
+            '1,Ann,Ann@Example.org,secret',
+            '2,Bob,bob,secret',
+            '3,Cid,cid@example.org,',
+            '4,D\xc3\xbcrr,durr@example.org,other']),
+        'groups': write(directory, 'groups.jsonl', [
+            json.dumps({'id': 1, 'name': 'admin'}),
+            '',
+            '{"id": 3, "name": ',
+            json.dumps({'id': 2, 'name': 'staff'})]),
+        'memberships': write(directory, 'memberships.csv', [
+            'user_id,group_id', '4,2', '1,3', '2,1']),
+        'group_edges': write(directory, 'edges.csv', [
+            'group_id,parent_id', '2,1']),
+        'events': write(directory, 'events.jsonl', [
+            json.dumps({'id': 1, 'name': 'Party',
+                        'event_date': '2015-01-01 18:00'}),
+            json.dumps({'id': 2, 'name': 'Later', 'event_date': 'soon'})]),
+        'attendees': write(directory, 'attendees.csv', [
+            'event_id,user_id,status', '1,1,attending', '1,4,',
+            '1,2,new', '2,1,new', '1,4,unknown'])}
+
+    messages = []
+    counts = import_files(app.db, files, batch_size=2, log=messages.append)
+    assert counts == {'users': (2, 2), 'groups': (2, 1),
+                      'memberships': (1, 2), 'group_edges': (1, 0),
+                      'events': (1, 1), 'attendees': (2, 3)}
+    assert '{0}:3: invalid email: bob'.format(files['users']) in messages
+    assert '{0}:4: missing password'.format(files['users']) in messages
+    assert [message for message in messages if message.startswith(
+        '{0}:3: invalid json'.format(files['groups']))]
+    assert '{0}:3: unknown group_id 3'.format(
+        files['memberships']) in messages
+
+    ann = User.query.get(1)
+    assert ann.email == 'ann@example.org'
+    assert ann.check_password('secret')
+    assert User.query.get(4).name == u'D\xfcrr'
+    assert user_roles(4) == set(['staff', 'admin'])
+    assert Group.query.get(2).parents == [Group.query.get(1)]
+
+    event = Event.query.get(1)
+    assert (event.new_count, event.attending_count) == (1, 1)
+    assert [a.event_date for a in event.attendees] == \
+        [datetime.datetime(2015, 1, 1, 18)] * 2
+    # require this call that the db remains valid
+    flask_app.get('')
+
+
+def test_duplicates(flask_app, directory):
+    ''' Test that existing and repeated keys are rejected '''
+    files = {
+        'users': write(directory, 'users.csv', [
+            'id,name,email,password',
+            '1,Ann,ann@example.org,secret',
+            '1,Bob,bob@example.org,secret',
+            '2,Ann,ANN@example.org,secret',
+            '3,Bob,bob@example.org,secret']),
+        'groups': write(directory, 'groups.csv', ['id,name', '1,admin']),
+        'memberships': write(directory, 'memberships.csv', [
+            'user_id,group_id', '1,1', '1,1', '3,1', '1,1']),
+        'events': write(directory, 'events.csv', [
+            'id,name,event_date', '1,Party,2015-01-01']),
+        'attendees': write(directory, 'attendees.csv', [
+            'event_id,user_id,status', '1,1,new', '1,3,new', '1,1,declined'])}
+
+    messages = []
+    counts = import_files(app.db, files, batch_size=2, log=messages.append)
+    assert counts == {'users': (2, 2), 'groups': (1, 0),
+                      'memberships': (2, 2), 'events': (1, 0),
+                      'attendees': (2, 1)}
+    assert '{0}:3: duplicate id 1'.format(files['users']) in messages
+    assert '{0}:4: duplicate email ann@example.org'.format(
+        files['users']) in messages
+    assert '{0}:5: duplicate user_id 1, group_id 1'.format(
+        files['memberships']) in messages
+    assert Event.query.get(1).new_count == 2
+
+    # a second import rejects every row
+    counts = import_files(app.db, files, batch_size=2)
+    assert counts == {'users': (0, 4), 'groups': (0, 1),
+                      'memberships': (0, 4), 'events': (0, 1),
+                      'attendees': (0, 3)}
+    assert User.query.count() == 2
+    # require this call that the db remains valid
+    flask_app.get('')
+
+
+def test_large_batches(flask_app, directory):
+    ''' Test batches with more rows than SQLite allows parameters '''
+    files = {
+        'groups': write(directory, 'groups.csv', ['id,name'] + [
+            '{0},group{0}'.format(i) for i in range(1, 1201)]),
+        'group_edges': write(directory, 'edges.csv', ['group_id,parent_id'] + [
+            '{0},1'.format(i) for i in range(2, 1201)])}
+
+    # the SQLite versions before 3.32 allow at most 999 parameters
+    parameters = []
+
+    def count(conn, cursor, statement, params, context, executemany):
+        if not executemany:
+            parameters.append(len(params))
+    event.listen(app.db.engine, 'before_cursor_execute', count)
+    try:
+        counts = import_files(app.db, files)
+    finally:
+        event.remove(app.db.engine, 'before_cursor_execute', count)
+    assert counts == {'groups': (1200, 0), 'group_edges': (1199, 0)}
+    assert max(parameters) < 999
+
+
+def test_unknown_kind(flask_app):
+    ''' Test that unknown kinds are rejected before any import '''
+    with pytest.raises(ValueError):
+        import_files(app.db, {'people': 'people.csv'})
+
+
+@pytest.fixture
+def directory(request):
+    ''' Get a temporary directory for the files to import '''
+    directory = tempfile.mkdtemp()
+    request.addfinalizer(lambda: shutil.rmtree(directory))
+    return directory
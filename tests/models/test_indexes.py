@@ -0,0 +1,143 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import datetime
+import imp
+import os
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+import sqlalchemy as sa
+
+import app
+from app.models.user import User, Group, groups_table
+from app.models.event import Event, EventAttendee
+from migrations.generate_data import generate
+
+MIGRATIONS = [os.path.join(
+    os.path.dirname(__file__), '..', '..', 'migrations', 'versions', name)
+    for name in ('1a5c0b7e9d21_add_permission_version_to_users.py',
+                 '5d8e2f4a6c13_widen_the_password_hashes.py',
+                 '39f297e06d0d_add_event_and_membership_indexes.py',
+                 '2f40738d932e_add_event_date_to_event_attendees.py',
+                 '84e6998f2851_add_attendee_counters_to_events.py')]
+
+
+def plan(query):
+    ''' Get the query plan of a query as one string. '''
+    statement = query.statement.compile(dialect=app.db.engine.dialect)
+    parameters = [statement.params[name] for name in statement.positiontup]
+    rows = app.db.engine.execute('EXPLAIN QUERY PLAN ' + str(statement),
+                                 parameters)
+    return '\n'.join(row[len(row) - 1] for row in rows)
+
+
+def test_query_plans(flask_app):
+    ''' Test that the main queries use the indexes '''
+    session = app.db.session
+
+    # the events of a user
+    user = User.query.first()
+    text = plan(Event.query.join('attendees', 'user').filter(
+        User.id == user.id))
+    assert 'ix_event_attendees_user_date' in text
+
+    # the groups of a user (roles)
+    text = plan(session.query(groups_table.c.group_id).filter(
+        groups_table.c.user_id == user.id))
+    assert 'COVERING INDEX ix_group_to_user_user_id' in text
+
+    # the members and the children of a group
+    text = plan(session.query(groups_table.c.user_id).filter(
+        groups_table.c.group_id == 1))
+    assert 'ix_group_to_user_group_id' in text
+    group = Group.query.first()
+    text = plan(Group.query.with_parent(group, 'children'))
+    assert 'ix_group_to_group_child_id' in text
+
+    # the events within a date range
+    text = plan(Event.query.filter(
+        Event.event_date.between(datetime.datetime(2014, 1, 1),
+                                 datetime.datetime(2014, 2, 1))))
+    assert 'ix_events_event_date' in text
+
+    # the attendees of an event by status
+    text = plan(session.query(EventAttendee.user_id).filter(
+        EventAttendee.event_id == 1,
+        EventAttendee.status == EventAttendee.NEW))
+    assert 'ix_event_attendees_event_status' in text
+
+
+def test_migrations(flask_app):
+    ''' Test that the migrations add missing parts and keep existing '''
+    migrations = [imp.load_source('index_migration_{0}'.format(i), filename)
+                  for i, filename in enumerate(MIGRATIONS)]
+    tables = ('events', 'event_attendees', 'group_to_user', 'group_to_group')
+    names = set(index.name for table in tables
+                for index in app.db.metadata.tables[table].indexes)
+
+    def indexes():
+        inspector = sa.inspect(app.db.engine)
+        return set(index['name'] for table in tables
+                   for index in inspector.get_indexes(table))
+
+    def run(step):
+        with app.db.engine.begin() as connection:
+            with Operations.context(MigrationContext.configure(connection)):
+                step()
+
+    # create_all created the indexes already
+    assert indexes() == names
+    for migration in migrations:
+        run(migration.upgrade)
+    assert indexes() == names
+
+    for migration in reversed(migrations):
+        run(migration.downgrade)
+    assert not indexes()
+    for migration in migrations:
+        run(migration.upgrade)
+    assert indexes() == names
+    assert app.db.engine.scalar(
+        'SELECT count(*) FROM users WHERE permission_version = 0') == \
+        User.query.count()
+    assert app.db.engine.scalar(
+        'SELECT count(*) FROM event_attendees JOIN events ON '
+        'events.id = event_id WHERE event_attendees.event_date = '
+        'events.event_date') == EventAttendee.query.count()
+    assert app.db.engine.scalar(
+        'SELECT sum(new_count + invited_count + attending_count + '
+        'declined_count) FROM events') == EventAttendee.query.count()
+
+
+@pytest.fixture
+def fill_db():
+    ''' Fill the database with a generated dataset '''
+    def fill(db):
+        generate(db, users=200, groups=10, depth=3, events=50, attendees=5)
+        db.engine.execute('ANALYZE')
+    return fill
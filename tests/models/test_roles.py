@@ -0,0 +1,189 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+
+from sqlalchemy import event
+
+import app
+from app.models.user import User, Group
+from app.models.roles import group_closure, user_roles, cached_user_roles
+
+
+def test_user_roles(flask_app):
+    ''' Test the resolving of the roles over the group hierarchy '''
+    admin = User.query.filter_by(email='admin@admin.org').one()
+    little_admin = User.query.filter_by(email='little_admin@admin.org').one()
+    douglas = User.query.filter_by(email='douglas@adams.org').one()
+
+    assert user_roles(admin.id) == set(['admin'])
+    assert user_roles(little_admin.id) == set(['little_admin', 'admin'])
+    assert user_roles(douglas.id) == set(['users'])
+    # require this call that the db remains valid
+    flask_app.get('')
+
+
+def test_roles_query_count(flask_app):
+    ''' A cached hierarchy requires only the query for the memberships '''
+    little_admin = User.query.filter_by(email='little_admin@admin.org').one()
+    user_roles(little_admin.id)
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(app.db.engine, 'before_cursor_execute', count)
+    try:
+        assert user_roles(little_admin.id) == set(['little_admin', 'admin'])
+    finally:
+        event.remove(app.db.engine, 'before_cursor_execute', count)
+    assert len(statements) == 1
+    # require this call that the db remains valid
+    flask_app.get('')
+
+
+def test_roles_invalidation(flask_app):
+    ''' Changes of the hierarchy are visible and cycles are tolerated '''
+    douglas = User.query.filter_by(email='douglas@adams.org').one()
+    assert user_roles(douglas.id) == set(['users'])
+    generation = group_closure.generation
+
+    users = Group.query.filter_by(name='users').one()
+    little_admin = Group.query.filter_by(name='little_admin').one()
+    admin = Group.query.filter_by(name='admin').one()
+    users.parents.append(little_admin)
+    # create a cycle admin -> users -> little_admin -> admin
+    admin.parents.append(users)
+    app.db.session.commit()
+
+    assert group_closure.generation > generation
+    assert user_roles(douglas.id) == set(['users', 'little_admin', 'admin'])
+    # require this call that the db remains valid
+    flask_app.get('')
+
+
+def test_hierarchy_permission_versions(flask_app):
+    ''' A change of the hierarchy bumps the versions of the affected users '''
+    versions = dict(app.db.session.query(User.email, User.permission_version))
+    little_admin = Group.query.filter_by(name='little_admin').one()
+    little_admin.parents.append(Group.query.filter_by(name='users').one())
+    app.db.session.commit()
+
+    changed = dict(app.db.session.query(User.email, User.permission_version))
+    assert changed['little_admin@admin.org'] == \
+        versions['little_admin@admin.org'] + 1
+    assert changed['admin@admin.org'] == versions['admin@admin.org']
+    assert changed['douglas@adams.org'] == versions['douglas@adams.org']
+
+    # the members of the descendant groups are affected as well
+    admin = Group.query.filter_by(name='admin').one()
+    admin.name = 'administrators'
+    app.db.session.commit()
+    versions, changed = changed, dict(
+        app.db.session.query(User.email, User.permission_version))
+    assert changed['admin@admin.org'] == versions['admin@admin.org'] + 1
+    assert changed['little_admin@admin.org'] == \
+        versions['little_admin@admin.org'] + 1
+    assert changed['douglas@adams.org'] == versions['douglas@adams.org']
+
+    # an existing user added to a new group
+    douglas = User.query.filter_by(email='douglas@adams.org').one()
+    app.db.session.add(Group(name='writers', users=[douglas]))
+    app.db.session.commit()
+    versions, changed = changed, dict(
+        app.db.session.query(User.email, User.permission_version))
+    assert changed['douglas@adams.org'] == versions['douglas@adams.org'] + 1
+    assert changed['admin@admin.org'] == versions['admin@admin.org']
+    assert cached_user_roles(douglas) == frozenset(['users', 'writers'])
+    # require this call that the db remains valid
+    flask_app.get('')
+
+
+def test_cached_user_roles(flask_app):
+    ''' Cached roles require no query and follow the permission version '''
+    douglas = User.query.filter_by(email='douglas@adams.org').one()
+    assert cached_user_roles(douglas) == frozenset(['users'])
+    version = douglas.permission_version
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(app.db.engine, 'before_cursor_execute', count)
+    try:
+        assert cached_user_roles(douglas) == frozenset(['users'])
+    finally:
+        event.remove(app.db.engine, 'before_cursor_execute', count)
+    assert len(statements) == 0
+
+    douglas.groups.append(Group.query.filter_by(name='admin').one())
+    app.db.session.commit()
+    assert douglas.permission_version == version + 1
+    assert cached_user_roles(douglas) == frozenset(['users', 'admin'])
+    # require this call that the db remains valid
+    flask_app.get('')
+
+
+@pytest.fixture
+def fill_db():
+    ''' Fill the database with the users and the groups '''
+    return add_users
+
+
+def add_users(db):
+    ''' Add some simple users with a group hierarchy. '''
+    # create admin group
+    group = Group()
+    group.name = 'admin'
+    db.session.add(group)
+
+    # create admin user
+    user = User('Admin', 'admin@admin.org')
+    user.set_password('default')
+    user.groups.append(group)
+
+    # create a subgroup for admins
+    sub_group = Group()
+    sub_group.name = 'little_admin'
+    sub_group.parents.append(group)
+    db.session.add(group)
+
+    # create little admin user
+    user = User('little admin', 'little_admin@admin.org')
+    user.set_password('default')
+    user.groups.append(sub_group)
+
+    # create users group
+    group = Group()
+    group.name = 'users'
+    db.session.add(group)
+
+    # add standard user
+    user = User('douglas', 'douglas@adams.org')
+    user.set_password('default')
+    user.groups.append(group)
+    db.session.add(user)
+    db.session.commit()
@@ -25,10 +25,7 @@
 #
 
 import pytest
-import os
-import tempfile
 
-import app
 from app.models.user import User, Group
 
 
@@ -70,24 +67,9 @@ def test_ubgroups(flask_app):
 
 
 @pytest.fixture
-def flask_app(request):
-    ''' Get a flask app to call the flask app as an example client '''
-
-    db_fd, filename = tempfile.mkstemp()
-    app.app.config['SQLALCHEMY_DATABASE_URI'] = \
-        'sqlite:///{0}'.format(filename)
-    app.app.config['TESTING'] = True
-    wapp = app.app.test_client()
-    app.db.create_all()
-
-    add_users(app.db)
-
-    def fin():
-        os.close(db_fd)
-        os.unlink(filename)
-    request.addfinalizer(fin)
-
-    return wapp
+def fill_db():
+    ''' Fill the database with the users and the groups '''
+    return add_users
 
 
 def add_users(db):
@@ -0,0 +1,117 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+import pytest
+
+import app
+from app.assets import build_assets
+
+
+def test_build_assets(static_folder):
+    ''' Test the hashing, the css rewriting and the compression '''
+    manifest = build_assets(static_folder)
+    assert sorted(manifest) == ['css/site.css', 'fonts/icons.woff',
+                                'js/site.js']
+    dist = os.path.join(static_folder, 'dist')
+    with open(os.path.join(dist, 'manifest.json')) as f:
+        assert json.load(f) == manifest
+
+    css = manifest['css/site.css']
+    assert css.startswith('css/site.') and css.endswith('.css')
+    with open(os.path.join(dist, css)) as f:
+        content = f.read()
+    font = os.path.basename(manifest['fonts/icons.woff'])
+    assert "url('../fonts/{0}?v=1')".format(font) in content
+    assert 'url(http://example.org/other.png)' in content
+
+    with open(os.path.join(dist, manifest['js/site.js']), 'rb') as f:
+        js = f.read()
+    with gzip.open(os.path.join(dist, manifest['js/site.js'] + '.gz')) as f:
+        assert f.read() == js
+    # fonts like woff are compressed already
+    assert not os.path.exists(
+        os.path.join(dist, manifest['fonts/icons.woff'] + '.gz'))
+
+    # the build is reproducible
+    assert build_assets(static_folder) == manifest
+
+
+def test_serve_assets(static_folder):
+    ''' Test the urls and the headers of the hashed assets '''
+    manifest = build_assets(static_folder)
+    application = app.create_app()
+    assets = application.extensions['assets']
+    assets.folder = os.path.join(static_folder, 'dist')
+    assets.load_manifest()
+    with application.test_request_context('/'):
+        url = app.assets.url('js/site.js')
+        assert url == '/static/dist/' + manifest['js/site.js']
+        assert app.assets.url('js/other.js') == '/static/js/other.js'
+
+    wapp = application.test_client()
+    rv = wapp.get(url)
+    assert rv.data == "var x = 1;\n" * 100
+    assert 'max-age=31536000' in rv.headers['Cache-Control']
+    assert 'immutable' in rv.headers['Cache-Control']
+    assert 'Content-Encoding' not in rv.headers
+
+    rv = wapp.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert rv.headers['Vary'] == 'Accept-Encoding'
+    assert 'javascript' in rv.headers['Content-Type']
+
+    rv = wapp.get('/static/dist/js/missing.js')
+    assert rv.status_code == 404
+
+
+@pytest.fixture
+def static_folder(request):
+    ''' Create a static folder with some assets '''
+    folder = tempfile.mkdtemp()
+    files = {
+        'css/site.css':
+            "@font-face { src: url('../fonts/icons.woff?v=1') }\n"
+            "body { background: url(http://example.org/other.png) }\n",
+        'fonts/icons.woff': 'woff',
+        'js/site.js': "var x = 1;\n" * 100,
+    }
+    for name, content in files.items():
+        path = os.path.join(folder, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def fin():
+        shutil.rmtree(folder)
+    request.addfinalizer(fin)
+    return folder
@@ -0,0 +1,71 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+
+import pytest
+
+from benchmarks import runner
+
+
+def test_benchmarks_run():
+    ''' Run every benchmark a few times on a tiny dataset '''
+    results = runner.run(iterations=2, users=5, depth=2, events=3,
+                         attendees=2)
+    assert sorted(results) == sorted(
+        [name for name, f in runner.BENCHMARKS] + ['startup'])
+    for result in results.values():
+        assert result['ops'] > 0
+        assert result['p50'] <= result['p99']
+
+
+def test_startup_baseline():
+    ''' Fail if the import and create_app are slower than the baseline '''
+    baseline = runner.load_baseline()
+    if 'startup' not in baseline:
+        pytest.skip('no startup baseline')
+    results = {'startup': runner.startup(5)}
+    assert runner.regressions(results, baseline) == []
+
+
+def test_regressions():
+    ''' Test the comparison with the baseline '''
+    baseline = {'a': {'ops': 100.0}, 'b': {'ops': 100.0}}
+    results = {'a': {'ops': 80.0}, 'b': {'ops': 70.0}, 'c': {'ops': 1.0}}
+    assert runner.regressions(results, baseline, 0.25) == \
+        [('b', 100.0, 70.0)]
+
+
+@pytest.mark.skipif(not os.environ.get('BENCHMARK'),
+                    reason='set BENCHMARK=1 to run the benchmarks')
+def test_benchmark_baseline():
+    ''' Fail if a benchmark is slower than the stored baseline '''
+    baseline = runner.load_baseline()
+    if not baseline:
+        pytest.skip('no baseline, store one with: '
+                    'run.py benchmark --save-baseline')
+    results = runner.run()
+    assert runner.regressions(results, baseline) == []
@@ -0,0 +1,110 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+import tempfile
+import time
+
+from app.cache import LRUCache, SQLiteCache
+
+
+def test_lru_cache():
+    ''' Test the eviction and the counters of the lru cache '''
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # b is the least recently used entry
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+    cache.delete('a')
+    assert cache.get('a', 'missing') == 'missing'
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_lru_cache_ttl():
+    ''' Test the expiration of cache entries '''
+    cache = LRUCache(ttl=0.01)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.02)
+    assert cache.get('a') is None
+
+
+def test_sqlite_cache():
+    ''' Test the cache shared over a sqlite file '''
+    db_fd, filename = tempfile.mkstemp()
+    try:
+        cache = SQLiteCache(filename, table='roles')
+        other = SQLiteCache(filename, table='users')
+        cache.set('a', frozenset(['admin']))
+        other.set('a', 'other')
+        assert cache.get('a') == frozenset(['admin'])
+        assert SQLiteCache(filename, table='roles').get('a') == \
+            frozenset(['admin'])
+        cache.clear()
+        assert cache.get('a') is None
+        assert other.get('a') == 'other'
+        assert cache.hits == 1
+        assert cache.misses == 1
+        cache.close()
+        other.close()
+    finally:
+        os.close(db_fd)
+        os.unlink(filename)
+
+
+def test_sqlite_cache_purge():
+    ''' Test the removal of the expired and the oldest entries '''
+    db_fd, filename = tempfile.mkstemp()
+    try:
+        cache = SQLiteCache(filename, maxsize=10)
+        cache.purge_interval = 5
+        for i in range(14):
+            cache.set(str(i), i)
+        # purged after the 10th write
+        assert cache.get('0') == 0
+        cache.set('14', 14)
+        assert cache.get('4') is None
+        assert cache.get('5') == 5
+        assert cache.get('14') == 14
+
+        cache.ttl = -1
+        cache.set('expired', 1)
+        cache.purge()
+        assert cache.get('expired') is None
+        assert cache.get('14') == 14
+        cache.close()
+    finally:
+        os.close(db_fd)
+        os.unlink(filename)
@@ -0,0 +1,69 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+import tempfile
+
+from sqlalchemy.pool import QueuePool
+
+import app
+
+
+def test_sqlite_engine():
+    ''' Test the pool and the pragmas of a SQLite engine '''
+    db_fd, filename = tempfile.mkstemp()
+    application = app.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{0}'.format(filename),
+        'SQLALCHEMY_POOL_SIZE': 2,
+        'SQLALCHEMY_POOL_PRE_PING': True,
+        'SQLITE_JOURNAL_MODE': 'WAL',
+        'SQLITE_SYNCHRONOUS': 'NORMAL',
+        'SQLITE_BUSY_TIMEOUT': 1234,
+        'SQLITE_CACHE_SIZE': None})
+    try:
+        engine = app.db.get_engine(application)
+        assert isinstance(engine.pool, QueuePool)
+        assert engine.pool.size() == 2
+        with engine.connect() as conn:
+            assert conn.scalar('PRAGMA journal_mode') == 'wal'
+            # NORMAL
+            assert conn.scalar('PRAGMA synchronous') == 1
+            assert conn.scalar('PRAGMA busy_timeout') == 1234
+            # the SQLite default
+            assert conn.scalar('PRAGMA cache_size') == -2000
+        engine.dispose()
+    finally:
+        os.close(db_fd)
+        os.unlink(filename)
+
+
+def test_memory_engine():
+    ''' An in memory database must not use a pool of connections '''
+    application = app.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'SQLALCHEMY_POOL_SIZE': 2})
+    engine = app.db.get_engine(application)
+    assert not isinstance(engine.pool, QueuePool)
@@ -0,0 +1,160 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import os
+import re
+import tempfile
+import warnings
+
+import app
+from app.instrumentation import (
+    track_queries, NPlusOneError, NPlusOneWarning)
+from app.models.user import User
+from test_login import add_users, login
+
+
+def test_server_timing(flask_app):
+    ''' Test the Server-Timing header and the aggregation per endpoint '''
+    app.request_timing.reset()
+    rv = flask_app.get('/')
+    header = rv.headers['Server-Timing']
+    assert re.match(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", '
+                    r'tpl;dur=[\d.]+$', header)
+    assert float(re.search(r'tpl;dur=([\d.]+)', header).group(1)) > 0
+
+    login(flask_app, 'douglas@adams.org', 'default')
+    rv = flask_app.get('/')
+    assert int(re.search(r'(\d+) queries', rv.headers['Server-Timing'])
+               .group(1)) > 0
+
+    stats = app.request_timing.snapshot()
+    assert stats['main.index']['count'] == 3
+    assert stats['main.index']['queries'] > 0
+    assert stats['main.index']['max_time'] <= stats['main.index']['time']
+    assert stats['auth.login']['count'] == 2
+
+
+def test_disabled():
+    ''' Test that nothing is recorded by default '''
+    rv = app.create_app().test_client().get('/')
+    assert 'Server-Timing' not in rv.headers
+
+
+def test_track_queries(flask_app):
+    ''' Test the detection of repeated statements (N+1 queries) '''
+    users = User.query.all()
+    with track_queries(threshold=2, raise_error=True) as tracker:
+        with pytest.raises(NPlusOneError) as error:
+            for user in users:
+                user.groups
+    assert tracker.count == 2
+    assert 'group_to_user' in str(error.value)
+    assert 'test_instrumentation.py' in str(error.value)
+
+    app.db.session.expire_all()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        with track_queries(threshold=2):
+            for user in User.query.all():
+                user.groups
+    assert [w.category for w in caught] == [NPlusOneWarning]
+
+
+def test_request_detection(flask_app):
+    ''' Test the detection within requests '''
+    application = flask_app.application
+    application.config['NPLUSONE_ENABLED'] = True
+    application.config['NPLUSONE_RAISE'] = True
+    application.config['NPLUSONE_THRESHOLD'] = 2
+    app.nplusone.init_app(application)
+
+    @application.route('/test_nplusone')
+    def nplusone():
+        return str(len([user.groups for user in User.query.all()]))
+
+    with pytest.raises(NPlusOneError):
+        flask_app.get('/test_nplusone')
+    assert flask_app.get('/').status_code == 200
+
+
+def test_max_queries(flask_app, max_queries):
+    ''' Test the number of statements of the main views '''
+    with max_queries(0):
+        flask_app.get('/')
+    login(flask_app, 'admin@admin.org', 'default')
+    with max_queries(3):
+        flask_app.get('/')
+    with max_queries(3):
+        flask_app.get('/admin')
+
+
+def test_slow_query_log(request):
+    ''' Test the log of the slow statements with their query plan '''
+    db_fd, filename = tempfile.mkstemp()
+    log_fd, log = tempfile.mkstemp()
+    application = app.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{0}'.format(filename),
+        'SLOW_QUERY_THRESHOLD': 0,
+        'SLOW_QUERY_LOG': log,
+        'TESTING': True})
+    ctx = application.app_context()
+    ctx.push()
+
+    def fin():
+        ctx.pop()
+        app.db.get_engine(application).dispose()
+        for fd, name in ((db_fd, filename), (log_fd, log)):
+            os.close(fd)
+            os.unlink(name)
+    request.addfinalizer(fin)
+
+    app.db.create_all()
+    add_users(app.db)
+    with application.test_request_context('/test'):
+        User.query.filter_by(name='douglas').first()
+
+    with open(log) as input:
+        text = input.read()
+    assert 'slow query' in text
+    assert 'in None (GET /test): SELECT users.id' in text
+    assert 'parameters: (str, int, int)' in text
+    assert 'SCAN TABLE users' in text or 'SCAN users' in text
+    assert 'douglas' not in text
+    assert 'INSERT INTO users' in text
+    assert 'no request' in text
+
+
+@pytest.fixture
+def app_config():
+    ''' Enable the request timing '''
+    return {'REQUEST_TIMING_ENABLED': True}
+
+
+@pytest.fixture
+def fill_db():
+    ''' Fill the database with the users and the groups '''
+    return add_users
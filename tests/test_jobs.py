@@ -0,0 +1,238 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import datetime
+import json
+import os
+import tempfile
+import time
+
+import sqlalchemy
+
+import app
+from app.jobs import JobQueue, Worker, job, JOBS, QUEUED, DONE, FAILED
+from app.invitations import invitations_sent, invite_attendees
+from app.models.event import Event, EventAttendee
+from app.models.user import User
+from test_login import add_users, login
+
+
+def test_queue(queue):
+    ''' Test the claiming and the leases of the jobs '''
+    first = queue.enqueue('test', {'value': 1})
+    second = queue.enqueue('test', {'value': 2}, delay=60)
+    assert queue.get(first)['status'] == QUEUED
+
+    claimed = queue.claim(lease=60)
+    assert claimed == dict(id=first, name='test', payload={'value': 1},
+                           attempts=1)
+    # the second job is not due and the first one is locked
+    assert queue.claim(lease=60) is None
+
+    # an expired lease is taken over
+    queue.progress(first, {'done': 1}, lease=-1)
+    assert queue.claim(lease=60)['attempts'] == 2
+    assert queue.get(first)['progress'] == {'done': 1}
+
+    queue.complete(first)
+    assert queue.get(first)['status'] == DONE
+    queue.purge(-1)
+    assert queue.get(first) is None
+    assert queue.get(second)['status'] == QUEUED
+
+    # a forked worker opens its own connection
+    conn = queue._connection()
+    queue._local.pid = -1
+    assert queue._connection() is not conn
+    assert queue.get(second)['status'] == QUEUED
+    conn.close()
+
+
+def test_worker_retry(queue):
+    ''' Test the retries with backoff of failing jobs '''
+    calls = []
+
+    @job('test_flaky')
+    def flaky(payload, progress):
+        calls.append(payload)
+        progress(step=len(calls))
+        if len(calls) < 3:
+            raise ValueError('failure {0}'.format(len(calls)))
+
+    messages = []
+    worker = Worker(queue, max_attempts=3, backoff=0, log=messages.append)
+    ctx = app.create_app().app_context()
+    ctx.push()
+    try:
+        job_id = queue.enqueue('test_flaky', {'value': 1})
+        assert worker.run_once()
+        state = queue.get(job_id)
+        assert state['status'] == QUEUED
+        assert 'failure 1' in state['error']
+
+        worker.run(burst=True)
+        assert queue.get(job_id)['status'] == DONE
+        assert len(calls) == 3
+        assert 'job {0} test_flaky: step=1'.format(job_id) in messages
+        assert 'job {0} test_flaky done'.format(job_id) in messages
+
+        # the last attempt fails for good, the backoff doubles
+        calls[:] = []
+        worker.backoff = 10
+        job_id = queue.enqueue('test_flaky', {})
+        assert worker.run_once()
+        assert 'retry in 10s' in messages[-1]
+        assert not worker.run_once()
+
+        job_id = queue.enqueue('unknown', {})
+        worker.max_attempts = 1
+        assert worker.run_once()
+        assert queue.get(job_id)['status'] == FAILED
+    finally:
+        ctx.pop()
+        del JOBS['test_flaky']
+
+
+def test_invitations(flask_app):
+    ''' Test the invitations of an event in batches '''
+    application = flask_app.application
+    application.config['INVITATION_BATCH_SIZE'] = 2
+    users = User.query.all()
+    event = Event('Party', datetime.datetime(2015, 1, 1))
+    for user in users:
+        event.attendees.append(EventAttendee(user))
+    event.attendees[0].status = EventAttendee.DECLINED
+    app.db.session.add(event)
+    app.db.session.commit()
+    event_id = event.id
+
+    login(flask_app, 'douglas@adams.org', 'default')
+    assert flask_app.post('/admin/events/1/invitations').status_code == 403
+    flask_app.get('/logout')
+    login(flask_app, 'admin@admin.org', 'default')
+    assert flask_app.post('/admin/events/99/invitations').status_code == 404
+    rv = flask_app.post('/admin/events/{0}/invitations'.format(event_id))
+    assert rv.status_code == 202
+    status_url = json.loads(rv.data)['url']
+    assert json.loads(flask_app.get(status_url).data)['status'] == QUEUED
+
+    sent = []
+
+    def on_sent(sender, event_id, user_ids):
+        sent.append(len(user_ids))
+    invitations_sent.connect(on_sent)
+    try:
+        app.jobs.worker().run(burst=True)
+    finally:
+        invitations_sent.disconnect(on_sent)
+
+    state = json.loads(flask_app.get(status_url).data)
+    assert state['status'] == DONE
+    assert state['progress'] == {'invited': len(users) - 1,
+                                 'total': len(users) - 1}
+    pending = len(users) - 1
+    assert sent == [2] * (pending // 2) + [1] * (pending % 2)
+
+    app.db.session.expire_all()
+    event = Event.query.get(event_id)
+    assert (event.new_count, event.invited_count, event.declined_count) == \
+        (0, len(users) - 1, 1)
+    assert EventAttendee.query.filter_by(
+        event_id=event_id, status=EventAttendee.INVITED).count() == \
+        len(users) - 1
+
+
+def test_invitations_batch(flask_app):
+    ''' Test a batch with more attendees than SQLite allows parameters '''
+    app.db.session.execute(User.__table__.insert(), [
+        {'name': 'user{0}'.format(i), 'email': 'user{0}@example.org'.format(i),
+         'permission_version': 0} for i in range(1200)])
+    event = Event('Party', datetime.datetime(2015, 1, 1))
+    app.db.session.add(event)
+    app.db.session.commit()
+    user_ids = [row[0] for row in app.db.session.query(User.id)]
+    app.db.session.execute(EventAttendee.__table__.insert(), [
+        {'event_id': event.id, 'user_id': user_id,
+         'status': EventAttendee.NEW} for user_id in user_ids])
+    event.new_count = len(user_ids)
+    app.db.session.commit()
+
+    # the SQLite versions before 3.32 allow at most 999 parameters
+    parameters = []
+
+    def count(conn, cursor, statement, params, context, executemany):
+        parameters.append(len(params))
+    sqlalchemy.event.listen(app.db.engine, 'before_cursor_execute', count)
+    try:
+        invite_attendees({'event_id': event.id}, lambda **values: None)
+    finally:
+        sqlalchemy.event.remove(app.db.engine, 'before_cursor_execute',
+                                count)
+    assert max(parameters) < 999
+    assert EventAttendee.query.filter_by(
+        event_id=event.id, status=EventAttendee.INVITED).count() == \
+        len(user_ids)
+
+
+@pytest.fixture
+def queue(request):
+    ''' Get a job queue in a temporary file '''
+    fd, filename = tempfile.mkstemp()
+    queue = JobQueue(filename)
+
+    def fin():
+        queue.close()
+        os.close(fd)
+        os.unlink(filename)
+    request.addfinalizer(fin)
+    return queue
+
+
+@pytest.fixture
+def app_config(request):
+    ''' Use a job queue in a temporary file '''
+    fd, filename = tempfile.mkstemp()
+
+    def fin():
+        os.close(fd)
+        os.unlink(filename)
+    request.addfinalizer(fin)
+    return {'JOB_QUEUE_PATH': filename}
+
+
+@pytest.fixture
+def flask_app(request, flask_app):
+    ''' Close the job queue of the app after the test '''
+    jobs = flask_app.application.extensions['jobs']
+    request.addfinalizer(lambda: jobs.queue.close())
+    return flask_app
+
+
+@pytest.fixture
+def fill_db():
+    ''' Fill the database with the users and the groups '''
+    return add_users
@@ -0,0 +1,64 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+from babel import Locale
+
+from app.locales import LocaleNegotiator
+
+
+class FakeBabel(object):
+    ''' Provides the translations like Flask-Babel '''
+    def __init__(self, locales):
+        self.locales = locales
+        self.calls = 0
+
+    def list_translations(self):
+        self.calls += 1
+        return [Locale.parse(locale) for locale in self.locales]
+
+
+def test_best_match():
+    ''' Test the negotiation of the locale '''
+    babel = FakeBabel(['de'])
+    negotiator = LocaleNegotiator(babel)
+    assert negotiator.best_match('de-CH,de;q=0.8,en;q=0.5') == 'de'
+    assert negotiator.best_match('fr,en;q=0.5') == 'en'
+    assert negotiator.best_match('fr') is None
+    assert negotiator.best_match('') is None
+    assert negotiator.best_match('fr') is None
+    assert babel.calls == 1
+
+
+def test_reload():
+    ''' Test the reload of the available translations '''
+    babel = FakeBabel(['de'])
+    negotiator = LocaleNegotiator(babel)
+    assert negotiator.best_match('fr,en;q=0.5') == 'en'
+    babel.locales.append('fr')
+    assert negotiator.best_match('fr,en;q=0.5') == 'en'
+    negotiator.reload()
+    assert negotiator.best_match('fr,en;q=0.5') == 'fr'
+    assert babel.calls == 2
@@ -29,8 +29,11 @@ import os
 import re
 import tempfile
 
+from werkzeug.security import generate_password_hash
+
 import app
-from app.models.user import User, Group
+from app.models.roles import get_role_cache
+from app.models.user import User, Group, UserSnapshot, get_user_cache
 
 
 def test_login_logout(flask_app):
@@ -72,6 +75,8 @@ def test_admin_page(flask_app):
     rv = flask_app.get('/admin')
     rv.status_code == 400
     assert "Admin welcome to the Matrix" in rv.data
+    # the metrics are disabled
+    assert flask_app.get('/metrics').status_code == 404
     rv = logout(flask_app)
     assert "The content of this page" in rv.data
     rv = flask_app.get('/admin')
@@ -84,6 +89,8 @@ def test_admin_page(flask_app):
     rv = flask_app.get('/admin')
     rv.status_code == 400
     assert "Admin welcome to the Matrix" in rv.data
+    # the metrics are disabled
+    assert flask_app.get('/metrics').status_code == 404
     rv = logout(flask_app)
     assert "The content of this page" in rv.data
 
@@ -97,24 +104,71 @@ def test_admin_page(flask_app):
     assert "The content of this page" in rv.data
 
 
+def test_user_cache(flask_app):
+    ''' Test the login with the cached user snapshots '''
+    config = flask_app.application.config
+    config['USER_CACHE_ENABLED'] = True
+    try:
+        rv = login(flask_app, 'little_admin@admin.org', 'default')
+        assert "[little admin]" in rv.data
+        cache = get_user_cache()
+        hits = cache.hits
+        rv = flask_app.get('/admin')
+        assert "Admin welcome to the Matrix" in rv.data
+        assert cache.hits > hits
+
+        # a changed user must not be served from the cache
+        user = User.query.filter_by(email='little_admin@admin.org').one()
+        user.name = 'tiny admin'
+        app.db.session.commit()
+        rv = flask_app.get('/admin')
+        assert "Admin welcome to the Matrix tiny admin" in rv.data
+        rv = logout(flask_app)
+        assert "The content of this page" in rv.data
+    finally:
+        config['USER_CACHE_ENABLED'] = False
+
+
+def test_state_per_app():
+    ''' Test the extensions and the caches of two apps in one process '''
+    first = app.create_app({'LOGIN_THROTTLE_ENABLED': False,
+                            'ROLE_CACHE_SIZE': 10,
+                            'USER_CACHE_ENABLED': True,
+                            'USER_CACHE_SIZE': 10,
+                            'TESTING': True})
+    second = app.create_app({'USER_CACHE_ENABLED': True, 'TESTING': True})
+    with first.app_context():
+        assert not app.login_throttle.enabled
+        role_cache = get_role_cache()
+        user_cache = get_user_cache()
+        assert role_cache.maxsize == 10
+        assert user_cache.maxsize == 10
+    with second.app_context():
+        assert app.login_throttle.enabled
+        assert get_role_cache() is not role_cache
+        assert get_role_cache().maxsize == 10000
+        assert get_user_cache().maxsize == 10000
+
+
+def test_rehash_on_login(flask_app):
+    ''' Test the replacement of outdated password hashes on login '''
+    user = User.query.filter_by(email='douglas@adams.org').one()
+    user.password = generate_password_hash('default', 'pbkdf2:sha1:1000')
+    app.db.session.commit()
+
+    rv = login(flask_app, 'douglas@adams.org', 'default')
+    assert "[douglas]" in rv.data
+    user = User.query.filter_by(email='douglas@adams.org').one()
+    assert user.password.startswith(app.password_hasher.full_method + '$')
+    assert user.check_password('default')
+    rv = logout(flask_app)
+    assert "The content of this page" in rv.data
+
+
 @pytest.fixture
-def flask_app(request):
-    ''' Get a flask app to call the flask app as an example client '''
-    db_fd, filename = tempfile.mkstemp()
-    app.app.config['SQLALCHEMY_DATABASE_URI'] = \
-        'sqlite:///{0}'.format(filename)
-    app.app.config['TESTING'] = True
-    wapp = app.app.test_client()
-    app.db.create_all()
-
-    add_users(app.db)
-
-    def fin():
-        os.close(db_fd)
-        os.unlink(filename)
-    request.addfinalizer(fin)
-
-    return wapp
+def fill_db():
+    ''' Fill the database with the users and the groups '''
+    return add_users
 
 
 def add_users(db):
@@ -0,0 +1,119 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import json
+import os
+import shutil
+import tempfile
+
+import app
+from app.metrics import (
+    Counter, Histogram, Registry, render, merge, login_attempts)
+from test_login import add_users, login
+
+
+def test_render():
+    ''' Test the Prometheus text format of counters and histograms '''
+    registry = Registry()
+    counter = registry.register(Counter('test_total', 'Test.', ['kind']))
+    counter.inc(kind='a')
+    counter.inc(2, kind='b "quoted"')
+    histogram = registry.register(Histogram(
+        'test_seconds', 'Test.', ['kind'], buckets=(0.1, 1)))
+    histogram.observe(0.05, kind='a')
+    histogram.observe(0.5, kind='a')
+    histogram.observe(5, kind='a')
+
+    text = render(registry.collect())
+    assert '# TYPE test_total counter\n' in text
+    assert 'test_total{kind="a"} 1\n' in text
+    assert 'test_total{kind="b \\"quoted\\""} 2\n' in text
+    assert '# TYPE test_seconds histogram\n' in text
+    assert 'test_seconds_bucket{kind="a",le="0.1"} 1\n' in text
+    assert 'test_seconds_bucket{kind="a",le="1"} 2\n' in text
+    assert 'test_seconds_bucket{kind="a",le="+Inf"} 3\n' in text
+    assert 'test_seconds_sum{kind="a"} 5.55\n' in text
+    assert 'test_seconds_count{kind="a"} 3\n' in text
+
+    # the values of several processes are summed up
+    collected = json.loads(json.dumps(registry.collect()))
+    text = render(merge([collected, collected]))
+    assert 'test_total{kind="a"} 2\n' in text
+    assert 'test_seconds_bucket{kind="a",le="+Inf"} 6\n' in text
+
+
+def test_metrics_endpoint(flask_app):
+    ''' Test the recorded metrics and the access to /metrics '''
+    assert flask_app.get('/metrics').status_code == 403
+    login(flask_app, 'douglas@adams.org', 'default')
+    assert flask_app.get('/metrics').status_code == 403
+    flask_app.get('/logout')
+
+    failures = login_attempts.value(result='failure')
+    login(flask_app, 'admin@admin.org', 'wrong')
+    assert login_attempts.value(result='failure') == failures + 1
+    login(flask_app, 'admin@admin.org', 'default')
+
+    rv = flask_app.get('/metrics')
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/plain'
+    assert 'http_request_duration_seconds_bucket{endpoint="main.index",' \
+        'le="+Inf"}' in rv.data
+    assert 'http_responses_total{status="403"}' in rv.data
+    assert 'login_attempts_total{result="success"}' in rv.data
+    assert 'db_pool_checkouts_total ' in rv.data
+    assert 'cache_hits_total{cache="roles"}' in rv.data
+
+
+def test_multiprocess(flask_app):
+    ''' Test the summed values of the files of several processes '''
+    metrics = app.metrics
+    login(flask_app, 'admin@admin.org', 'default')
+    metrics.flush()
+    own = os.path.join(metrics.directory,
+                       'metrics-{0}.json'.format(os.getpid()))
+    shutil.copy(own, os.path.join(metrics.directory, 'metrics-1.json'))
+
+    text = metrics.render()
+    line = [l for l in text.splitlines()
+            if l.startswith('login_attempts_total{result="success"}')][0]
+    assert int(line.split()[1]) == \
+        2 * login_attempts.value(result='success')
+
+
+@pytest.fixture
+def app_config(request):
+    ''' Enable the metrics with a temporary directory '''
+    directory = tempfile.mkdtemp()
+    request.addfinalizer(lambda: shutil.rmtree(directory))
+    return {'METRICS_ENABLED': True, 'METRICS_DIR': directory}
+
+
+@pytest.fixture
+def fill_db():
+    ''' Fill the database with the users and the groups '''
+    return add_users
@@ -0,0 +1,76 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+
+import app
+from app.views.navigations import (
+    Navigation, Dropdown, Divider, NAVIGATIONS, render_navbar, _navbar_cache)
+
+
+def test_nodes():
+    ''' Test the immutable navigation nodes '''
+    nav = Navigation('Test', '#test')
+    assert not nav.islist
+    assert nav.roles == frozenset()
+    with pytest.raises(AttributeError):
+        nav.name = 'Other'
+    with pytest.raises(AttributeError):
+        nav.other = 'Other'
+
+    dropdown = Dropdown('[{user}]', [nav, Divider()])
+    assert dropdown.islist
+    assert dropdown.elements[1].divider
+
+
+def test_render_navbar():
+    ''' Test the rendering and caching of the navigation bars '''
+    with app.create_app().test_request_context('/'):
+        html = render_navbar('user', 'douglas <3')
+        assert '[douglas &lt;3]' in html
+        assert '<li class="divider"></li>' in html
+        assert '/logout' in html
+        hits = _navbar_cache.hits
+        assert render_navbar('user', 'douglas <3') is html
+        assert _navbar_cache.hits == hits + 1
+
+        html = render_navbar('anonymous')
+        assert '/login' in html
+        assert '/logout' not in html
+
+
+def test_navbar_roles():
+    ''' Test the tabs restricted to roles '''
+    NAVIGATIONS['test_roles'] = (
+        Navigation('Public', '/public'),
+        Navigation('Admin', '/admin', roles=['admin']))
+    try:
+        with app.create_app().test_request_context('/'):
+            assert '/admin' not in render_navbar('test_roles', 'douglas')
+            assert '/admin' in render_navbar('test_roles', 'admin',
+                                             ['admin', 'users'])
+    finally:
+        del NAVIGATIONS['test_roles']
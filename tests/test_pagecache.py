@@ -0,0 +1,110 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+
+from flask import template_rendered
+
+from test_login import add_users, login, logout
+
+
+def test_anonymous_pages(flask_app, max_queries):
+    ''' Test the cached pages and the conditional requests '''
+    rv = flask_app.get('/')
+    etag = rv.headers['ETag']
+    assert 'Accept-Language' in rv.headers['Vary']
+
+    rendered = []
+
+    def record(sender, template, context):
+        rendered.append(template.name)
+
+    template_rendered.connect(record)
+    with max_queries(0):
+        cached = flask_app.get('/')
+        assert cached.data == rv.data
+        assert cached.headers['ETag'] == etag
+
+        rv = flask_app.get('/', headers={'If-None-Match': etag})
+        assert rv.status_code == 304
+        assert rv.data == ''
+
+        rv = flask_app.get('/unknown')
+        rv = flask_app.get('/other')
+        assert rv.status_code == 404
+        assert 'ETag' not in rv.headers
+    assert rendered == ['404.html']
+
+    # cached per query string
+    flask_app.get('/?page=2')
+    flask_app.get('/?page=2')
+    assert rendered == ['404.html', 'index.html']
+    template_rendered.disconnect(record)
+
+
+def test_login_page(flask_app):
+    ''' Test the CSRF token of the cached login page '''
+    other = flask_app.application.test_client()
+    other.get('/login')
+    rv = login(flask_app, 'douglas@adams.org', 'default')
+    assert '[douglas]' in rv.data
+    assert 'ETag' not in flask_app.get('/login').headers
+
+    # the users get their own pages
+    rv = flask_app.get('/')
+    assert '[douglas]' in rv.data
+    assert 'ETag' not in rv.headers
+    rv = logout(flask_app)
+    assert '[douglas]' not in rv.data
+
+    rv = login(other, 'admin@admin.org', 'default')
+    assert '[admin]' in rv.data
+
+
+def test_error_pages(flask_app):
+    ''' Test the cached access denied page '''
+    rv = flask_app.get('/admin')
+    assert rv.status_code == 403
+    cache = flask_app.application.extensions['page_cache']
+    assert len(cache.cache) == 1
+
+    login(flask_app, 'admin@admin.org', 'default')
+    rv = flask_app.get('/admin')
+    assert 'Admin welcome to the Matrix' in rv.data
+    cache.clear()
+    assert len(cache.cache) == 0
+
+
+@pytest.fixture
+def app_config():
+    ''' Enable the page cache '''
+    return {'PAGE_CACHE_ENABLED': True}
+
+
+@pytest.fixture
+def fill_db():
+    ''' Fill the database with the users and the groups '''
+    return add_users
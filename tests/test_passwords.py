@@ -0,0 +1,106 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import time
+
+from flask import Flask
+
+from app.passwords import PasswordHasher, PasswordHasherBusy
+
+
+def test_hasher_inline():
+    ''' Test hashing in the calling thread '''
+    flask_app = Flask(__name__)
+    flask_app.config['PASSWORD_HASH_PROCESSES'] = 0
+    flask_app.config['PASSWORD_HASH_ITERATIONS'] = 2000
+    hasher = PasswordHasher(flask_app)
+
+    pwhash = hasher.hash('secret')
+    assert pwhash.startswith('pbkdf2:sha256:2000$')
+    assert hasher.check(pwhash, 'secret')
+    assert not hasher.check(pwhash, 'other')
+    assert not hasher.needs_rehash(pwhash)
+
+    hasher.iterations = 3000
+    assert hasher.needs_rehash(pwhash)
+    # old hashes remain valid
+    assert hasher.check(pwhash, 'secret')
+
+
+def test_hasher_pool():
+    ''' Test hashing in the process pool '''
+    flask_app = Flask(__name__)
+    flask_app.config['PASSWORD_HASH_PROCESSES'] = 1
+    flask_app.config['PASSWORD_HASH_ITERATIONS'] = 2000
+    flask_app.config['PASSWORD_HASH_TIMEOUT'] = 10
+    hasher = PasswordHasher(flask_app)
+    try:
+        pwhash = hasher.hash('secret')
+        assert hasher.check(pwhash, 'secret')
+        assert not hasher.check(pwhash, 'other')
+
+        # a batch is hashed in order
+        passwords = ['secret{0}'.format(i) for i in range(10)]
+        hashes = hasher.hash_many(passwords)
+        assert [hasher.check(h, p) for h, p in zip(hashes, passwords)] == \
+            [True] * 10
+        assert len(set(hashes)) == 10
+
+        # no free slot left for another hash
+        for i in range(hasher.max_pending):
+            hasher._pending.acquire()
+        with pytest.raises(PasswordHasherBusy):
+            hasher.check(pwhash, 'secret')
+    finally:
+        hasher.shutdown()
+
+
+def test_hasher_timeout():
+    ''' A timed out hash keeps its slot until it finished '''
+    flask_app = Flask(__name__)
+    flask_app.config['PASSWORD_HASH_PROCESSES'] = 1
+    flask_app.config['PASSWORD_HASH_MAX_PENDING'] = 1
+    flask_app.config['PASSWORD_HASH_ITERATIONS'] = 200000
+    flask_app.config['PASSWORD_HASH_TIMEOUT'] = 0.01
+    hasher = PasswordHasher(flask_app)
+    try:
+        with pytest.raises(PasswordHasherBusy) as e:
+            hasher.hash('secret')
+        assert 'timed out' in str(e.value)
+        with pytest.raises(PasswordHasherBusy) as e:
+            hasher.hash('secret')
+        assert 'pending' in str(e.value)
+
+        hasher.timeout = 30
+        for i in range(300):
+            if hasher._pending.acquire(False):
+                hasher._pending.release()
+                break
+            time.sleep(0.1)
+        assert hasher.check(hasher.hash('secret'), 'secret')
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,98 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import shutil
+import tempfile
+
+import app
+from test_login import add_users, login
+
+
+def test_profile_permission(flask_app):
+    ''' Test that only admins or signed requests get profiled '''
+    profiler = app.profiler
+    flask_app.get('/?_profile')
+    assert profiler.profiles() == []
+
+    login(flask_app, 'douglas@adams.org', 'default')
+    flask_app.get('/?_profile')
+    assert profiler.profiles() == []
+    flask_app.get('/logout')
+
+    flask_app.get('/', headers={'X-Profile': 'profile.invalid'})
+    assert profiler.profiles() == []
+    flask_app.get('/', headers={'X-Profile': profiler.make_token()})
+    assert [p['endpoint'] for p in profiler.profiles()] == ['main.index']
+
+    login(flask_app, 'admin@admin.org', 'default')
+    flask_app.get('/admin?_profile')
+    assert profiler.profiles()[0]['endpoint'] == 'admin.admin'
+
+
+def test_profile_pages(flask_app):
+    ''' Test the listing, the report and the download of the profiles '''
+    login(flask_app, 'admin@admin.org', 'default')
+    for i in range(4):
+        flask_app.get('/?_profile')
+    profiles = app.profiler.profiles()
+    assert len(profiles) == 3
+
+    rv = flask_app.get('/admin/profiles')
+    for profile in profiles:
+        assert profile['name'] in rv.data
+
+    rv = flask_app.get('/admin/profiles/' + profiles[0]['name'])
+    assert 'function calls' in rv.data
+    rv = flask_app.get('/admin/profiles/{0}?sort=calls'.format(
+        profiles[0]['name']))
+    assert 'function calls' in rv.data
+    assert flask_app.get('/admin/profiles/{0}?sort=bogus'.format(
+        profiles[0]['name'])).status_code == 400
+    rv = flask_app.get('/admin/profiles/{0}?download'.format(
+        profiles[0]['name']))
+    assert rv.headers['Content-Disposition'].startswith('attachment')
+
+    assert flask_app.get('/admin/profiles/..%2Fapp.db').status_code == 404
+    assert flask_app.get('/admin/profiles/unknown.pstats').status_code == 404
+
+    flask_app.get('/logout')
+    assert flask_app.get('/admin/profiles').status_code == 403
+
+
+@pytest.fixture
+def app_config(request):
+    ''' Enable the profiling with a temporary directory '''
+    directory = tempfile.mkdtemp()
+    request.addfinalizer(lambda: shutil.rmtree(directory))
+    return {'PROFILING_ENABLED': True, 'PROFILE_DIR': directory,
+            'PROFILE_RETENTION': 3}
+
+
+@pytest.fixture
+def fill_db():
+    ''' Fill the database with the users and the groups '''
+    return add_users
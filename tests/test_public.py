@@ -29,7 +29,7 @@ import app
 
 def test_unknwon_page():
     ''' Test the public pages '''
-    wapp = app.app.test_client()
+    wapp = app.create_app().test_client()
 
     rv = wapp.get('/unknown')
     assert "404" in rv.data
@@ -37,7 +37,7 @@ def test_unknwon_page():
 
 def test_index_page():
     ''' Test the landing page (index) '''
-    wapp = app.app.test_client()
+    wapp = app.create_app().test_client()
 
     rv = wapp.get('/index')
     assert "Login" in rv.data
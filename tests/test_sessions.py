@@ -0,0 +1,142 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+import app
+from app.cache import LRUCache
+from app.sessions import ServerSideSessionInterface
+from test_login import add_users, login
+
+
+def session_cookie(client):
+    ''' Get the value of the session cookie of a test client. '''
+    for cookie in client.cookie_jar:
+        if cookie.name == 'session':
+            return cookie.value
+    return None
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_sessions(request, backend):
+    ''' Test the login and logout with server-side sessions '''
+    client = make_client(request, backend)
+    interface = client.application.session_interface
+    assert isinstance(interface, ServerSideSessionInterface)
+
+    # anonymous requests without session data store nothing
+    client.get('/')
+    assert session_cookie(client) is None
+    assert interface.writes == 0
+
+    login(client, 'douglas@adams.org', 'default')
+    sid = session_cookie(client)
+    assert len(sid) == 32
+    assert 'douglas' not in sid
+    writes = interface.writes
+    rv = client.get('/')
+    assert '[douglas]' in rv.data
+    # the unchanged session is not written back
+    client.get('/')
+    assert interface.writes == writes
+    assert session_cookie(client) == sid
+
+    client.get('/logout')
+    assert session_cookie(client) != sid
+    assert interface.store.get('session:' + sid) is None
+    rv = client.get('/')
+    assert '[douglas]' not in rv.data
+
+
+def test_refresh_and_sweep(request):
+    ''' Test the refresh of stale sessions and the purge of expired ones '''
+    client = make_client(request, 'memory')
+    interface = client.application.session_interface
+    login(client, 'douglas@adams.org', 'default')
+    sid = session_cookie(client)
+
+    writes = interface.writes
+    written, serialized = interface.store.get('session:' + sid)
+    interface.store.set('session:' + sid, (written - 3600, serialized))
+    client.get('/')
+    assert interface.writes == writes + 1
+    assert interface.store.get('session:' + sid)[0] > written - 3600
+
+    interface.store = LRUCache(ttl=-1)
+    interface.store.set('session:' + sid, (written, serialized))
+    interface.purge()
+    assert len(interface.store) == 0
+
+    # a failing purge is logged
+    def fail():
+        raise sqlite3.OperationalError('database is locked')
+    interface.store.purge = fail
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logging.getLogger('app.sessions').addHandler(handler)
+    try:
+        interface.purge()
+    finally:
+        logging.getLogger('app.sessions').removeHandler(handler)
+    assert 'database is locked' in str(records[0].exc_info[1])
+
+
+def make_client(request, backend):
+    ''' Get a client of an app with server-side sessions '''
+    db_fd, filename = tempfile.mkstemp()
+    session_fd, session_filename = tempfile.mkstemp()
+    application = app.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{0}'.format(filename),
+        'SESSION_BACKEND': backend,
+        'SESSION_PATH': session_filename,
+        'SESSION_TTL': 3600,
+        'SESSION_SWEEP_INTERVAL': None,
+        'TESTING': True})
+    ctx = application.app_context()
+    ctx.push()
+    wapp = application.test_client()
+    app.db.create_all()
+
+    add_users(app.db)
+
+    def fin():
+        ctx.pop()
+        app.db.get_engine(application).dispose()
+        store = application.session_interface.store
+        if hasattr(store, 'close'):
+            store.close()
+        for fd, name in ((db_fd, filename), (session_fd, session_filename)):
+            os.close(fd)
+            os.unlink(name)
+    request.addfinalizer(fin)
+
+    return wapp
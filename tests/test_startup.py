@@ -0,0 +1,66 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+import subprocess
+import sys
+
+# creates an application in a fresh interpreter and prints the database
+# connections and the template compilations of the startup
+STARTUP_SCRIPT = '''
+import sys
+import app
+assert 'app.views.main' not in sys.modules
+assert 'app.models.user' not in sys.modules
+
+import jinja2
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+connections = []
+compiled = []
+event.listen(Pool, 'connect', lambda *args: connections.append(args))
+compile = jinja2.Environment.compile
+def record(self, source, name=None, *args, **kwargs):
+    compiled.append(name)
+    return compile(self, source, name, *args, **kwargs)
+jinja2.Environment.compile = record
+
+app.create_app()
+assert 'app.views.main' in sys.modules
+print('%d %d' % (len(connections), len(compiled)))
+'''
+
+
+def test_lazy_startup():
+    ''' Test that creating an app neither connects to the db nor compiles
+        templates, the views get imported by create_app
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT],
+                                     cwd=root)
+    connections, compiled = [int(v) for v in output.split()]
+    assert connections == 0
+    assert compiled == 0
@@ -0,0 +1,86 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import pytest
+import os
+import shutil
+import tempfile
+
+import app
+
+
+def test_compile_templates(request):
+    ''' Test the templates loaded from the shared bytecode cache '''
+    directory = tempfile.mkdtemp()
+    request.addfinalizer(lambda: shutil.rmtree(directory))
+
+    application = make_app(directory)
+    assert not application.jinja_env.auto_reload
+    template_cache = application.extensions['template_cache']
+    names = template_cache.compile(application)
+    for name in ('base.html', 'index.html', 'login.html', 'events.html',
+                 'admin_profiles.html', '404.html'):
+        assert name in names
+    files = os.listdir(directory)
+    assert len(files) == len(names)
+    assert not [name for name in files if name.endswith('.tmp')]
+
+    # a new worker loads the bytecode instead of compiling the templates
+    application = make_app(directory)
+
+    def compile(*args, **kwargs):
+        raise AssertionError('template compiled')
+    application.jinja_env.compile = compile
+    rv = application.test_client().get('/login')
+    assert rv.status_code == 200
+    assert 'Sign In' in rv.data
+
+    template_cache.clear()
+    assert os.listdir(directory) == []
+
+
+def test_auto_reload(request):
+    ''' Test the template reloading in debug mode '''
+    application = make_app(None, DEBUG=True)
+    assert application.jinja_env.auto_reload
+    assert application.jinja_env.bytecode_cache is None
+
+
+def test_instance_directory():
+    ''' Test the default cache directory in the instance folder '''
+    application = app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    assert application.jinja_env.bytecode_cache.directory == \
+        os.path.join(application.instance_path, 'template_cache')
+
+
+def make_app(directory, **config):
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'TEMPLATE_CACHE_DIR': directory,
+        'DEBUG': False,
+        'TESTING': True}
+    settings.update(config)
+    return app.create_app(settings)
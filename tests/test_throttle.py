@@ -0,0 +1,109 @@
+#
+# Copyright (C) 2014 Mathias Weber <mathew.weber@gmail.com>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+import tempfile
+import time
+
+import app
+from app.throttle import TokenBucketLimiter, SQLiteTokenBucketLimiter
+from test_login import fill_db, login
+
+
+def test_token_bucket():
+    ''' Test the in process token bucket '''
+    limiter = TokenBucketLimiter(rate=0, burst=2)
+    assert limiter.consume('a')
+    assert limiter.consume('a')
+    assert not limiter.consume('a')
+    assert limiter.consume('b')
+
+    # the bucket gets refilled
+    limiter = TokenBucketLimiter(rate=100, burst=1)
+    assert limiter.consume('a')
+    assert not limiter.consume('a')
+    time.sleep(0.02)
+    assert limiter.consume('a')
+
+
+def test_sqlite_token_bucket():
+    ''' Test the token bucket shared over a sqlite file '''
+    db_fd, filename = tempfile.mkstemp()
+    try:
+        limiter = SQLiteTokenBucketLimiter(filename, rate=0, burst=2)
+        other = SQLiteTokenBucketLimiter(filename, rate=0, burst=2)
+        assert limiter.consume('a')
+        assert other.consume('a')
+        assert not limiter.consume('a')
+        assert other.consume('b')
+
+        # a forked worker opens its own connection
+        conn = limiter._connection()
+        limiter._local.pid = -1
+        assert limiter._connection() is not conn
+        assert not limiter.consume('a')
+        conn.close()
+        limiter.close()
+        other.close()
+    finally:
+        os.close(db_fd)
+        os.unlink(filename)
+
+
+def test_sqlite_token_bucket_purge():
+    ''' Test the periodic removal of the full buckets '''
+    db_fd, filename = tempfile.mkstemp()
+    try:
+        limiter = SQLiteTokenBucketLimiter(filename, rate=100, burst=2)
+        limiter.purge_interval = 3
+        assert limiter.consume('a')
+        assert limiter.consume('b')
+        time.sleep(0.05)
+        # the third call purges the buckets which are full again
+        assert limiter.consume('c')
+        keys = [row[0] for row in limiter._connection().execute(
+            'SELECT key FROM buckets')]
+        assert keys == ['c']
+        limiter.close()
+    finally:
+        os.close(db_fd)
+        os.unlink(filename)
+
+
+def test_login_throttle(flask_app):
+    ''' Test the rejection of throttled login attempts '''
+    throttle = app.login_throttle
+    email_limiter = throttle.email_limiter
+    throttle.email_limiter = TokenBucketLimiter(rate=0, burst=1)
+    try:
+        rv = login(flask_app, 'douglas@adams.org', 'wrong')
+        assert "Sign" in rv.data
+        throttled = throttle.throttled_email
+        rv = login(flask_app, 'douglas@adams.org', 'default')
+        assert rv.status_code == 429
+        assert throttle.throttled_email == throttled + 1
+    finally:
+        throttle.email_limiter = email_limiter